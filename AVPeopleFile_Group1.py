@@ -1,6 +1,9 @@
 import pandas as pd
 import numpy as np
 import random
+from TripGenerator import DEFAULT_SEED, DEPARTURE_MINUTE, add_time_labels, parse_times, draw_people
+from TripGrouping import bucket_groups
+from WeeklySchedule import WeeklySchedule, day_mask
 
 categories_info = {
     "Students to/from school": {"size": 264, "age_range": (14, 18)},
@@ -14,60 +17,43 @@ trip_types = {
     "Students to/from school": ["House -> School", "School -> House"],
 }
 
-def random_time(start_hour, end_hour, min_hour=None):
-    if min_hour is not None:
-        start_hour = max(start_hour, min_hour + 1)
-    if start_hour >= end_hour:
-        return f"{end_hour:02d}:{np.random.choice(['00', '15', '30', '45'])}"
-    hour = np.random.randint(start_hour, end_hour + 1)
-    minute = np.random.choice(["00", "15", "30", "45"])
-    return f"{hour:02d}:{minute}"
-
-def calculate_return_time(initial_time):
-    initial_hour, initial_minute = map(int, initial_time.split(":"))
-    return_hour = initial_hour + 1
-    return_minute = initial_minute + 30
-    if return_minute >= 60:
-        return_hour += 1
-        return_minute -= 60
-    return f"{return_hour % 24:02d}:{return_minute:02d}"
-
-def generate_trip_data():
-    rows = []
-    id_counter = 1
+# Function to generate the students' weekly schedule from whole columns drawn on a seeded Generator (scale
+# multiplies the size). Every student is stored once, with the departure of both legs on each weekday.
+def generate_trip_data(rng=None, scale=1):
+    rng = rng if rng is not None else np.random.default_rng(DEFAULT_SEED)
+    schedule = None
+    first_id = 1
     for category, info in categories_info.items():
-        for _ in range(info["size"]):
-            age = np.random.randint(*info["age_range"])
-            gender = np.random.choice(["M", "F"])
-            
-            if category == "Students to/from school":
-                for day in weekdays:
-                    for trip_type in trip_types[category]:
-                        if trip_type == "House -> School":
-                            departure_time = random.choice(["6:30", "6:45", "7:00"])
-                        else:
-                            departure_time = random.choice(["14:45", "15:00", "15:15"])
-                        rows.append([category, id_counter, gender, age, trip_type, day, departure_time])
-                id_counter += 1
-    
-    return pd.DataFrame(rows, columns=["Category", "ID", "Gender", "Age", "Trip Type", "Trip Departure Day", "Trip Departure Time"])
-
-# generate and save the DataFrame
-trip_data = generate_trip_data()
-trip_data.to_excel("TransportationPeople_Group1.xlsx", index=False)
+        size = info["size"] * scale
+        ages, genders = draw_people(rng, size, info["age_range"])
+
+        if category == "Students to/from school":
+            # Every weekday, one trip each way
+            slots = parse_times(["6:30", "6:45", "7:00", "14:45", "15:00", "15:15"]).reshape(2, 3)
+            minutes = slots[np.arange(2), rng.integers(0, slots.shape[1], size=(size, len(weekdays), 2))]
+            schedule = WeeklySchedule.build(category, first_id, ages, genders, weekdays, trip_types[category],
+                                            np.full(size, day_mask(weekdays, weekdays)), minutes)
+
+        first_id += size
+
+    return schedule
+
+# generate and save the people file, one row per student
+schedule = generate_trip_data()
+schedule.to_compact_frame().to_excel("TransportationPeople_Group1.xlsx", index=False)
 
 # Now we have the people file! Let's do the matching.
 
 # Update the departure times
-trip_data.loc[trip_data['Trip Departure Time'] == '07:15', 'Trip Departure Time'] = '06:30'
+schedule.minutes[schedule.minutes == 7 * 60 + 15] = 6 * 60 + 30
 
 weekdays = ["M", "Tu", "W", "Th", "F"]
-trip_data_school1 = trip_data[trip_data['Category'] == "Students to/from school"].copy()
+students = schedule.people
 
-# add 'House Location' and 'School Location' columns to trip_data
-unique_ids = trip_data['ID'].unique()
+# add 'House Location' and 'School Location' columns to the students
+unique_ids = students['ID'].unique()
 house_locations = {uid: random.choice(['EM', 'NM', 'WM', 'SM', 'CM']) for uid in unique_ids}
-trip_data_school1['House Location'] = trip_data_school1['ID'].map(house_locations)
+students['House Location'] = students['ID'].map(house_locations)
 
 def assign_school_location(house_location):
     if house_location in ['NM', 'WM']:
@@ -78,77 +64,37 @@ def assign_school_location(house_location):
         return random.choice(['Dow', 'Midland'])
 
 school_locations = {uid: assign_school_location(house) for uid, house in house_locations.items()}
-trip_data_school1['School Location'] = trip_data_school1['ID'].map(school_locations)
+students['School Location'] = students['ID'].map(school_locations)
 
 # function to assign group numbers (of size 4) based on departure times and locations
-def assign_group_numbers(data):
+# (works on the weekly schedule: each day's trips are taken from it one leg at a time and the groups stored back)
+def assign_group_numbers(schedule):
     group_counter = 1
 
     # loop over each day and handles morning + afternoon trips separately
     for day in weekdays:
-        # Process morning trips
-        morning_data = data[(data['Trip Departure Day'] == day) & (data['Trip Type'] == "House -> School")]
-        morning_data['Group Number'] = np.nan  # Initialize group numbers
-        
-        for house in morning_data['House Location'].unique():
-            for time in morning_data['Trip Departure Time'].unique():
-                house_time_data = morning_data[(morning_data['House Location'] == house) & 
-                                               (morning_data['Trip Departure Time'] == time)]
-                # First, try to match all three criteria
-                for school in house_time_data['School Location'].unique():
-                    full_criteria_data = house_time_data[house_time_data['School Location'] == school]
-                    for i in range(0, len(full_criteria_data), 4):
-                        if len(full_criteria_data.iloc[i:i+4]) < 4:  # Check if less than 4 remain
-                            break  # Move to relaxing criteria if less than 4 students match
-
-                        data.loc[full_criteria_data.index[i:i+4], 'Group Number'] = f'{group_counter}'
-                        group_counter += 1
-
-                # Relax the school location criteria if groups of 4 can't be formed
-                remaining_data = house_time_data[pd.isna(house_time_data['Group Number'])]
-                for i in range(0, len(remaining_data), 4):
-                    group_data = remaining_data.iloc[i:i+4]
-                    data.loc[group_data.index, 'Group Number'] = f'{group_counter}'
-                    group_counter += 1
-
-        # Afternoon trips: School -> House
-        afternoon_data = data[(data['Trip Departure Day'] == day) & (data['Trip Type'] == "School -> House")]
-        afternoon_data['Group Number'] = np.nan  # Initialize group numbers
-
-        # Try to form groups based on all three criteria first
-        for school in afternoon_data['School Location'].unique():
-            for time in afternoon_data['Trip Departure Time'].unique():
-                school_time_data = afternoon_data[
-                    (afternoon_data['School Location'] == school) & 
-                    (afternoon_data['Trip Departure Time'] == time)
-                ]
-
-                for i in range(0, len(school_time_data), 4):
-                    if len(school_time_data.iloc[i:i+4]) < 4:
-                        continue  # Skip if the group would be less than 4
-
-                    data.loc[school_time_data.index[i:i+4], 'Group Number'] = f'{group_counter}'
-                    group_counter += 1
-
-        # Fill remaining spots in groups by relaxing the house location criteria
-        remaining_data = afternoon_data[pd.isna(afternoon_data['Group Number'])]
-        for school in remaining_data['School Location'].unique():
-            for time in remaining_data['Trip Departure Time'].unique():
-                remaining_school_time_data = remaining_data[
-                    (remaining_data['School Location'] == school) & 
-                    (remaining_data['Trip Departure Time'] == time)
-                ]
-
-                while len(remaining_school_time_data) > 0:
-                    group_data = remaining_school_time_data.iloc[:4]  # Take up to 4
-                    data.loc[group_data.index, 'Group Number'] = f'{group_counter}'
-                    remaining_school_time_data = remaining_school_time_data.iloc[4:]
-                    group_counter += 1
-
-    return data
-
-trip_data_school1 = assign_group_numbers(trip_data_school1)
-trip_data_school1.to_excel("School1Groups.xlsx", index=False)
+        # Morning trips: groups of students matching house, time and school first, then the leftovers of each
+        # house and time together (relaxing the school location)
+        morning_data = schedule.day_frame(day, "House -> School")
+        groups = bucket_groups(morning_data, ['House Location', DEPARTURE_MINUTE, 'School Location'],
+                               ['House Location', DEPARTURE_MINUTE])
+        schedule.set_groups(day, "House -> School",
+                            pd.Series((group_counter + groups).astype(str), index=morning_data.index))
+        group_counter += len(np.unique(groups))
+
+        # Afternoon trips: School -> House, grouped by school and time
+        afternoon_data = schedule.day_frame(day, "School -> House")
+        groups = bucket_groups(afternoon_data, ['School Location', DEPARTURE_MINUTE])
+        schedule.set_groups(day, "School -> House",
+                            pd.Series((group_counter + groups).astype(str), index=afternoon_data.index))
+        group_counter += len(np.unique(groups))
+
+    return schedule
+
+# the grouped trips are expanded to one row per trip for the next steps
+schedule = assign_group_numbers(schedule)
+trip_data_school1 = schedule.to_frame()
+add_time_labels(trip_data_school1).to_excel("School1Groups.xlsx", index=False)
 
 group_counts = trip_data_school1.groupby(['Trip Departure Day', 'Trip Type'])['Group Number'].nunique()
 print(group_counts)
\ No newline at end of file
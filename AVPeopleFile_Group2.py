@@ -2,6 +2,9 @@ from networkx import dfs_edges, dfs_labeled_edges
 import pandas as pd
 import numpy as np
 import random
+from TripGenerator import (DEFAULT_SEED, DEPARTURE_MINUTE, add_time_labels, parse_times, draw_people, choose_days,
+                           choose_slots, trip_frame, concat_trips)
+from TripGrouping import bucket_groups
 
 categories_info = {
     "Students leaving from an after-school program": {"size": 400, "age_range": (11, 18)},
@@ -15,44 +18,29 @@ trip_types = {
     "Students leaving from an after-school program": ["School -> House"],
 }
 
-def random_time(start_hour, end_hour, min_hour=None):
-    if min_hour is not None:
-        start_hour = max(start_hour, min_hour + 1)
-    if start_hour >= end_hour:
-        return f"{end_hour:02d}:{np.random.choice(['00', '15', '30', '45'])}"
-    hour = np.random.randint(start_hour, end_hour + 1)
-    minute = np.random.choice(["00", "15", "30", "45"])
-    return f"{hour:02d}:{minute}"
-
-def calculate_return_time(initial_time):
-    initial_hour, initial_minute = map(int, initial_time.split(":"))
-    return_hour = initial_hour + 1
-    return_minute = initial_minute + 30
-    if return_minute >= 60:
-        return_hour += 1
-        return_minute -= 60
-    return f"{return_hour % 24:02d}:{return_minute:02d}"
-
-def generate_trip_data():
-    rows = []
-    id_counter = 1
+# Function to generate the people file from whole columns drawn on a seeded Generator (scale multiplies the size)
+def generate_trip_data(rng=None, scale=1):
+    rng = rng if rng is not None else np.random.default_rng(DEFAULT_SEED)
+    frames = []
+    first_id = 1
     for category, info in categories_info.items():
-        for _ in range(info["size"]):
-            age = np.random.randint(*info["age_range"])
-            gender = np.random.choice(["M", "F"])
-            
-            if category == "Students leaving from an after-school program":
-                for day in np.random.choice(weekdays, np.random.randint(1, 6), replace=False):
-                    departure_time = random.choice(["15:30", "16:00", "16:30", "17:00", "17:30"])
-                    rows.append([category, id_counter, gender, age, "School -> House", day, departure_time])
-
-                id_counter += 1
-    
-    return pd.DataFrame(rows, columns=["Category", "ID", "Gender", "Age", "Trip Type", "Trip Departure Day", "Trip Departure Time"])
+        size = info["size"] * scale
+        ages, genders = draw_people(rng, size, info["age_range"])
+
+        if category == "Students leaving from an after-school program":
+            # 1 to 5 distinct weekdays per student, one trip home on each
+            person, days = choose_days(rng, weekdays, rng.integers(1, 6, size=size))
+            minutes = choose_slots(rng, parse_times(["15:30", "16:00", "16:30", "17:00", "17:30"]), len(person))
+            frames.append(trip_frame(category, first_id, ages, genders, person,
+                                     np.full(len(person), "School -> House", dtype=object), days, minutes))
+
+        first_id += size
+
+    return concat_trips(frames)
 
 # generate and save the DataFrame
 trip_data = generate_trip_data()
-trip_data.to_excel("TransportationPeople_Group2.xlsx", index=False)
+add_time_labels(trip_data).to_excel("TransportationPeople_Group2.xlsx", index=False)
 
 
 # Now we have the people file! Let's do the matching.
@@ -90,47 +78,21 @@ trip_data_school2['School Location'] = trip_data_school2.apply(lambda x: assign_
 # function to assign group numbers (of size 4) based on departure times and locations
 def assign_group_numbers(data):
     group_counter = 1
+    group_numbers = pd.Series(np.nan, index=data.index, dtype=object)
 
     # loop over each day and handles morning + afternoon trips separately
     for day in weekdays:
-        # Afternoon trips: School -> House
+        # Afternoon trips: School -> House, grouped by school and time
         afternoon_data = data[(data['Trip Departure Day'] == day) & (data['Trip Type'] == "School -> House")]
-        afternoon_data['Group Number'] = np.nan  # Initialize group numbers
-
-        # Try to form groups based on all three criteria first
-        for school in afternoon_data['School Location'].unique():
-            for time in afternoon_data['Trip Departure Time'].unique():
-                school_time_data = afternoon_data[
-                    (afternoon_data['School Location'] == school) & 
-                    (afternoon_data['Trip Departure Time'] == time)
-                ]
-
-                for i in range(0, len(school_time_data), 4):
-                    if len(school_time_data.iloc[i:i+4]) < 4:
-                        continue  # Skip if the group would be less than 4
-
-                    data.loc[school_time_data.index[i:i+4], 'Group Number'] = f'{group_counter}'
-                    group_counter += 1
-
-        # Fill remaining spots in groups by relaxing the house location criteria
-        remaining_data = afternoon_data[pd.isna(afternoon_data['Group Number'])]
-        for school in remaining_data['School Location'].unique():
-            for time in remaining_data['Trip Departure Time'].unique():
-                remaining_school_time_data = remaining_data[
-                    (remaining_data['School Location'] == school) & 
-                    (remaining_data['Trip Departure Time'] == time)
-                ]
-
-                while len(remaining_school_time_data) > 0:
-                    group_data = remaining_school_time_data.iloc[:4]  # Take up to 4
-                    data.loc[group_data.index, 'Group Number'] = f'{group_counter}'
-                    remaining_school_time_data = remaining_school_time_data.iloc[4:]
-                    group_counter += 1
+        groups = bucket_groups(afternoon_data, ['School Location', DEPARTURE_MINUTE])
+        group_numbers[afternoon_data.index] = (group_counter + groups).astype(str)
+        group_counter += len(np.unique(groups))
 
+    data['Group Number'] = group_numbers
     return data
 
 trip_data_school2 = assign_group_numbers(trip_data_school2)
-trip_data_school2.to_excel("School2Groups.xlsx", index=False)
+add_time_labels(trip_data_school2).to_excel("School2Groups.xlsx", index=False)
 
 group_counts = trip_data_school2.groupby(['Trip Departure Day', 'Trip Type'])['Group Number'].nunique()
 print(group_counts)
\ No newline at end of file
@@ -1,6 +1,9 @@
 import pandas as pd
 import numpy as np
 import random
+from TripGenerator import (DEFAULT_SEED, DEPARTURE_MINUTE, add_time_labels, draw_people, choose_days, interleave,
+                           random_times, return_times, trip_frame, concat_trips)
+from TripGrouping import sweep_groups
 
 categories_info = {
     "Elderly": {"size": 674, "age_range": (65, 90)}
@@ -24,63 +27,33 @@ elderly_trip_distribution = {
     "Other -> House": 0.1
 }
 
-def random_time(start_hour, end_hour, min_hour=None):
-    if min_hour is not None:
-        start_hour = max(start_hour, min_hour + 1)
-    if start_hour >= end_hour:
-        return f"{end_hour:02d}:{np.random.choice(['00', '15', '30', '45'])}"
-    hour = np.random.randint(start_hour, end_hour + 1)
-    minute = np.random.choice(["00", "15", "30", "45"])
-    return f"{hour:02d}:{minute}"
-
-def calculate_return_time(initial_time):
-    initial_hour, initial_minute = map(int, initial_time.split(":"))
-    return_hour = initial_hour + 1
-    return_minute = initial_minute + 30
-    if return_minute >= 60:
-        return_hour += 1
-        return_minute -= 60
-    return f"{return_hour % 24:02d}:{return_minute:02d}"
-
-def generate_trip_data():
-    rows = []
-    id_counter = 1
+# Function to generate the people file from whole columns drawn on a seeded Generator (scale multiplies the size)
+def generate_trip_data(rng=None, scale=1):
+    rng = rng if rng is not None else np.random.default_rng(DEFAULT_SEED)
+    frames = []
+    first_id = 1
     for category, info in categories_info.items():
-        for _ in range(info["size"]):
-            age = np.random.randint(*info["age_range"])
-            gender = np.random.choice(["M", "F"])
-
-            # Generate trips for each individual
-            if category == "Elderly":
-                num_days = np.random.randint(1, 3)  # Adjust to ensure at least one day is chosen
-                selected_days = np.random.choice(weekend, num_days, replace=False)
-                trip_types_available = ["House -> Store", "House -> Doctor", "House -> Other"]
-                for day in selected_days:
-                    selected_trip_type = np.random.choice(trip_types_available)  # Choose randomly among initial trips
-                    initial_departure_time = random_time(6, 19)
-                    return_departure_time = calculate_return_time(initial_departure_time)
-
-                    # Append initial trip
-                    rows.append([category, id_counter, gender, age, selected_trip_type, day, initial_departure_time])
-                    
-                    # Properly label return trip based on initial trip type
-                    if selected_trip_type == "House -> Store":
-                        return_trip_type = "Store -> House"
-                    elif selected_trip_type == "House -> Doctor":
-                        return_trip_type = "Doctor -> House"
-                    elif selected_trip_type == "House -> Other":
-                        return_trip_type = "Other -> House"
-                    
-                    # Append return trip
-                    rows.append([category, id_counter, gender, age, return_trip_type, day, return_departure_time])
-                
-                id_counter += 1
-    
-    return pd.DataFrame(rows, columns=["Category", "ID", "Gender", "Age", "Trip Type", "Trip Departure Day", "Trip Departure Time"])
+        size = info["size"] * scale
+        ages, genders = draw_people(rng, size, info["age_range"])
+
+        if category == "Elderly":
+            # 1 or 2 weekend days per person; each day a random trip type, out and back 1 h 30 min later
+            person, days = choose_days(rng, weekend, rng.integers(1, 3, size=size))
+            trip = rng.integers(0, 3, size=len(person))
+            outgoing_types = np.array(["House -> Store", "House -> Doctor", "House -> Other"], dtype=object)[trip]
+            return_types = np.array(["Store -> House", "Doctor -> House", "Other -> House"], dtype=object)[trip]
+            initial_departure = random_times(rng, 6, 19, len(person))
+            frames.append(trip_frame(category, first_id, ages, genders, np.repeat(person, 2),
+                                     interleave(outgoing_types, return_types), np.repeat(days, 2),
+                                     interleave(initial_departure, return_times(initial_departure))))
+
+        first_id += size
+
+    return concat_trips(frames)
 
 # generate and save the DataFrame
 trip_data = generate_trip_data()
-trip_data.to_excel("TransportationPeople_Group3.xlsx", index=False)
+add_time_labels(trip_data).to_excel("TransportationPeople_Group3.xlsx", index=False)
 
 
 # Now we have the people file! Let's do the matching.
@@ -109,13 +82,9 @@ trip_data_group3['Destination Location'] = trip_data_group3.apply(lambda x: assi
 # group those in Walmart, Meijer, Target together. group those in Kroger, MidMichigan Health, Dow Family Health together.
 # function to assign group numbers (of size 4) based on departure times and locations
 
-def time_within_threshold(time1, time2, threshold=30):
-    t1 = pd.to_datetime(time1, format='%H:%M')
-    t2 = pd.to_datetime(time2, format='%H:%M')
-    return abs((t2 - t1).total_seconds()) / 60 <= threshold
-
 def assign_group_numbers(data, max_group_size=4):
     group_counter = 1
+    group_numbers = pd.Series(np.nan, index=data.index, dtype=object)
 
     # Define sets of destinations for grouping
     set_one_destinations = ['Walmart', 'Meijer', 'Target']
@@ -140,34 +109,14 @@ def assign_group_numbers(data, max_group_size=4):
                 # Further group by destination and departure time proximity
                 for destination in destinations:
                     destination_data = group_data[group_data['Destination Location'] == destination]
-                    sorted_data = destination_data.sort_values(by='Trip Departure Time')
-
-                    while not sorted_data.empty:
-                        base_time = sorted_data.iloc[0]['Trip Departure Time']
-                        base_location = sorted_data.iloc[0]['House Location']
-                        base_destination = sorted_data.iloc[0]['Destination Location']
-
-                        # Determine the grouping condition based on destination
-                        if destination in random_nodes:
-                            # Group by specific node for random trips
-                            mask = sorted_data.apply(lambda row: time_within_threshold(row['Trip Departure Time'], base_time) and 
-                                                     row['Destination Location'] == base_destination and
-                                                     row['House Location'] == base_location, axis=1)
-                        else:
-                            # Group by time and location
-                            mask = sorted_data.apply(lambda row: time_within_threshold(row['Trip Departure Time'], base_time) and 
-                                                     row['House Location'] == base_location, axis=1)
-                            
-                        if mask.sum() < max_group_size:
-                            # Relax the house location constraint if necessary
-                            mask = sorted_data.apply(lambda row: time_within_threshold(row['Trip Departure Time'], base_time), axis=1)
-
-                        # Form a group with up to max_group_size members
-                        group_indices = sorted_data[mask].index[:max_group_size]
-                        data.loc[group_indices, 'Group Number'] = f'{group_counter}'
-                        sorted_data = sorted_data.drop(group_indices)
-                        group_counter += 1
-
+                    # One sweep over the trips in departure order: same house location first, then any house
+                    groups = sweep_groups(destination_data[DEPARTURE_MINUTE].to_numpy(),
+                                          destination_data['House Location'].to_numpy(), max_group_size)
+                    if len(groups):
+                        group_numbers[destination_data.index] = (group_counter + groups).astype(str)
+                        group_counter += int(groups.max()) + 1
+
+    data['Group Number'] = group_numbers
     return data
 
 # Applying the function to the DataFrame
@@ -175,7 +124,7 @@ trip_data_group3['Group Number'] = np.nan
 trip_data_group3 = assign_group_numbers(trip_data_group3)
 
 # Save the updated DataFrame with group numbers
-trip_data_group3.to_excel("ElderlyGroups.xlsx", index=False)
+add_time_labels(trip_data_group3).to_excel("ElderlyGroups.xlsx", index=False)
 
 # Print out the unique group counts by trip type and day
 group_counts = trip_data_group3.groupby(['Trip Departure Day', 'Trip Type'])['Group Number'].nunique()
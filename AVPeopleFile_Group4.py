@@ -1,6 +1,10 @@
 import random
 import pandas as pd
 import numpy as np
+from TripGenerator import (DEFAULT_SEED, DEPARTURE_MINUTE, add_time_labels, parse_times, draw_people, choose_days,
+                           choose_slots, interleave, random_times, return_times, trip_frame, concat_trips)
+from TripGrouping import bucket_groups, sweep_groups
+from WeeklySchedule import WeeklySchedule, day_mask
 
 categories_info = {
     "Family in Poverty Member": {"size": 1679, "age_range": (22, 62)}
@@ -17,74 +21,64 @@ trip_types = {
 
 poverty_trip_distribution = {"House -> Work": 0.5, "House -> Store": 0.3, "House -> Doctor": 0.1, "House -> Other": 0.1}
 
-def standardize_time(time_str):
-    if 'am' in time_str or 'pm' in time_str:
-        time_str = time_str.strip().lower().replace(' am', '').replace(' pm', '')
-        hour, minute = map(int, time_str.split(':'))
-        if 'pm' in time_str and hour < 12:
-            hour += 12
-        elif 'am' in time_str and hour == 12:
-            hour = 0
-    else:
-        hour, minute = map(int, time_str.split(':'))
-    return f"{hour:02}:{minute:02}"
-
-def random_time(start_hour, end_hour, min_hour=None):
-    if min_hour is not None:
-        start_hour = max(start_hour, min_hour + 1)
-    if start_hour >= end_hour:
-        return standardize_time(f"{end_hour:02}:{np.random.choice(['00', '15', '30', '45'])}")
-    hour = np.random.randint(start_hour, end_hour + 1)
-    minute = np.random.choice(["00", "15", "30", "45"])
-    return standardize_time(f"{hour:02}:{minute}")
-
-def calculate_return_time(initial_time):
-    initial_hour, initial_minute = map(int, initial_time.split(":"))
-    return_hour = initial_hour + 1
-    return_minute = initial_minute + 30
-    if return_minute >= 60:
-        return_hour += 1
-        return_minute -= 60
-    return standardize_time(f"{return_hour % 24:02}:{return_minute:02}")
-
-def generate_trip_data():
-    rows = []
-    id_counter = 1
+# Function to generate the people file from whole columns drawn on a seeded Generator (scale multiplies the size).
+# Returns the weekly schedule of the employed, who commute every weekday, and the trips of everyone else.
+def generate_trip_data(rng=None, scale=1):
+    rng = rng if rng is not None else np.random.default_rng(DEFAULT_SEED)
+    schedule = None
+    frames = []
+    first_id = 1
     for category, info in categories_info.items():
-        for i in range(info["size"]):
-            age = np.random.randint(*info["age_range"])
-            gender = np.random.choice(["M", "F"])
+        size = info["size"] * scale
+        ages, genders = draw_people(rng, size, info["age_range"])
+
+        if category == "Family in Poverty Member":
             trip_type_mapping = {
                 "House -> Work": "Work -> House",
                 "House -> Store": "Store -> House",
                 "House -> Doctor": "Doctor -> House",
                 "House -> Other": "Other -> House"
             }
-            
-            if i < (info["size"] // 2):
-                for day in weekdays:
-                    morning_departure_time = standardize_time(np.random.choice(["5:45 am", "6:00 am", "6:15 am", "6:30 am"], p=[0.25, 0.25, 0.25, 0.25]))
-                    evening_departure_hour = np.random.randint(18, 26)  # from 6:00 pm to 2:00 am
-                    evening_departure_time = standardize_time(f"{evening_departure_hour % 24:02}:{np.random.choice(['00', '15', '30', '45'])}")
-                    rows.append([category, id_counter, gender, age, "House -> Work", day, morning_departure_time])
-                    rows.append([category, id_counter, gender, age, "Work -> House", day, evening_departure_time])
-            else:
-                days = np.random.choice(all_days, np.random.randint(1, 8), replace=False)
-                for day in days:
-                    for trip_type in trip_types[category]:
-                        initial_departure_time = random_time(8, 22)
-                        return_trip_type = trip_type_mapping.get(trip_type, trip_type)
-                        return_departure_time = calculate_return_time(initial_departure_time) if trip_type in ["House -> Store", "House -> Doctor"] else random_time(int(initial_departure_time.split(":")[0]) + 1, 22)
-                        rows.append([category, id_counter, gender, age, trip_type, day, initial_departure_time])
-                        rows.append([category, id_counter, gender, age, return_trip_type, day, return_departure_time])
-
-            id_counter += 1
-    
-    return pd.DataFrame(rows, columns=["Category", "ID", "Gender", "Age", "Trip Type", "Trip Departure Day", "Trip Departure Time"])
-
-# Generate and save the DataFrame
-trip_data = generate_trip_data()
-trip_data.to_excel("TransportationPeople_Group4.xlsx", index=False)
+            employed = np.arange(size) < size // 2
+
+            # Employed (first half): every weekday to work in the morning and back between 6:00 pm and 2:00 am;
+            # returns after midnight stay on the shift day as minutes 1440 and up
+            workers = np.count_nonzero(employed)
+            morning_departure = choose_slots(rng, parse_times(["05:45", "06:00", "06:15", "06:30"]),
+                                             workers * len(weekdays))
+            evening_departure = random_times(rng, 18, 25, workers * len(weekdays))
+            schedule = WeeklySchedule.build(category, first_id, ages[employed], genders[employed], weekdays,
+                                            ["House -> Work", "Work -> House"],
+                                            np.full(workers, day_mask(weekdays, weekdays)),
+                                            np.stack([morning_departure, evening_departure], axis=1)
+                                            .reshape(workers, len(weekdays), 2))
+
+            # Not employed: 1 to 7 distinct days, and on each day every trip type, each followed by its return
+            # trip; times from 8:00 am to 10:00 pm
+            person, days = choose_days(rng, all_days, rng.integers(1, 8, size=size - np.count_nonzero(employed)))
+            person = np.flatnonzero(~employed)[person]
+            trip = np.tile(np.arange(len(trip_types[category])), len(person))
+            person, days = np.repeat(person, len(trip_types[category])), np.repeat(days, len(trip_types[category]))
+            outgoing_types = np.asarray(trip_types[category], dtype=object)[trip]
+            return_types = np.asarray([trip_type_mapping.get(trip_type, trip_type) for trip_type in trip_types[category]],
+                                      dtype=object)[trip]
+            initial_departure = random_times(rng, 8, 22, len(trip))
+            fixed_return = np.isin(outgoing_types, ["House -> Store", "House -> Doctor"])
+            return_departure = np.where(fixed_return, return_times(initial_departure),
+                                        random_times(rng, initial_departure // 60 + 1, 22, len(trip)))
+            frames.append(trip_frame(category, first_id, ages, genders, np.repeat(person, 2),
+                                     interleave(outgoing_types, return_types), np.repeat(days, 2),
+                                     interleave(initial_departure, return_departure)))
+
+        first_id += size
+
+    return schedule, concat_trips(frames)
+
+# Generate and save the people file: the commuters one row per person, the other trips one row per trip
+schedule, trip_data = generate_trip_data()
+with pd.ExcelWriter("TransportationPeople_Group4.xlsx") as writer:
+    schedule.to_compact_frame().to_excel(writer, sheet_name="Commuters", index=False)
+    add_time_labels(trip_data).to_excel(writer, sheet_name="Other Trips", index=False)
 
 # Now we have the people file! Let's do the matching.
 # We need to separate the people commuting to work/house and house/work from the rest of the trips
@@ -94,9 +88,12 @@ weekdays = ["M", "Tu", "W", "Th", "F"]
 weekends = ["Sat", "Sun"]
 trip_data_group4 = trip_data[trip_data['Category'] == "Family in Poverty Member"].copy()
 
-# add 'House Location' column to trip_data
-unique_ids = trip_data['ID'].unique()
+commuters = schedule.people
+
+# add 'House Location' column to the commuters and trip_data
+unique_ids = pd.concat([commuters['ID'], trip_data['ID']]).unique()
 house_locations = {uid: random.choice(['EM', 'NM', 'WM', 'SM', 'CM']) for uid in unique_ids}
+commuters['House Location'] = commuters['ID'].map(house_locations)
 trip_data_group4['House Location'] = trip_data_group4['ID'].map(house_locations)
 
 # Function for 'Destination Location'
@@ -110,6 +107,10 @@ def assign_destination_location(triptype):
     elif triptype in ['House -> Other', 'Other -> House']:
         return random.choice(['Random Node in WM', 'Random Node in EM', 'Random Node in NM', 'Random Node in SM', 'Random Node in CM'])
 
+# the commuters' workplace is drawn for every trip, like the other trips, and kept in the schedule per day and leg
+schedule.set_trip_column('Destination Location',
+                         [assign_destination_location(trip_type)
+                          for trip_type in np.asarray(schedule.legs, dtype=object)[schedule.trips()[2]]])
 trip_data_group4['Destination Location'] = trip_data_group4.apply(lambda x: assign_destination_location(x['Trip Type']), axis=1)
 
 # handle the work case separately
@@ -117,13 +118,9 @@ trip_data_group4['Destination Location'] = trip_data_group4.apply(lambda x: assi
 # function to assign group numbers (of size 4) based on departure times and locations
 
 # does store, doctor, and other trips first
-def time_within_threshold(time1, time2, threshold=30):
-    t1 = pd.to_datetime(time1, format='%H:%M')
-    t2 = pd.to_datetime(time2, format='%H:%M')
-    return abs((t2 - t1).total_seconds()) / 60 <= threshold
-
 def assign_group_numbers_other(data, max_group_size=4):
     group_counter = 1
+    group_numbers = pd.Series(np.nan, index=data.index, dtype=object)
 
     # Define sets of destinations for grouping
     set_one_destinations = ['Walmart', 'Meijer', 'Target']
@@ -148,34 +145,14 @@ def assign_group_numbers_other(data, max_group_size=4):
                 # Further group by destination and departure time proximity
                 for destination in destinations:
                     destination_data = group_data[group_data['Destination Location'] == destination]
-                    sorted_data = destination_data.sort_values(by='Trip Departure Time')
-
-                    while not sorted_data.empty:
-                        base_time = sorted_data.iloc[0]['Trip Departure Time']
-                        base_location = sorted_data.iloc[0]['House Location']
-                        base_destination = sorted_data.iloc[0]['Destination Location']
-
-                        # Determine the grouping condition based on destination
-                        if destination in random_nodes:
-                            # Group by specific node for random trips
-                            mask = sorted_data.apply(lambda row: time_within_threshold(row['Trip Departure Time'], base_time) and 
-                                                     row['Destination Location'] == base_destination and
-                                                     row['House Location'] == base_location, axis=1)
-                        else:
-                            # Group by time and location
-                            mask = sorted_data.apply(lambda row: time_within_threshold(row['Trip Departure Time'], base_time) and 
-                                                     row['House Location'] == base_location, axis=1)
-                            
-                        if mask.sum() < max_group_size:
-                            # Relax the house location constraint if necessary
-                            mask = sorted_data.apply(lambda row: time_within_threshold(row['Trip Departure Time'], base_time), axis=1)
-
-                        # Form a group with up to max_group_size members
-                        group_indices = sorted_data[mask].index[:max_group_size]
-                        data.loc[group_indices, 'Group Number'] = f'{group_counter}'
-                        sorted_data = sorted_data.drop(group_indices)
-                        group_counter += 1
-
+                    # One sweep over the trips in departure order: same house location first, then any house
+                    groups = sweep_groups(destination_data[DEPARTURE_MINUTE].to_numpy(),
+                                          destination_data['House Location'].to_numpy(), max_group_size)
+                    if len(groups):
+                        group_numbers[destination_data.index] = (group_counter + groups).astype(str)
+                        group_counter += int(groups.max()) + 1
+
+    data['Group Number'] = group_numbers
     return data
 
 # Applying the function to the DataFrame
@@ -185,78 +162,39 @@ if trip_data_group4['Trip Type'].isin(['House -> Store', 'Store -> House', 'Hous
 
 # now, let's handle the house to work and work to house trips
 # function to assign group numbers (of size 4) based on departure times and locations
-def assign_group_numbers_work(data):
+# (works on the commuters' weekly schedule: each day's trips are taken from it one leg at a time and the groups
+# stored back)
+def assign_group_numbers_work(schedule):
     group_counter = 1
 
     # loop over each day and handles morning + afternoon trips separately
     for day in weekdays:
-        # Process morning trips
-        morning_data = data[(data['Trip Departure Day'] == day) & (data['Trip Type'] == "House -> Work")]
-        morning_data['Group Number'] = np.nan  # Initialize group numbers
-        
-        for house in morning_data['House Location'].unique():
-            for time in morning_data['Trip Departure Time'].unique():
-                house_time_data = morning_data[(morning_data['House Location'] == house) & 
-                                               (morning_data['Trip Departure Time'] == time)]
-                # First, try to match all three criteria
-                for work in house_time_data['Destination Location'].unique():
-                    full_criteria_data = house_time_data[house_time_data['Destination Location'] == work]
-                    for i in range(0, len(full_criteria_data), 4):
-                        if len(full_criteria_data.iloc[i:i+4]) < 4:  # Check if less than 4 remain
-                            break  # Move to relaxing criteria if less than 4 students match
-
-                        data.loc[full_criteria_data.index[i:i+4], 'Group Number'] = f'{group_counter}'
-                        group_counter += 1
-
-                # Relax the work location criteria if groups of 4 can't be formed
-                remaining_data = house_time_data[pd.isna(house_time_data['Group Number'])]
-                for i in range(0, len(remaining_data), 4):
-                    group_data = remaining_data.iloc[i:i+4]
-                    data.loc[group_data.index, 'Group Number'] = f'{group_counter}'
-                    group_counter += 1
-
-        # Afternoon trips: Work -> House
-        afternoon_data = data[(data['Trip Departure Day'] == day) & (data['Trip Type'] == "Work -> House")]
-        afternoon_data['Group Number'] = np.nan
-
-        # Try to form groups based on all three criteria first
-        for work in afternoon_data['Destination Location'].unique():
-            for time in afternoon_data['Trip Departure Time'].unique():
-                work_time_data = afternoon_data[
-                    (afternoon_data['Destination Location'] == work) & 
-                    (afternoon_data['Trip Departure Time'] == time)
-                ]
-
-                for i in range(0, len(work_time_data), 4):
-                    if len(work_time_data.iloc[i:i+4]) < 4:
-                        continue  # Skip if the group would be less than 4
-
-                    data.loc[work_time_data.index[i:i+4], 'Group Number'] = f'{group_counter}'
-                    group_counter += 1
-
-        # Fill remaining spots in groups by relaxing the house location criteria
-        remaining_data = afternoon_data[pd.isna(afternoon_data['Group Number'])]
-        for work in remaining_data['Destination Location'].unique():
-            for time in remaining_data['Trip Departure Time'].unique():
-                remaining_work_time_data = remaining_data[
-                    (remaining_data['Destination Location'] == work) & 
-                    (remaining_data['Trip Departure Time'] == time)
-                ]
-
-                while len(remaining_work_time_data) > 0:
-                    group_data = remaining_work_time_data.iloc[:4]  # Take up to 4
-                    data.loc[group_data.index, 'Group Number'] = f'{group_counter}'
-                    remaining_work_time_data = remaining_work_time_data.iloc[4:]
-                    group_counter += 1
-
-    return data
-
-if trip_data_group4['Trip Type'].isin(['House -> Work', 'Work -> House']).any():
-    # trip_data_group4['Group Number'] = np.nan
-    trip_data_group4 = assign_group_numbers_work(trip_data_group4)
+        # Morning trips: groups matching house, time and work first, then the leftovers of each house and time
+        # together (relaxing the work location)
+        morning_data = schedule.day_frame(day, "House -> Work")
+        groups = bucket_groups(morning_data, ['House Location', DEPARTURE_MINUTE, 'Destination Location'],
+                               ['House Location', DEPARTURE_MINUTE])
+        schedule.set_groups(day, "House -> Work",
+                            pd.Series((group_counter + groups).astype(str), index=morning_data.index))
+        group_counter += len(np.unique(groups))
+
+        # Afternoon trips: Work -> House, grouped by work and time
+        afternoon_data = schedule.day_frame(day, "Work -> House")
+        groups = bucket_groups(afternoon_data, ['Destination Location', DEPARTURE_MINUTE])
+        schedule.set_groups(day, "Work -> House",
+                            pd.Series((group_counter + groups).astype(str), index=afternoon_data.index))
+        group_counter += len(np.unique(groups))
+
+    return schedule
+
+if len(schedule):
+    schedule = assign_group_numbers_work(schedule)
+
+# the commuters' trips are expanded to one row per trip, ahead of the other trips as in the people file
+trip_data_group4 = pd.concat([schedule.to_frame(), trip_data_group4], ignore_index=True)
 
 # Save the updated DataFrame with group numbers
-trip_data_group4.to_excel("PovertyGroups.xlsx", index=False)
+add_time_labels(trip_data_group4).to_excel("PovertyGroups.xlsx", index=False)
 
 # Print out the unique group counts by trip type and day
 group_counts = trip_data_group4.groupby(['Trip Departure Day', 'Trip Type'])['Group Number'].nunique()
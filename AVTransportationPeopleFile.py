@@ -1,6 +1,6 @@
-import pandas as pd
 import numpy as np
-import random
+from TripGenerator import (DEFAULT_SEED, add_time_labels, parse_times, draw_people, choose_days, choose_slots,
+                           interleave, random_times, return_times, trip_frame, concat_trips)
 
 categories_info = {
     "Students to/from school": {"size": 264, "age_range": (14, 18)},
@@ -23,101 +23,90 @@ trip_types = {
 elderly_trip_distribution = {"House -> Store": 0.4, "House -> Doctor": 0.2, "House -> Other": 0.4}
 poverty_trip_distribution = {"House -> Work": 0.5, "House -> Store": 0.3, "House -> Doctor": 0.1, "House -> Other": 0.1}
 
-def random_time(start_hour, end_hour, min_hour=None):
-    if min_hour is not None:
-        start_hour = max(start_hour, min_hour + 1)
-    if start_hour >= end_hour:
-        return f"{end_hour:02d}:{np.random.choice(['00', '15', '30', '45'])}"
-    hour = np.random.randint(start_hour, end_hour + 1)
-    minute = np.random.choice(["00", "15", "30", "45"])
-    return f"{hour:02d}:{minute}"
+# Function to generate the people file column by column: every draw of a category (ages, genders, days,
+# departure slots) is one NumPy call on a seeded Generator. scale multiplies the category sizes.
+def generate_trip_data(rng=None, scale=1):
+    rng = rng if rng is not None else np.random.default_rng(DEFAULT_SEED)
+    frames = []
+    first_id = 1
+    for category, info in categories_info.items():
+        size = info["size"] * scale
+        ages, genders = draw_people(rng, size, info["age_range"])
 
-def calculate_return_time(initial_time):
-    initial_hour, initial_minute = map(int, initial_time.split(":"))
-    return_hour = initial_hour + 1
-    return_minute = initial_minute + 30
-    if return_minute >= 60:
-        return_hour += 1
-        return_minute -= 60
-    return f"{return_hour % 24:02d}:{return_minute:02d}"
+        if category == "Students to/from school":
+            # Every weekday, one trip each way: rows ordered by person, day, trip type
+            person, day, trip = np.indices((size, len(weekdays), 2)).reshape(3, -1)
+            slots = parse_times(["6:30", "6:45", "7:00", "14:45", "15:00", "15:15"]).reshape(2, 3)
+            minutes = slots[trip, rng.integers(0, slots.shape[1], size=len(trip))]
+            frames.append(trip_frame(category, first_id, ages, genders, person,
+                                     np.asarray(trip_types[category], dtype=object)[trip],
+                                     np.asarray(weekdays, dtype=object)[day], minutes))
+        elif category == "Students leaving from an after-school program":
+            # 1 to 5 distinct weekdays per student, one trip home on each
+            person, days = choose_days(rng, weekdays, rng.integers(1, 6, size=size))
+            minutes = choose_slots(rng, parse_times(["15:30", "15:45", "16:00", "16:15", "16:30", "16:45", "17:00", "17:15", "17:30"]), len(person))
+            frames.append(trip_frame(category, first_id, ages, genders, person,
+                                     np.full(len(person), "School -> House", dtype=object), days, minutes))
+        elif category == "Elderly":
+            # 0 to 2 weekend days per person and one trip type per person, out and back on each day
+            person, days = choose_days(rng, weekend, rng.integers(0, 3, size=size))
+            selected = rng.choice(len(elderly_trip_distribution), size=size, p=list(elderly_trip_distribution.values()))
+            trip = selected[person]
+            outgoing_types = list(elderly_trip_distribution)
+            return_types = [trip_type.replace("House", "Return").replace("->", "<-") if trip_type in ["House -> Store", "House -> Doctor"]
+                            else trip_type.replace("Return", "House").replace("<-", "->") for trip_type in outgoing_types]
+            # Store and doctor visits return 1 h 30 min later, other trips some whole hours later (up to 20:45)
+            initial_departure = random_times(rng, 6, 19, len(person))
+            fixed_return = np.isin(np.asarray(outgoing_types, dtype=object)[trip], ["House -> Store", "House -> Doctor"])
+            return_departure = np.where(fixed_return, return_times(initial_departure),
+                                        random_times(rng, initial_departure // 60 + 1, 20, len(person)))
+            frames.append(trip_frame(category, first_id, ages, genders, np.repeat(person, 2),
+                                     interleave(np.asarray(outgoing_types, dtype=object)[trip],
+                                                np.asarray(return_types, dtype=object)[trip]),
+                                     np.repeat(days, 2),
+                                     interleave(initial_departure, return_departure)))
+        elif category == "Family in Poverty Member":
+            trip_type_mapping = {
+                "House -> Work": "Work -> House",
+                "House -> Store": "Store -> House",
+                "House -> Doctor": "Doctor -> House",
+                "House -> Other": "Other -> House"
+            }
+            employed = np.arange(size) < size // 2
 
-def generate_trip_data():
-    rows = []
-    id_counter = 1
-    for category, info in categories_info.items():
-        for _ in range(info["size"]):
-            age = np.random.randint(*info["age_range"])
-            gender = np.random.choice(["M", "F"])
-            
-            if category == "Students to/from school":
-                for day in weekdays:
-                    for trip_type in trip_types[category]:
-                        if trip_type == "House -> School":
-                            departure_time = random.choice(["6:30", "6:45", "7:00"])
-                        else:
-                            departure_time = random.choice(["14:45", "15:00", "15:15"])
-                        rows.append([category, id_counter, gender, age, trip_type, day, departure_time])
-                id_counter += 1
-            
-            elif category == "Students leaving from an after-school program":
-                for day in np.random.choice(weekdays, np.random.randint(1, 6), replace=False):
-                    departure_time = random.choice(["15:30", "15:45", "16:00", "16:15", "16:30", "16:45", "17:00", "17:15", "17:30"])
-                    rows.append([category, id_counter, gender, age, "School -> House", day, departure_time])
+            # Employed (first half): every weekday to work in the morning and back between 6:00 pm and 2:00 am;
+            # returns after midnight stay on the shift day as minutes 1440 and up
+            person, day = np.indices((np.count_nonzero(employed), len(weekdays))).reshape(2, -1)
+            person = np.flatnonzero(employed)[person]
+            morning_departure = choose_slots(rng, parse_times(["5:45 am", "6:00 am", "6:15 am", "6:30 am"]), len(person))
+            evening_departure = random_times(rng, 18, 25, len(person))
+            frames.append(trip_frame(category, first_id, ages, genders, np.repeat(person, 2),
+                                     interleave(np.full(len(person), "House -> Work", dtype=object),
+                                                np.full(len(person), "Work -> House", dtype=object)),
+                                     np.repeat(np.asarray(weekdays, dtype=object)[day], 2),
+                                     interleave(morning_departure, evening_departure)))
+
+            # Not employed: 1 to 7 distinct days, and on each day every trip type, each followed by its return
+            # trip; times from 8:00 am to 10:00 pm
+            person, days = choose_days(rng, all_days, rng.integers(1, 8, size=size - np.count_nonzero(employed)))
+            person = np.flatnonzero(~employed)[person]
+            trip = np.tile(np.arange(len(trip_types[category])), len(person))
+            person, days = np.repeat(person, len(trip_types[category])), np.repeat(days, len(trip_types[category]))
+            outgoing_types = np.asarray(trip_types[category], dtype=object)[trip]
+            return_types = np.asarray([trip_type_mapping.get(trip_type, trip_type) for trip_type in trip_types[category]],
+                                      dtype=object)[trip]
+            initial_departure = random_times(rng, 8, 22, len(trip))
+            fixed_return = np.isin(outgoing_types, ["House -> Store", "House -> Doctor"])
+            return_departure = np.where(fixed_return, return_times(initial_departure),
+                                        random_times(rng, initial_departure // 60 + 1, 22, len(trip)))
+            frames.append(trip_frame(category, first_id, ages, genders, np.repeat(person, 2),
+                                     interleave(outgoing_types, return_types), np.repeat(days, 2),
+                                     interleave(initial_departure, return_departure)))
 
-                id_counter += 1
-            
-            elif category == "Elderly":
-                num_days = np.random.randint(0, 3)  # This will give you 0, 1, or 2
-                selected_days = np.random.choice(weekend, num_days, replace=False)
-                selected_trip_type = np.random.choice(list(elderly_trip_distribution.keys()), p=list(elderly_trip_distribution.values()))
-                for day in selected_days:
-                    # generate two trips for each selected day with logical departure times
-                    initial_departure_time = random_time(6, 19)
-                    if selected_trip_type in ["House -> Store", "House -> Doctor"]:
-                        return_departure_time = calculate_return_time(initial_departure_time)
-                    else:
-                        return_departure_time = random_time(int(initial_departure_time.split(":")[0]) + 1, 20)
-        
-                    rows.append([category, id_counter, gender, age, selected_trip_type, day, initial_departure_time])
-                    return_trip_type = selected_trip_type.replace("House", "Return").replace("->", "<-") if selected_trip_type in ["House -> Store", "House -> Doctor"] else selected_trip_type.replace("Return", "House").replace("<-", "->")
-                    rows.append([category, id_counter, gender, age, return_trip_type, day, return_departure_time])
-                
-                id_counter += 1
-         
-            elif category == "Family in Poverty Member":
-                trip_type_mapping = {
-                    "House -> Work": "Work -> House",
-                    "House -> Store": "Store -> House",
-                    "House -> Doctor": "Doctor -> House",
-                    "House -> Other": "Other -> House"
-                }
-                for _ in range(info["size"]):
-                    gender = np.random.choice(["M", "F"])
-                    age = np.random.randint(*info["age_range"])
+        first_id += size
 
-                    if id_counter <= (info["size"] // 2):
-                    # Employed, specific departure times for House -> Work and variable for Work -> House
-                        for day in weekdays:
-                            morning_departure_time = np.random.choice(["5:45 am", "6:00 am", "6:15 am", "6:30 am"], p=[0.25, 0.25, 0.25, 0.25])
-                            evening_departure_hour = np.random.randint(18, 26)  # from 6:00 pm to 2:00 am
-                            evening_departure_time = f"{evening_departure_hour % 24:02d}:{np.random.choice(['00', '15', '30', '45'])}"
-                            rows.append([category, id_counter, gender, age, "House -> Work", day, morning_departure_time])
-                            rows.append([category, id_counter, gender, age, "Work -> House", day, evening_departure_time])
-                    else:
-                    # Not employed, random trips with time from 8:00 am to 10:00 pm
-                        days = np.random.choice(all_days, np.random.randint(1, 8), replace=False)
-                        for day in days:
-                            for trip_type in trip_types[category]:
-                                initial_departure_time = random_time(8, 22)  # random time from 8:00 am to 10:00 pm
-                                return_trip_type = trip_type_mapping.get(trip_type, trip_type)
-                                return_departure_time = calculate_return_time(initial_departure_time) if trip_type in ["House -> Store", "House -> Doctor"] else random_time(int(initial_departure_time.split(":")[0]) + 1, 22)
-                                rows.append([category, id_counter, gender, age, trip_type, day, initial_departure_time])
-                                rows.append([category, id_counter, gender, age, return_trip_type, day, return_departure_time])
-        
-                    id_counter += 1  # Increment id_counter inside the outer for loop to ensure proper counting
-    
-    return pd.DataFrame(rows, columns=["Category", "ID", "Gender", "Age", "Trip Type", "Trip Departure Day", "Trip Departure Time"])
+    return concat_trips(frames)
 
 # generate and save the DataFrame
 trip_data = generate_trip_data()
-trip_data.to_excel("TransportationPeople.xlsx", index=False)
\ No newline at end of file
+add_time_labels(trip_data).to_excel("TransportationPeople.xlsx", index=False)
\ No newline at end of file
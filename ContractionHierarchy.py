@@ -0,0 +1,312 @@
+import heapq
+import json
+import math
+import os
+import shutil
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# Bump when the hierarchy layout changes so old hierarchies are rebuilt
+HIERARCHY_FORMAT_VERSION = 1
+# Witness searches stop after settling this many nodes; a missed witness only adds a redundant shortcut
+WITNESS_SETTLE_LIMIT = 200
+HIERARCHY_ARRAYS = ['rank', 'up_indptr', 'up_indices', 'up_weights', 'up_middle',
+                    'down_indptr', 'down_indices', 'down_weights', 'down_middle']
+
+# Default hierarchy location: Midland_road_network.graphml -> Midland_road_network.ch/
+def hierarchy_dir_for(graphml_path):
+    return os.path.splitext(graphml_path)[0] + '.ch'
+
+# Function to contract every node of the engine's graph, cheapest first by edge difference
+# (shortcuts added - edges removed, plus the number of already contracted neighbours to spread the
+# order out). Returns the node ranks and the upward / downward edge lists as
+# (tail, head, weight, middle) tuples, where middle is the contracted node a shortcut bypasses (-1 for
+# original edges). Upward edges go tail -> head with rank[head] > rank[tail]; downward edges are original
+# direction head -> tail with rank[head] > rank[tail], stored at tail for the backward search.
+def contract_graph(engine, witness_settle_limit=WITNESS_SETTLE_LIMIT):
+    n = len(engine.node_ids)
+    out_edges = [dict() for _ in range(n)]
+    in_edges = [dict() for _ in range(n)]
+    middle = {}
+    indptr, indices, weights = engine.indptr.tolist(), engine.indices.tolist(), engine.graph.data.tolist()
+    for u in range(n):
+        for position in range(indptr[u], indptr[u + 1]):
+            v, weight = indices[position], weights[position]
+            out_edges[u][v] = weight
+            in_edges[v][u] = weight
+
+    # Local Dijkstra from source that never passes through `skip`. It stops once every target is settled,
+    # beyond the largest candidate weight, or after witness_settle_limit nodes.
+    def witness_distances(source, skip, candidates):
+        limit = max(candidates.values())
+        remaining = len(candidates)
+        distances = {source: 0.0}
+        heap = [(0.0, source)]
+        settled = 0
+        while heap and settled < witness_settle_limit:
+            distance, u = heapq.heappop(heap)
+            if distance > distances[u]:
+                continue
+            if distance > limit:
+                break
+            if u in candidates:
+                remaining -= 1
+                if remaining == 0:
+                    break
+            settled += 1
+            for v, weight in out_edges[u].items():
+                if v == skip:
+                    continue
+                candidate = distance + weight
+                if candidate < distances.get(v, math.inf):
+                    distances[v] = candidate
+                    heapq.heappush(heap, (candidate, v))
+        return distances
+
+    # Shortcuts needed to contract v: u -> v -> w pairs with no witness path of the same weight or less
+    def shortcuts_for(v):
+        shortcuts = []
+        for u, in_weight in in_edges[v].items():
+            candidates = {w: in_weight + out_weight for w, out_weight in out_edges[v].items() if w != u}
+            if not candidates:
+                continue
+            distances = witness_distances(u, v, candidates)
+            for w, weight in candidates.items():
+                if distances.get(w, math.inf) > weight:
+                    shortcuts.append((u, w, weight))
+        return shortcuts
+
+    contracted_neighbors = [0] * n
+    def priority(v):
+        shortcuts = shortcuts_for(v)
+        return len(shortcuts) - len(in_edges[v]) - len(out_edges[v]) + contracted_neighbors[v], shortcuts
+
+    heap = [(priority(v)[0], v) for v in range(n)]
+    heapq.heapify(heap)
+    rank = np.zeros(n, dtype=np.int32)
+    up, down = [], []
+    next_rank = 0
+    while heap:
+        _, v = heapq.heappop(heap)
+        # Lazy update: the priority may have grown since it was pushed
+        current, shortcuts = priority(v)
+        if heap and current > heap[0][0]:
+            heapq.heappush(heap, (current, v))
+            continue
+
+        rank[v] = next_rank
+        next_rank += 1
+        # v's remaining edges all lead to nodes contracted later, i.e. ranked higher
+        for w, weight in out_edges[v].items():
+            up.append((v, w, weight, middle.get((v, w), -1)))
+            del in_edges[w][v]
+            contracted_neighbors[w] += 1
+        for u, weight in in_edges[v].items():
+            down.append((v, u, weight, middle.get((u, v), -1)))
+            del out_edges[u][v]
+            contracted_neighbors[u] += 1
+        out_edges[v] = {}
+        in_edges[v] = {}
+        for u, w, weight in shortcuts:
+            if weight < out_edges[u].get(w, math.inf):
+                out_edges[u][w] = weight
+                in_edges[w][u] = weight
+                middle[(u, w)] = v
+    return rank, up, down
+
+# Function to pack (tail, head, weight, middle) edges into CSR arrays keyed by tail
+def _edges_to_csr(edges, n):
+    edges = sorted(edges)
+    tails = np.array([edge[0] for edge in edges], dtype=np.int64)
+    indptr = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(tails, minlength=n), out=indptr[1:])
+    return (indptr, np.array([edge[1] for edge in edges], dtype=np.int32),
+            np.array([edge[2] for edge in edges], dtype=np.float64),
+            np.array([edge[3] for edge in edges], dtype=np.int32))
+
+# Function to turn CSR arrays into one [(head, weight), ...] list per tail
+def _adjacency_lists(indptr, indices, weights):
+    indptr, edges = indptr.tolist(), list(zip(indices.tolist(), weights.tolist()))
+    return [edges[indptr[u]:indptr[u + 1]] for u in range(len(indptr) - 1)]
+
+# Contraction hierarchy over a RoutingEngine's current search weights. Queries are two upward searches,
+# forward from the source and backward from the target, on the upward / downward DAGs; the shortest
+# distance meets at the node minimising forward + backward distance. Single pairs run a pruned bidirectional
+# search in Python, matrices run scipy over all sources and targets at once. Shortcuts are unpacked back into
+# original edges through the middle node they bypass.
+class ContractionHierarchy:
+    def __init__(self, engine, arrays, graph_hash=None):
+        self.engine = engine
+        self.graph_hash = graph_hash if graph_hash is not None else engine.graph_hash
+        n = len(engine.node_ids)
+        for name, array in arrays.items():
+            setattr(self, name, array)
+        self.up_graph = csr_matrix((np.asarray(self.up_weights), self.up_indices, self.up_indptr), shape=(n, n))
+        self.down_graph = csr_matrix((np.asarray(self.down_weights), self.down_indices, self.down_indptr), shape=(n, n))
+        # Upward / downward adjacency as Python lists for single-pair queries, built on first use
+        self._adjacency = None
+        # Shortcut (tail, head) in original direction -> bypassed node
+        self.middle = {}
+        for indptr, indices, middle, upward in ((self.up_indptr, self.up_indices, self.up_middle, True),
+                                                (self.down_indptr, self.down_indices, self.down_middle, False)):
+            tails = np.repeat(np.arange(n), np.diff(indptr))
+            shortcut = np.flatnonzero(np.asarray(middle) >= 0)
+            for tail, head, via in zip(tails[shortcut].tolist(), np.asarray(indices)[shortcut].tolist(),
+                                       np.asarray(middle)[shortcut].tolist()):
+                self.middle[(tail, head) if upward else (head, tail)] = via
+
+    @classmethod
+    def build(cls, engine, witness_settle_limit=WITNESS_SETTLE_LIMIT):
+        n = len(engine.node_ids)
+        rank, up, down = contract_graph(engine, witness_settle_limit)
+        up_indptr, up_indices, up_weights, up_middle = _edges_to_csr(up, n)
+        down_indptr, down_indices, down_weights, down_middle = _edges_to_csr(down, n)
+        arrays = {
+            'rank': rank,
+            'up_indptr': up_indptr, 'up_indices': up_indices, 'up_weights': up_weights, 'up_middle': up_middle,
+            'down_indptr': down_indptr, 'down_indices': down_indices, 'down_weights': down_weights,
+            'down_middle': down_middle,
+        }
+        return cls(engine, arrays)
+
+    @classmethod
+    def open(cls, hierarchy_dir, engine):
+        with open(os.path.join(hierarchy_dir, 'meta.json')) as file:
+            meta = json.load(file)
+        arrays = {name: np.load(os.path.join(hierarchy_dir, f'{name}.npy'), mmap_mode='r') for name in HIERARCHY_ARRAYS}
+        return cls(engine, arrays, meta['graph_hash'])
+
+    # Function to write the hierarchy to a directory, swapped in at the end like graph snapshots
+    def save(self, hierarchy_dir):
+        tmp_dir = f'{hierarchy_dir}.tmp-{os.getpid()}'
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in HIERARCHY_ARRAYS:
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), getattr(self, name))
+        meta = {
+            'format_version': HIERARCHY_FORMAT_VERSION,
+            'graph_hash': self.graph_hash,
+            'shortcuts': len(self.middle),
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=2)
+        if os.path.isdir(hierarchy_dir):
+            shutil.rmtree(hierarchy_dir)
+        os.replace(tmp_dir, hierarchy_dir)
+
+    # Shortest path length matrix with one row per source and one column per target. The meeting minimum
+    # is taken one source at a time over the nodes its upward search reached, so memory stays at the two
+    # search matrices instead of growing with sources x targets x nodes.
+    def many_to_many(self, sources, targets):
+        forward = dijkstra(self.up_graph, directed=True, indices=self.engine.index(sources))
+        backward = dijkstra(self.down_graph, directed=True, indices=self.engine.index(targets))
+        forward, backward = forward.reshape(-1, len(self.rank)), backward.reshape(-1, len(self.rank))
+        matrix = np.full((len(forward), len(backward)), np.inf)
+        for i, row in enumerate(forward):
+            reached = np.flatnonzero(np.isfinite(row))
+            if len(reached) and len(backward):
+                matrix[i] = (backward[:, reached] + row[reached]).min(axis=1)
+        return matrix
+
+    # Shortest path lengths from one source to every target
+    def one_to_many(self, source, targets):
+        return self.many_to_many([source], targets)[0]
+
+    # Single-pair shortest path length
+    def distance(self, source, target):
+        return self._query(self.engine.node_index[source], self.engine.node_index[target])[0]
+
+    # Single-pair shortest path as a list of node ids, with every shortcut unpacked
+    def path(self, source, target):
+        source_index, target_index = self.engine.node_index[source], self.engine.node_index[target]
+        distance, meeting, forward_parents, backward_parents = self._query(source_index, target_index)
+        if not math.isfinite(distance):
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+
+        # Hierarchy path: source up to the meeting node, then down to target
+        hops = [meeting]
+        while hops[-1] != source_index:
+            hops.append(forward_parents[hops[-1]])
+        hops.reverse()
+        while hops[-1] != target_index:
+            hops.append(backward_parents[hops[-1]])
+
+        path = [hops[0]]
+        for tail, head in zip(hops, hops[1:]):
+            path.extend(self.unpack(tail, head))
+        return self.engine.node_ids[path].tolist()
+
+    # Function to run the bidirectional upward search between two node indices. The forward and backward
+    # searches take turns, and each stops once its nearest queued node is no closer than the best meeting
+    # found so far. A node that a higher ranked node already reaches more cheaply (through an edge of the
+    # other direction) cannot be on a shortest path, so its edges are not relaxed (stall-on-demand).
+    # Returns (distance, meeting node, forward parents, backward parents); distance is inf when target
+    # cannot be reached.
+    def _query(self, source_index, target_index):
+        if self._adjacency is None:
+            self._adjacency = (_adjacency_lists(self.up_indptr, self.up_indices, self.up_weights),
+                               _adjacency_lists(self.down_indptr, self.down_indices, self.down_weights))
+        distances = ({source_index: 0.0}, {target_index: 0.0})
+        parents = ({source_index: -1}, {target_index: -1})
+        heaps = ([(0.0, source_index)], [(0.0, target_index)])
+        inf = math.inf
+        best, meeting = inf, -1
+        side = 0
+        while True:
+            if not (heaps[side] and heaps[side][0][0] < best):
+                side = 1 - side
+                if not (heaps[side] and heaps[side][0][0] < best):
+                    break
+            heap, side_distances = heaps[side], distances[side]
+            distance, u = heapq.heappop(heap)
+            if distance <= side_distances[u]:
+                other = distances[1 - side].get(u)
+                if other is not None and distance + other < best:
+                    best, meeting = distance + other, u
+                for w, weight in self._adjacency[1 - side][u]:
+                    if side_distances.get(w, inf) + weight < distance:
+                        break
+                else:
+                    side_parents = parents[side]
+                    for v, weight in self._adjacency[side][u]:
+                        candidate = distance + weight
+                        if candidate < side_distances.get(v, inf):
+                            side_distances[v] = candidate
+                            side_parents[v] = u
+                            heapq.heappush(heap, (candidate, v))
+            side = 1 - side
+        return best, meeting, parents[0], parents[1]
+
+    # Function to expand edge tail -> head into original edges; returns the nodes after tail
+    def unpack(self, tail, head):
+        nodes = []
+        stack = [(tail, head)]
+        while stack:
+            u, w = stack.pop()
+            via = self.middle.get((u, w))
+            if via is None:
+                nodes.append(w)
+            else:
+                stack.append((via, w))
+                stack.append((u, via))
+        return nodes
+
+# Function to open the contraction hierarchy for a GraphML road network, rebuilding it if it is missing
+# or was built for another graph_hash (graph or search weights changed)
+def load_hierarchy(graphml_path, engine, hierarchy_dir=None):
+    if engine.graph_hash is None:
+        return ContractionHierarchy.build(engine)
+    hierarchy_dir = hierarchy_dir or hierarchy_dir_for(graphml_path)
+    meta_path = os.path.join(hierarchy_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if meta.get('format_version') == HIERARCHY_FORMAT_VERSION and meta.get('graph_hash') == engine.graph_hash:
+            return ContractionHierarchy.open(hierarchy_dir, engine)
+        print(f"Contraction hierarchy in {hierarchy_dir} is out of date, rebuilding...")
+    else:
+        print(f"Building contraction hierarchy for {graphml_path}...")
+    hierarchy = ContractionHierarchy.build(engine)
+    hierarchy.save(hierarchy_dir)
+    return hierarchy
@@ -1,46 +1,11 @@
+import numpy as np
 import pandas as pd
-import geopandas as gpd
 from shapely.geometry import Polygon
-import networkx as nx
-from shapely.geometry.base import BaseGeometry
-from shapely import wkt
+from RegionNodeIndex import NO_NODE
+from RoadNetwork import publish_road_network
 
-G = nx.read_graphml('Midland_road_network1.graphml')
-
-for node, data in G.nodes(data=True):
-    try:
-        data['x'] = float(data['x'])
-        data['y'] = float(data['y'])
-    except ValueError as e:
-        print(f"Error converting node {node} coordinates to float: {e}")
-
-def ensure_geometry(data):
-    if isinstance(data, str):
-        try:
-            geom = wkt.loads(data)
-            if not geom.is_valid:
-                geom = geom.buffer(0)
-            return geom
-        except Exception as e:
-            print(f"Error converting WKT to Geometry: {e}")
-            return None
-    elif isinstance(data, BaseGeometry):
-        if not data.is_valid:
-            return data.buffer(0)
-        return data
-    return None
-    
-# Validate and fix geometries in the graph
-for u, v, key, data in G.edges(keys=True, data=True):
-    if 'geometry' in data:
-        geom = ensure_geometry(data['geometry'])
-        if geom is None or not geom.is_valid:
-            data['geometry'] = None
-        else:
-            data['geometry'] = geom
-
-nodes_data = [{'node': node, 'x': data['x'], 'y': data['y']} for node, data in G.nodes(data=True)]
-nodes_gdf = gpd.GeoDataFrame(nodes_data, geometry=gpd.points_from_xy([node['x'] for node in nodes_data], [node['y'] for node in nodes_data]))
+# Open the shared road network snapshot (memory-mapped; built from the cached OSM responses if needed)
+snapshot = publish_road_network()
 
 students_df = pd.read_excel('School1Groups.xlsx')
 
@@ -66,34 +31,23 @@ regions = {
 students_df['Node'] = None
 students_df['Coordinates'] = None
 
-# Assign unique locations per student ID
-unique_locations = {}
-
-# function to find a random node within a given region
-def get_random_node_within_polygon(polygon, nodes):
-    potential_nodes = nodes[nodes.within(polygon)]
-    return potential_nodes.sample(1).iloc[0] if not potential_nodes.empty else None
+# Nodes inside each region, labelled once and stored with the snapshot
+region_nodes = snapshot.region_nodes(regions)
+rng = np.random.default_rng()
 
-# Iterate over unique student IDs
-for student_id in students_df['ID'].unique():
-    student_rows = students_df[students_df['ID'] == student_id]
-    region_name = student_rows.iloc[0]['House Location']
-    region_polygon = regions.get(region_name, None)
-    
-    if region_polygon is not None:
-        random_node = get_random_node_within_polygon(region_polygon, nodes_gdf)
-        if random_node is not None:
-            unique_locations[student_id] = {
-                'Node': random_node['node'],
-                'Coordinates': (random_node['x'], random_node['y'])
-            }
+# Draw a random node inside the house region of every student ID, one draw per region
+students = students_df.drop_duplicates('ID')
+picked = region_nodes.sample_many(students['House Location'], rng)
+assigned = picked != NO_NODE
+picked = picked[assigned]
+unique_locations = pd.DataFrame({
+    'Node': snapshot.node_ids[picked].tolist(),
+    'Coordinates': list(zip(snapshot.x[picked].tolist(), snapshot.y[picked].tolist()))
+}, index=students['ID'][assigned])
 
 # Update the DataFrame with the assigned locations
-for i, row in students_df.iterrows():
-    student_id = row['ID']
-    if student_id in unique_locations:
-        students_df.at[i, 'Node'] = unique_locations[student_id]['Node']
-        students_df.at[i, 'Coordinates'] = unique_locations[student_id]['Coordinates']
+students_df['Node'] = students_df['ID'].map(unique_locations['Node'])
+students_df['Coordinates'] = students_df['ID'].map(unique_locations['Coordinates'])
 
 # save to Excel
 students_df.to_excel('School1GroupsUpdated.xlsx', index=False)
\ No newline at end of file
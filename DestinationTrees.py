@@ -0,0 +1,114 @@
+import json
+import os
+import shutil
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+# Bump when the tree layout changes so old trees are rebuilt
+TREES_FORMAT_VERSION = 1
+TREE_ARRAYS = ['from_distances', 'from_predecessors', 'to_distances', 'to_predecessors']
+
+# Default tree location: Midland_road_network.graphml -> Midland_road_network.trees/
+def trees_dir_for(graphml_path):
+    return os.path.splitext(graphml_path)[0] + '.trees'
+
+# Full shortest path trees from and to each fixed destination (schools, shops, workplaces), indexed by
+# node index. Almost every trip starts or ends at one of these few nodes, so any leg touching one is a
+# lookup plus a predecessor walk instead of a search. On an undirected graph the "to" trees are the
+# "from" trees.
+class DestinationTrees:
+    def __init__(self, engine, nodes, arrays, graph_hash=None):
+        self.engine = engine
+        self.graph_hash = graph_hash if graph_hash is not None else engine.graph_hash
+        self.nodes = list(nodes)
+        self.position = {node: i for i, node in enumerate(self.nodes)}
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def build(cls, engine, nodes):
+        nodes = list(dict.fromkeys(nodes))
+        graph = engine.graph
+        from_distances, from_predecessors = dijkstra(graph, directed=True, indices=engine.index(nodes),
+                                                     return_predecessors=True)
+        if (abs(graph - graph.T) > 0).nnz == 0:
+            to_distances, to_predecessors = from_distances, from_predecessors
+        else:
+            # Searching the reversed graph gives distances to the destination and next hops towards it
+            to_distances, to_predecessors = dijkstra(graph.T.tocsr(), directed=True, indices=engine.index(nodes),
+                                                     return_predecessors=True)
+        arrays = {
+            'from_distances': from_distances,
+            'from_predecessors': from_predecessors.astype(np.int32),
+            'to_distances': to_distances,
+            'to_predecessors': to_predecessors.astype(np.int32),
+        }
+        return cls(engine, nodes, arrays)
+
+    @classmethod
+    def open(cls, trees_dir, engine):
+        with open(os.path.join(trees_dir, 'meta.json')) as file:
+            meta = json.load(file)
+        arrays = {name: np.load(os.path.join(trees_dir, f'{name}.npy'), mmap_mode='r') for name in TREE_ARRAYS}
+        return cls(engine, meta['nodes'], arrays, meta['graph_hash'])
+
+    # Function to write the trees to a directory, swapped in at the end like graph snapshots
+    def save(self, trees_dir):
+        tmp_dir = f'{trees_dir}.tmp-{os.getpid()}'
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name in TREE_ARRAYS:
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), getattr(self, name))
+        meta = {
+            'format_version': TREES_FORMAT_VERSION,
+            'graph_hash': self.graph_hash,
+            'nodes': self.nodes,
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=2)
+        if os.path.isdir(trees_dir):
+            shutil.rmtree(trees_dir)
+        os.replace(tmp_dir, trees_dir)
+
+    # Shortest path tree (distance row, predecessor row) rooted at a fixed destination, or None
+    def tree(self, node):
+        i = self.position.get(node)
+        if i is None:
+            return None
+        return self.from_distances[i], self.from_predecessors[i]
+
+    # Shortest path length of a leg that starts or ends at a fixed destination (None for any other leg)
+    def distance(self, source, target):
+        if source in self.position:
+            return float(self.from_distances[self.position[source], self.engine.node_index[target]])
+        if target in self.position:
+            return float(self.to_distances[self.position[target], self.engine.node_index[source]])
+        return None
+
+    # Node path of a leg that starts or ends at a fixed destination (None for any other leg)
+    def path(self, source, target):
+        if source in self.position:
+            return self.engine.walk_path(self.from_predecessors[self.position[source]], source, target)
+        if target in self.position:
+            # Walked in the reversed tree rooted at the destination, so it comes out back to front
+            return self.engine.walk_path(self.to_predecessors[self.position[target]], target, source)[::-1]
+        return None
+
+# Function to open the trees for the fixed destinations of a GraphML road network. They are rebuilt when
+# missing or built for another graph_hash; destinations not stored yet are added to the stored ones.
+def load_destination_trees(graphml_path, engine, nodes, trees_dir=None):
+    nodes = [node for node in dict.fromkeys(nodes) if node in engine.node_index]
+    if engine.graph_hash is None:
+        return DestinationTrees.build(engine, nodes)
+    trees_dir = trees_dir or trees_dir_for(graphml_path)
+    meta_path = os.path.join(trees_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if meta.get('format_version') == TREES_FORMAT_VERSION and meta.get('graph_hash') == engine.graph_hash:
+            if set(nodes) <= set(meta['nodes']):
+                return DestinationTrees.open(trees_dir, engine)
+            nodes = meta['nodes'] + [node for node in nodes if node not in meta['nodes']]
+    print(f"Building shortest path trees for {len(nodes)} fixed destinations...")
+    trees = DestinationTrees.build(engine, nodes)
+    trees.save(trees_dir)
+    return trees
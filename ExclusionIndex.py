@@ -0,0 +1,163 @@
+import hashlib
+import json
+import math
+import os
+import shutil
+import numpy as np
+import shapely
+from shapely.strtree import STRtree
+
+from RoadNetwork import ROAD_NETWORK_GRAPHML, land_use_dir_for, load_land_use
+
+# Bump when the index layout changes so old indexes are rebuilt
+EXCLUSION_FORMAT_VERSION = 1
+# Land use classes homes are kept out of
+GREEN_LAND_USE = ('forest', 'park')
+# Raster cell size; points in cells fully inside or fully outside the areas skip the exact test
+DEFAULT_CELL_METERS = 25
+METERS_PER_DEGREE = 111320
+# Raster cell states
+OUTSIDE, INSIDE, BOUNDARY = 0, 1, 2
+
+# Function to pack geometries into WKB offsets / bytes arrays, as the graph snapshots store edge geometries
+def _pack_wkb(geometries):
+    blobs = [geometry.wkb for geometry in geometries]
+    offsets = np.concatenate([[0], np.cumsum([len(blob) for blob in blobs])]).astype(np.int64)
+    return offsets, np.frombuffer(b''.join(blobs), dtype=np.uint8)
+
+def _unpack_wkb(offsets, data):
+    return shapely.from_wkb([data[offsets[i]:offsets[i + 1]].tobytes() for i in range(len(offsets) - 1)])
+
+# Function to keep the parts of land use features that can hold a point (lines and points enclose nothing)
+def area_geometries(geometries):
+    geometries = shapely.make_valid(np.asarray(geometries))
+    return geometries[np.isin(shapely.get_type_id(geometries), [3, 6, 7])]
+
+# Point-in-area index over a set of land use polygons (by default the green areas):
+#   - an STRtree over the prepared feature geometries, for points anywhere
+#   - the features merged and clipped per region (e.g. EM/NM/WM/SM/CM), prepared, for points known to be in a region
+#   - optionally a raster over the regions marking each cell as outside, inside or on a boundary, so most
+#     points are answered by one array lookup and only boundary cells run the exact geometric test
+class ExclusionIndex:
+    def __init__(self, geometries, region_names=(), region_geometries=(), mask=None, origin=None, cell_size=None):
+        self.geometries = np.asarray(geometries)
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+        self.regions = dict(zip(region_names, region_geometries))
+        for geometry in self.regions.values():
+            shapely.prepare(geometry)
+        self.mask = mask
+        self.origin = origin
+        self.cell_size = cell_size
+
+    @classmethod
+    def build(cls, geometries, regions=None, cell_meters=DEFAULT_CELL_METERS):
+        geometries = area_geometries(geometries)
+        regions = dict(regions or {})
+        merged = [shapely.intersection(shapely.union_all(geometries), shapely.make_valid(region))
+                  for region in regions.values()]
+        index = cls(geometries, list(regions), merged)
+        if cell_meters and regions:
+            index._rasterize(shapely.union_all(list(regions.values())), cell_meters)
+        return index
+
+    # Function to mark every raster cell over `extent` as OUTSIDE, INSIDE or BOUNDARY of the areas
+    def _rasterize(self, extent, cell_meters):
+        minx, miny, maxx, maxy = extent.bounds
+        cell_y = cell_meters / METERS_PER_DEGREE
+        cell_x = cell_meters / (METERS_PER_DEGREE * math.cos(math.radians((miny + maxy) / 2)))
+        rows, cols = int(math.ceil((maxy - miny) / cell_y)), int(math.ceil((maxx - minx) / cell_x))
+        col, row = np.meshgrid(np.arange(cols), np.arange(rows))
+        cells = shapely.box(minx + col.ravel() * cell_x, miny + row.ravel() * cell_y,
+                            minx + (col.ravel() + 1) * cell_x, miny + (row.ravel() + 1) * cell_y)
+
+        mask = np.full(len(cells), OUTSIDE, dtype=np.uint8)
+        centers_x = minx + (col.ravel() + 0.5) * cell_x
+        centers_y = miny + (row.ravel() + 0.5) * cell_y
+        mask[self._exact(centers_x, centers_y)] = INSIDE
+        # Cells crossed by an area edge can hold points on either side
+        boundaries = STRtree(shapely.boundary(self.geometries))
+        crossed = np.unique(boundaries.query(cells, predicate='intersects')[0])
+        mask[crossed] = BOUNDARY
+        self.mask = mask.reshape(rows, cols)
+        self.origin = (minx, miny)
+        self.cell_size = (cell_x, cell_y)
+
+    # Exact test: inside any area (region=None) or inside the areas merged for one region
+    def _exact(self, x, y, region=None):
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        if region is not None:
+            return shapely.contains_xy(self.regions[region], x, y)
+        inside = np.zeros(len(x), dtype=bool)
+        inside[self.tree.query(shapely.points(x, y), predicate='within')[0]] = True
+        return inside
+
+    # Function to test many points at once: True where the point lies inside one of the areas.
+    # Pass `region` when every point is known to be inside that region (e.g. sampled from it).
+    def contains_xy(self, x, y, region=None):
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        if region is not None and region not in self.regions:
+            region = None
+        if self.mask is None:
+            return self._exact(x, y, region)
+        col = np.floor((x - self.origin[0]) / self.cell_size[0]).astype(np.int64)
+        row = np.floor((y - self.origin[1]) / self.cell_size[1]).astype(np.int64)
+        on_grid = (row >= 0) & (row < self.mask.shape[0]) & (col >= 0) & (col < self.mask.shape[1])
+        state = np.full(len(x), BOUNDARY, dtype=np.uint8)
+        state[on_grid] = self.mask[row[on_grid], col[on_grid]]
+        inside = state == INSIDE
+        exact = np.flatnonzero(state == BOUNDARY)
+        if len(exact):
+            inside[exact] = self._exact(x[exact], y[exact], region)
+        return inside
+
+    # Function to write the merged regions and raster; the STRtree is rebuilt from the land use layer on open
+    def save(self, index_dir, meta):
+        tmp_dir = f'{index_dir}.tmp-{os.getpid()}'
+        os.makedirs(tmp_dir, exist_ok=True)
+        offsets, data = _pack_wkb(list(self.regions.values()))
+        np.save(os.path.join(tmp_dir, 'region_offsets.npy'), offsets)
+        np.save(os.path.join(tmp_dir, 'region_wkb.npy'), data)
+        if self.mask is not None:
+            np.save(os.path.join(tmp_dir, 'mask.npy'), self.mask)
+        meta = dict(meta, format_version=EXCLUSION_FORMAT_VERSION, regions=list(self.regions),
+                    origin=self.origin, cell_size=self.cell_size)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=2)
+        if os.path.isdir(index_dir):
+            shutil.rmtree(index_dir)
+        os.replace(tmp_dir, index_dir)
+
+    @classmethod
+    def open(cls, index_dir, geometries):
+        with open(os.path.join(index_dir, 'meta.json')) as file:
+            meta = json.load(file)
+        regions = _unpack_wkb(np.load(os.path.join(index_dir, 'region_offsets.npy')),
+                              np.load(os.path.join(index_dir, 'region_wkb.npy')))
+        mask_path = os.path.join(index_dir, 'mask.npy')
+        mask = np.load(mask_path) if os.path.exists(mask_path) else None
+        origin = tuple(meta['origin']) if meta['origin'] is not None else None
+        cell_size = tuple(meta['cell_size']) if meta['cell_size'] is not None else None
+        return cls(geometries, meta['regions'], regions, mask, origin, cell_size)
+
+# Function to get the exclusion index for some land use classes of the shared road network, merged per
+# region and rasterised at cell_meters (None for no raster). It is stored next to the land use layer and
+# rebuilt when the layer, the classes, the regions or the cell size change.
+def load_exclusion_index(land_use_classes=GREEN_LAND_USE, regions=None, cell_meters=DEFAULT_CELL_METERS,
+                         graphml_path=ROAD_NETWORK_GRAPHML):
+    layer = load_land_use(graphml_path=graphml_path)
+    selected = np.isin(np.asarray(layer.landuse), list(land_use_classes))
+    geometries = area_geometries(layer.geometries()[selected])
+    regions = dict(regions or {})
+
+    digest = hashlib.sha1(json.dumps([layer.meta['road_network_version'], sorted(land_use_classes), cell_meters]).encode())
+    for name, region in regions.items():
+        digest.update(name.encode())
+        digest.update(region.wkb)
+    index_dir = os.path.join(land_use_dir_for(graphml_path), f'exclusion-{digest.hexdigest()[:16]}')
+    if os.path.exists(os.path.join(index_dir, 'meta.json')):
+        return ExclusionIndex.open(index_dir, geometries)
+
+    index = ExclusionIndex.build(geometries, regions, cell_meters)
+    index.save(index_dir, {'land_use_classes': sorted(land_use_classes), 'cell_meters': cell_meters})
+    return index
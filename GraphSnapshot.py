@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import networkx as nx
+from shapely import wkb, wkt
+from shapely.geometry.base import BaseGeometry
+
+from NodeSnapper import load_node_snapper
+from RegionNodeIndex import load_region_node_index
+from RoutingEngine import RoutingEngine
+
+# Bump when the snapshot layout changes so old snapshots are rebuilt
+SNAPSHOT_FORMAT_VERSION = 2
+SNAPSHOT_ARRAYS = ['node_ids', 'x', 'y', 'indptr', 'indices', 'lengths',
+                   'edge_u', 'edge_v', 'geometry_offsets', 'geometry_wkb']
+
+# Function to convert a GraphML geometry attribute to a valid shapely geometry (None if unusable)
+def ensure_geometry(data):
+    if isinstance(data, str):
+        try:
+            geom = wkt.loads(data)
+            if not geom.is_valid:
+                geom = geom.buffer(0)
+            return geom
+        except Exception as e:
+            print(f"Error converting WKT to Geometry: {e}")
+            return None
+    elif isinstance(data, BaseGeometry):
+        if not data.is_valid:
+            return data.buffer(0)
+        return data
+    return None
+
+# Function to hash the GraphML contents, so a snapshot knows which source it was built from
+def hash_file(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Default snapshot location: Midland_road_network.graphml -> Midland_road_network.snapshot/
+def snapshot_dir_for(graphml_path):
+    return os.path.splitext(graphml_path)[0] + '.snapshot'
+
+# Memory-mapped graph snapshot. Arrays are opened with mmap_mode='r', so processes loading the same
+# snapshot share its pages; edge geometries stay as WKB bytes until edge_geometry() is asked for one.
+class GraphSnapshot:
+    def __init__(self, snapshot_dir, meta, arrays):
+        self.snapshot_dir = snapshot_dir
+        self.meta = meta
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def open(cls, snapshot_dir):
+        with open(os.path.join(snapshot_dir, 'meta.json')) as file:
+            meta = json.load(file)
+        arrays = {name: np.load(os.path.join(snapshot_dir, f'{name}.npy'), mmap_mode='r') for name in SNAPSHOT_ARRAYS}
+        return cls(snapshot_dir, meta, arrays)
+
+    # Geometry of original GraphML edge i (edge_u[i] -> edge_v[i]), or None if it had none
+    def edge_geometry(self, i):
+        start, end = self.geometry_offsets[i], self.geometry_offsets[i + 1]
+        if start == end:
+            return None
+        return wkb.loads(self.geometry_wkb[start:end].tobytes())
+
+    # Routing engine over the snapshot's CSR arrays
+    def engine(self):
+        return RoutingEngine(self.node_ids, self.x, self.y, self.indptr, self.indices, self.lengths,
+                             graph_hash=self.meta['source_sha256'])
+
+    # Nearest-node snapper over the snapshot's node coordinates (KD-tree stored in the snapshot directory)
+    def snapper(self):
+        return load_node_snapper(self)
+
+    # Region -> node membership index for named region polygons (stored in the snapshot directory)
+    def region_nodes(self, regions):
+        return load_region_node_index(self, regions)
+
+# Function to convert a GraphML road network into a snapshot directory
+def build_snapshot(graphml_path, snapshot_dir=None, directed=False, source_hash=None):
+    snapshot_dir = snapshot_dir or snapshot_dir_for(graphml_path)
+    G = nx.read_graphml(graphml_path)
+    engine = RoutingEngine.from_graph(G, directed=directed)
+
+    # Keep the original edge list with its geometry, validated once here instead of on every load
+    edge_u, edge_v, offsets, blobs = [], [], [0], []
+    for u, v, data in G.edges(data=True):
+        edge_u.append(engine.node_index[u])
+        edge_v.append(engine.node_index[v])
+        geom = ensure_geometry(data.get('geometry'))
+        blob = geom.wkb if geom is not None and geom.is_valid else b''
+        blobs.append(blob)
+        offsets.append(offsets[-1] + len(blob))
+
+    arrays = {
+        'node_ids': engine.node_ids.astype(str),
+        'x': engine.x,
+        'y': engine.y,
+        'indptr': engine.indptr,
+        'indices': engine.indices,
+        'lengths': engine.lengths,
+        'edge_u': np.array(edge_u, dtype=np.int32),
+        'edge_v': np.array(edge_v, dtype=np.int32),
+        'geometry_offsets': np.array(offsets, dtype=np.int64),
+        'geometry_wkb': np.frombuffer(b''.join(blobs), dtype=np.uint8),
+    }
+    stat = os.stat(graphml_path)
+    meta = {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'source': os.path.basename(graphml_path),
+        'source_sha256': source_hash or hash_file(graphml_path),
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'directed': directed,
+    }
+
+    # Write next to the target and swap in at the end, so readers never see a half-written snapshot
+    tmp_dir = f'{snapshot_dir}.tmp-{os.getpid()}'
+    os.makedirs(tmp_dir, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+        json.dump(meta, file, indent=2)
+    if os.path.isdir(snapshot_dir):
+        shutil.rmtree(snapshot_dir)
+    os.replace(tmp_dir, snapshot_dir)
+    return GraphSnapshot.open(snapshot_dir)
+
+# Function to open the snapshot for a GraphML file, rebuilding it if it is missing or stale.
+# The source is only re-hashed when its size or modification time no longer match the snapshot.
+def load_snapshot(graphml_path, snapshot_dir=None, directed=False):
+    snapshot_dir = snapshot_dir or snapshot_dir_for(graphml_path)
+    meta_path = os.path.join(snapshot_dir, 'meta.json')
+    if not os.path.exists(meta_path):
+        return build_snapshot(graphml_path, snapshot_dir, directed)
+
+    with open(meta_path) as file:
+        meta = json.load(file)
+    if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION or meta.get('directed') != directed:
+        return build_snapshot(graphml_path, snapshot_dir, directed)
+
+    stat = os.stat(graphml_path)
+    if stat.st_size != meta['source_size'] or stat.st_mtime_ns != meta['source_mtime_ns']:
+        source_hash = hash_file(graphml_path)
+        if source_hash != meta['source_sha256']:
+            print(f"{graphml_path} changed, rebuilding graph snapshot...")
+            return build_snapshot(graphml_path, snapshot_dir, directed, source_hash)
+        # Same contents with a new timestamp (e.g. re-saved): just record the new stat
+        meta['source_size'] = stat.st_size
+        meta['source_mtime_ns'] = stat.st_mtime_ns
+        with open(meta_path, 'w') as file:
+            json.dump(meta, file, indent=2)
+    return GraphSnapshot.open(snapshot_dir)
+
+# Function to get a routing engine for a GraphML road network through its snapshot
+def load_routing_engine(graphml_path, directed=False):
+    return load_snapshot(graphml_path, directed=directed).engine()
@@ -0,0 +1,242 @@
+import heapq
+import json
+import math
+import os
+import shutil
+from operator import itemgetter, sub
+import numpy as np
+import networkx as nx
+from scipy.sparse.csgraph import dijkstra
+
+from RoutingEngine import NO_PREDECESSOR
+
+# Bump when the landmark layout changes so old indexes are rebuilt
+LANDMARK_FORMAT_VERSION = 1
+# Landmarks stored per graph, and how many of them (the ones with the best bound at the source) each query uses
+DEFAULT_LANDMARKS = 16
+ACTIVE_LANDMARKS = 6
+EARTH_RADIUS_METERS = 6371008.8
+# A* here expands nodes in Python, roughly 30x slower per node than scipy's compiled Dijkstra, so a search
+# that expands more than this fraction of the graph gives up and the engine's Dijkstra answers instead
+MAX_EXPANSION_FRACTION = 1 / 30
+# Pairs whose landmark lower bound already exceeds this fraction of the farthest landmark distance are
+# long enough that the search would outgrow that budget anyway, so they go straight to Dijkstra
+MAX_BOUND_FRACTION = 0.2
+# Stand-in for "unreachable" so landmark differences never turn into inf - inf
+UNREACHABLE = 1e30
+
+# Default index location: Midland_road_network.graphml -> Midland_road_network.landmarks/
+def landmark_dir_for(graphml_path):
+    return os.path.splitext(graphml_path)[0] + '.landmarks'
+
+# Function to pick k landmarks by farthest-point selection: each new landmark is the node farthest
+# (by search weight) from all landmarks picked so far, starting from the node farthest from node 0.
+# Returns the landmark indices and their distance rows from (k, N) and to (k, N) every node.
+def select_landmarks(engine, k=DEFAULT_LANDMARKS):
+    graph = engine.graph
+    symmetric = (abs(graph - graph.T) > 0).nnz == 0
+    k = min(k, len(engine.node_ids))
+    distances = dijkstra(graph, directed=True, indices=0)
+    nearest = np.full(len(engine.node_ids), np.inf)
+    landmarks, from_rows, to_rows = [], [], []
+    for _ in range(k):
+        landmark = int(np.argmax(np.where(np.isfinite(distances), distances, -1)))
+        if landmark in landmarks:
+            break
+        landmarks.append(landmark)
+        row = dijkstra(graph, directed=True, indices=landmark)
+        from_rows.append(row)
+        to_rows.append(row if symmetric else dijkstra(graph.T.tocsr(), directed=True, indices=landmark))
+        nearest = np.minimum(nearest, row)
+        distances = nearest
+    return (np.array(landmarks, dtype=np.int32), np.array(from_rows, dtype=np.float32),
+            np.array(to_rows, dtype=np.float32))
+
+# Function to find the largest c with weight(u, v) >= c * haversine(u, v) on every edge. By the triangle
+# inequality c * haversine(v, t) then never overestimates the remaining search weight from v to t.
+def haversine_scale(engine):
+    lon, lat = np.radians(engine.x), np.radians(engine.y)
+    sources = np.repeat(np.arange(len(engine.node_ids)), np.diff(engine.indptr))
+    meters = haversine(lon[sources], lat[sources], lon[engine.indices], lat[engine.indices])
+    usable = meters > 0
+    if not usable.any() or not np.isfinite(meters[usable]).all():
+        return 0.0
+    return float(np.min(engine.graph.data[usable] / meters[usable])) * (1 - 1e-9)
+
+def haversine(lon1, lat1, lon2, lat2):
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(a))
+
+# ALT index: landmark distance rows as float32, used as A* lower bounds together with the haversine bound.
+# Only the search weights the index was built on (graph_hash) are answered; anything else is the
+# engine's plain Dijkstra. The search runs in Python under a small expansion budget, so it only pays off
+# on short legs; ContractionHierarchy is the fast backend for general queries.
+class LandmarkIndex:
+    def __init__(self, engine, landmarks, from_landmark, to_landmark, scale, requested=DEFAULT_LANDMARKS):
+        self.graph_hash = engine.graph_hash
+        self.requested = requested
+        self.engine = engine
+        self.landmarks = landmarks
+        self.from_landmark = from_landmark
+        self.to_landmark = to_landmark
+        self.scale = scale
+        self.max_expansions = max(int(len(engine.node_ids) * MAX_EXPANSION_FRACTION), 100)
+        # A* runs in plain Python, so the adjacency, landmark rows and coordinates are kept as lists
+        self.indptr = engine.indptr.tolist()
+        self.indices = engine.indices.tolist()
+        self.weights = engine.graph.data.tolist()
+        self.from_rows = np.nan_to_num(np.asarray(from_landmark).T, posinf=UNREACHABLE).tolist()
+        self.to_rows = np.nan_to_num(np.asarray(to_landmark).T, posinf=UNREACHABLE).tolist()
+        self.lon = np.radians(engine.x).tolist()
+        self.lat = np.radians(engine.y).tolist()
+        finite = np.asarray(from_landmark)[np.isfinite(from_landmark)]
+        # float32 rows are rounded, so bounds are lowered by a few ulps to stay admissible
+        self.slack = 4 * float(np.spacing(np.float32(finite.max()))) if finite.size else 0.0
+        self.max_bound = MAX_BOUND_FRACTION * float(finite.max()) if finite.size else math.inf
+        # Searches answered, and pairs left to Dijkstra for being too far apart or outgrowing max_expansions
+        self.answered = 0
+        self.too_far = 0
+        self.gave_up = 0
+
+    @classmethod
+    def build(cls, engine, k=DEFAULT_LANDMARKS):
+        landmarks, from_landmark, to_landmark = select_landmarks(engine, k)
+        return cls(engine, landmarks, from_landmark, to_landmark, haversine_scale(engine), k)
+
+    @classmethod
+    def open(cls, landmark_dir, engine):
+        with open(os.path.join(landmark_dir, 'meta.json')) as file:
+            meta = json.load(file)
+        arrays = {name: np.load(os.path.join(landmark_dir, f'{name}.npy'), mmap_mode='r')
+                  for name in ('landmarks', 'from_landmark', 'to_landmark')}
+        return cls(engine, arrays['landmarks'], arrays['from_landmark'], arrays['to_landmark'],
+                   meta['haversine_scale'], meta['requested_landmarks'])
+
+    # Function to write the index to a directory, swapped in at the end like graph snapshots
+    def save(self, landmark_dir):
+        tmp_dir = f'{landmark_dir}.tmp-{os.getpid()}'
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, 'landmarks.npy'), self.landmarks)
+        np.save(os.path.join(tmp_dir, 'from_landmark.npy'), self.from_landmark)
+        np.save(os.path.join(tmp_dir, 'to_landmark.npy'), self.to_landmark)
+        meta = {
+            'format_version': LANDMARK_FORMAT_VERSION,
+            'graph_hash': self.graph_hash,
+            'requested_landmarks': self.requested,
+            'haversine_scale': self.scale,
+        }
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=2)
+        if os.path.isdir(landmark_dir):
+            shutil.rmtree(landmark_dir)
+        os.replace(tmp_dir, landmark_dir)
+
+    # Function to run A* from source to target (node indices); returns (distance, predecessor dict),
+    # or None for pairs left to Dijkstra (too far apart, or the search outgrew max_expansions)
+    def search(self, source, target, active=ACTIVE_LANDMARKS):
+        from_rows, to_rows = self.from_rows, self.to_rows
+        # Use the landmarks that give the tightest bound for this pair
+        bounds = [max(a, b) for a, b in zip(map(sub, from_rows[target], from_rows[source]),
+                                              map(sub, to_rows[source], to_rows[target]))]
+        if max(bounds) > self.max_bound:
+            self.too_far += 1
+            return None
+        chosen = sorted(range(len(bounds)), key=bounds.__getitem__, reverse=True)[:max(active, 1)]
+        pick = itemgetter(*chosen) if len(chosen) > 1 else (lambda row: (row[chosen[0]],))
+        from_target, to_target = pick(from_rows[target]), pick(to_rows[target])
+        lon_t, lat_t = self.lon[target], self.lat[target]
+        cos_t = math.cos(lat_t)
+        lon, lat = self.lon, self.lat
+        scale, slack = self.scale, self.slack
+        diameter = 2 * EARTH_RADIUS_METERS * scale
+
+        heuristics = {}
+        def heuristic(v):
+            # d(v, t) >= d(L, t) - d(L, v) and d(v, L) - d(t, L) for every landmark L, and >= scale * haversine
+            bound = max(max(map(sub, from_target, pick(from_rows[v]))), max(map(sub, pick(to_rows[v]), to_target)))
+            if scale:
+                a = (math.sin((lat_t - lat[v]) / 2) ** 2
+                     + math.cos(lat[v]) * cos_t * math.sin((lon_t - lon[v]) / 2) ** 2)
+                bound = max(bound, diameter * math.asin(math.sqrt(min(a, 1.0))))
+            bound = max(bound - slack, 0.0)
+            heuristics[v] = bound
+            return bound
+
+        indptr, indices, weights = self.indptr, self.indices, self.weights
+        distances = {source: 0.0}
+        predecessors = {source: NO_PREDECESSOR}
+        heap = [(heuristic(source), source)]
+        expansions = 0
+        while heap:
+            estimate, u = heapq.heappop(heap)
+            distance = distances[u]
+            if estimate > distance + heuristics[u]:
+                continue  # stale entry, u was reached more cheaply since
+            if u == target:
+                self.answered += 1
+                return distance, predecessors
+            expansions += 1
+            if expansions > self.max_expansions:
+                self.gave_up += 1
+                return None
+            for position in range(indptr[u], indptr[u + 1]):
+                v = indices[position]
+                candidate = distance + weights[position]
+                if candidate < distances.get(v, math.inf):
+                    distances[v] = candidate
+                    predecessors[v] = u
+                    h = heuristics.get(v)
+                    heapq.heappush(heap, (candidate + (heuristic(v) if h is None else h), v))
+        self.answered += 1
+        return math.inf, predecessors
+
+    def stats(self):
+        searches = self.answered + self.too_far + self.gave_up
+        fallbacks = self.too_far + self.gave_up
+        return {
+            'searches': searches,
+            'answered': self.answered,
+            'too_far': self.too_far,
+            'gave_up': self.gave_up,
+            'fallback_rate': fallbacks / searches if searches else 0.0
+        }
+
+    # Single-pair shortest path length (None if the search was given up)
+    def distance(self, source, target):
+        node_index = self.engine.node_index
+        result = self.search(node_index[source], node_index[target])
+        return None if result is None else result[0]
+
+    # Single-pair shortest path as a list of node ids (None if the search was given up)
+    def path(self, source, target):
+        node_index = self.engine.node_index
+        source_index, target_index = node_index[source], node_index[target]
+        result = self.search(source_index, target_index)
+        if result is None:
+            return None
+        distance, predecessors = result
+        if math.isinf(distance):
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        path = [target_index]
+        while path[-1] != source_index:
+            path.append(predecessors[path[-1]])
+        return self.engine.node_ids[path[::-1]].tolist()
+
+# Function to open the landmark index for a GraphML road network, rebuilding it if it is missing,
+# has a different landmark count, or was built for another graph_hash (graph or search weights changed).
+# An engine without a graph_hash (not loaded from a snapshot) gets a fresh, unsaved index.
+def load_landmarks(graphml_path, engine, k=DEFAULT_LANDMARKS, landmark_dir=None):
+    if engine.graph_hash is None:
+        return LandmarkIndex.build(engine, k)
+    landmark_dir = landmark_dir or landmark_dir_for(graphml_path)
+    meta_path = os.path.join(landmark_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if (meta.get('format_version') == LANDMARK_FORMAT_VERSION and meta.get('graph_hash') == engine.graph_hash
+                and meta.get('requested_landmarks') == k):
+            return LandmarkIndex.open(landmark_dir, engine)
+        print(f"Landmarks in {landmark_dir} are out of date, rebuilding...")
+    index = LandmarkIndex.build(engine, k)
+    index.save(landmark_dir)
+    return index
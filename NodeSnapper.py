@@ -0,0 +1,89 @@
+import os
+import pickle
+import numpy as np
+from scipy.spatial import cKDTree
+from shapely.geometry import Point
+
+# Bump when the stored tree layout changes so old trees are rebuilt
+SNAPPER_FORMAT_VERSION = 1
+SNAPPER_FILE = 'node_tree.pkl'
+EARTH_RADIUS_METERS = 6371009
+
+# Local equirectangular projection (meters) around a reference point. Over a county-sized network it is
+# within a fraction of a percent of the haversine distance, so nearest nodes match a haversine search.
+def project(lon, lat, origin):
+    lon0, lat0 = origin
+    scale = np.pi / 180 * EARTH_RADIUS_METERS
+    x = (np.asarray(lon, dtype=np.float64) - lon0) * scale * np.cos(np.radians(lat0))
+    y = (np.asarray(lat, dtype=np.float64) - lat0) * scale
+    return x, y
+
+# Function to turn a sequence of points ((lon, lat) tuples, shapely Points or None) into x, y arrays,
+# with NaN where there is no point
+def point_coordinates(points):
+    xy = np.full((len(points), 2), np.nan)
+    for i, point in enumerate(points):
+        if isinstance(point, Point):
+            xy[i] = point.x, point.y
+        elif point is not None and not (isinstance(point, float) and np.isnan(point)):
+            xy[i] = point[0], point[1]
+    return xy[:, 0], xy[:, 1]
+
+# Nearest-node lookup for a road network: one KD-tree over the node coordinates projected to meters.
+# Whole arrays of coordinates are snapped in a single query.
+class NodeSnapper:
+    def __init__(self, node_ids, origin, tree):
+        self.node_ids = np.asarray(node_ids)
+        self.origin = tuple(origin)
+        self.tree = tree
+
+    @classmethod
+    def build(cls, node_ids, x, y):
+        origin = (float(np.mean(x)), float(np.mean(y)))
+        return cls(node_ids, origin, cKDTree(np.column_stack(project(x, y, origin))))
+
+    # Function to snap many (lon, lat) coordinates at once. Returns the node ids and the snap distances in
+    # meters; rows with NaN coordinates get node None and distance NaN.
+    def nearest(self, x, y):
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        nodes = np.full(len(x), None, dtype=object)
+        distances = np.full(len(x), np.nan)
+        if valid.any():
+            distances[valid], positions = self.tree.query(np.column_stack(project(x[valid], y[valid], self.origin)))
+            nodes[valid] = self.node_ids[positions]
+        return nodes, distances
+
+    # Function to snap a sequence of points ((lon, lat) tuples, shapely Points or None)
+    def nearest_points(self, points):
+        return self.nearest(*point_coordinates(list(points)))
+
+    # Single-point lookup
+    def nearest_node(self, x, y):
+        return self.nearest([x], [y])[0][0]
+
+    def save(self, path, meta):
+        tmp_path = f'{path}.tmp-{os.getpid()}'
+        with open(tmp_path, 'wb') as file:
+            pickle.dump({'meta': dict(meta, format_version=SNAPPER_FORMAT_VERSION), 'node_ids': self.node_ids,
+                         'origin': self.origin, 'tree': self.tree}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as file:
+            stored = pickle.load(file)
+        return cls(stored['node_ids'], stored['origin'], stored['tree']), stored['meta']
+
+# Function to get the snapper of a graph snapshot. The tree is stored inside the snapshot directory, so a
+# rebuilt snapshot drops it, and it is rebuilt when it was made for another source graph.
+def load_node_snapper(snapshot):
+    path = os.path.join(snapshot.snapshot_dir, SNAPPER_FILE)
+    if os.path.exists(path):
+        snapper, meta = NodeSnapper.open(path)
+        if (meta.get('format_version') == SNAPPER_FORMAT_VERSION
+                and meta.get('source_sha256') == snapshot.meta['source_sha256']):
+            return snapper
+    snapper = NodeSnapper.build(snapshot.node_ids, snapshot.x, snapshot.y)
+    snapper.save(path, {'source_sha256': snapshot.meta['source_sha256'], 'nodes': len(snapshot.node_ids)})
+    return snapper
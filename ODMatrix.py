@@ -0,0 +1,154 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy.sparse.csgraph import dijkstra
+
+from GraphSnapshot import load_routing_engine
+
+# Bump when the matrix layout changes so old matrices are rebuilt
+OD_FORMAT_VERSION = 2
+# Sources searched per multi-source Dijkstra call (and per worker task)
+DEFAULT_BLOCK_SIZE = 128
+
+# Default matrix location: Midland_road_network.graphml, 'Monday', nodes -> Midland_road_network.od/Monday/<key>/,
+# the key hashing the graph and the sorted node set, so each script's matrix of a day has its own directory and
+# a directory that exists always holds the matrix its name stands for
+def od_dir_for(graphml_path, day, nodes=(), graph_hash=None):
+    digest = hashlib.sha1(json.dumps([graph_hash, sorted(map(str, nodes))]).encode()).hexdigest()[:16]
+    return os.path.join(os.path.splitext(graphml_path)[0] + '.od', str(day), digest)
+
+# Function to collect the distinct nodes of one day's trips: every node in the given columns of the rows
+# departing on `day`, plus any extra nodes (e.g. the schools, which are not stored per row)
+def day_nodes(df, day, columns=('House Node', 'Destination Node'), extra_nodes=()):
+    day_df = df[df['Trip Departure Day'] == day]
+    nodes = [node for column in columns if column in day_df for node in day_df[column].astype(str)]
+    return list(dict.fromkeys(nodes + [str(node) for node in extra_nodes]))
+
+# Engine of one worker process, set up once by _attach_worker
+_engine = None
+
+# Worker initializer: attach to the road network through its memory-mapped snapshot, with the parent's
+# search weights when they are not the edge lengths
+def _attach_worker(graphml_path, directed, weights):
+    global _engine
+    _engine = load_routing_engine(graphml_path, directed=directed)
+    if weights is not None:
+        _engine.set_weights(*weights)
+
+# Function to search from a block of sources and write their rows straight into the matrix file
+def _fill_rows(engine, distances_path, rows, sources, targets):
+    distances = np.load(distances_path, mmap_mode='r+')
+    block = dijkstra(engine.graph, directed=True, indices=sources)
+    distances[rows] = block[:, targets]
+    distances.flush()
+
+def _fill_rows_in_worker(distances_path, rows, sources, targets):
+    _fill_rows(_engine, distances_path, rows, sources, targets)
+
+# Function to compute the full distance matrix between `nodes` into od_dir: one multi-source Dijkstra per
+# block of block_size sources, blocks fanned out over `workers` processes. Workers write their rows into
+# the memory-mapped float32 matrix themselves, so no distances are sent back between processes.
+def build_od_matrix(engine, nodes, od_dir, graphml_path=None, day=None, block_size=DEFAULT_BLOCK_SIZE, workers=1,
+                    directed=False):
+    nodes = list(dict.fromkeys(nodes))
+    node_indices = engine.index(nodes)
+    if workers > 1 and (graphml_path is None or 'fork' not in multiprocessing.get_all_start_methods()):
+        workers = 1
+
+    tmp_dir = f'{od_dir}.tmp-{os.getpid()}'
+    os.makedirs(tmp_dir, exist_ok=True)
+    distances_path = os.path.join(tmp_dir, 'distances.npy')
+    np.lib.format.open_memmap(distances_path, mode='w+', dtype=np.float32, shape=(len(nodes), len(nodes))).flush()
+    blocks = [np.arange(start, min(start + block_size, len(nodes))) for start in range(0, len(nodes), block_size)]
+    if workers <= 1:
+        for rows in blocks:
+            _fill_rows(engine, distances_path, rows, node_indices[rows], node_indices)
+    else:
+        weights = (engine.graph.data, engine.weight_key) if engine.weight_key is not None else None
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=_attach_worker, initargs=(graphml_path, directed, weights)) as pool:
+            list(pool.map(_fill_rows_in_worker, [distances_path] * len(blocks), blocks,
+                          [node_indices[rows] for rows in blocks], [node_indices] * len(blocks)))
+
+    np.save(os.path.join(tmp_dir, 'nodes.npy'), np.array(nodes, dtype=str))
+    meta = {
+        'format_version': OD_FORMAT_VERSION,
+        'graph_hash': engine.graph_hash,
+        'day': None if day is None else str(day),
+        'nodes': len(nodes),
+    }
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+        json.dump(meta, file, indent=2)
+    os.makedirs(os.path.dirname(od_dir) or '.', exist_ok=True)
+    try:
+        os.rename(tmp_dir, od_dir)
+    except OSError:
+        # Another process published the same matrix first; theirs is identical, so keep it
+        if not os.path.exists(os.path.join(od_dir, 'meta.json')):
+            raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return ODMatrix.open(od_dir)
+
+# Memory-mapped origin-destination matrix of one day: distances[i, j] is the shortest path length
+# (search weight) from nodes[i] to nodes[j], stored as float32. Grouping, routing and fleet analytics
+# read it through the node -> row/column map instead of searching again.
+class ODMatrix:
+    def __init__(self, od_dir, meta, nodes, distances):
+        self.od_dir = od_dir
+        self.graph_hash = meta['graph_hash']
+        self.day = meta['day']
+        self.nodes = nodes
+        self.distances = distances
+        self.position = {node: i for i, node in enumerate(nodes.tolist())}
+
+    @classmethod
+    def open(cls, od_dir):
+        with open(os.path.join(od_dir, 'meta.json')) as file:
+            meta = json.load(file)
+        return cls(od_dir, meta, np.load(os.path.join(od_dir, 'nodes.npy')),
+                   np.load(os.path.join(od_dir, 'distances.npy'), mmap_mode='r'))
+
+    # Whether every node has a row and column in the matrix
+    def covers(self, nodes):
+        return all(node in self.position for node in nodes)
+
+    # Function to map node ids to matrix positions
+    def index(self, nodes):
+        return np.array([self.position[node] for node in nodes], dtype=np.int64)
+
+    # Single-pair shortest path length
+    def distance(self, source, target):
+        return float(self.distances[self.position[source], self.position[target]])
+
+    # Shortest path length matrix with one row per source and one column per target
+    def many_to_many(self, sources, targets):
+        return np.asarray(self.distances[np.ix_(self.index(sources), self.index(targets))], dtype=np.float64)
+
+# Function to open the OD matrix of a day for a set of nodes, building it if no matrix of this graph_hash
+# (graph and search weights) and node set was saved yet. Matrices are never rewritten in place: two scripts,
+# or two runs at once, with the same nodes share one directory and different nodes get different ones.
+def load_od_matrix(graphml_path, engine, nodes, day, od_dir=None, block_size=DEFAULT_BLOCK_SIZE, workers=1,
+                   directed=False):
+    nodes = [node for node in dict.fromkeys(nodes) if node in engine.node_index]
+    od_dir = od_dir or od_dir_for(graphml_path, day, nodes, engine.graph_hash)
+    meta_path = os.path.join(od_dir, 'meta.json')
+    if os.path.exists(meta_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if meta.get('format_version') == OD_FORMAT_VERSION and meta.get('graph_hash') == engine.graph_hash:
+            od_matrix = ODMatrix.open(od_dir)
+            if od_matrix.covers(nodes):
+                return od_matrix
+        # A directory given by the caller holding another matrix is rebuilt under a fresh name
+        stale_dir = f'{od_dir}.stale-{os.getpid()}'
+        try:
+            os.rename(od_dir, stale_dir)
+        except FileNotFoundError:
+            pass  # another process moved it away first
+        shutil.rmtree(stale_dir, ignore_errors=True)
+    print(f"Building {day} OD matrix for {len(nodes)} nodes...")
+    return build_od_matrix(engine, nodes, od_dir, graphml_path, day, block_size, workers, directed)
@@ -0,0 +1,90 @@
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from GraphSnapshot import load_routing_engine
+from Landmarks import load_landmarks
+from ContractionHierarchy import load_hierarchy
+from DestinationTrees import load_destination_trees
+from ODMatrix import ODMatrix
+from PathCache import PathCache
+
+# State of one worker process, set up once by _attach_worker
+_engine = None
+_tree_cache = None
+_path_cache = None
+
+# Worker initializer: attach to the road network through its memory-mapped snapshot, so every worker
+# shares the same pages instead of receiving a pickled copy of the graph. Only search weights other than
+# the edge lengths (see RoutingEngine.set_weights) are sent along; landmark, hierarchy, destination tree
+# and OD matrix indexes are reopened from disk.
+def _attach_worker(graphml_path, directed, weights, landmarks, hierarchy, destinations, od_dirs, path_cache_args):
+    global _engine, _tree_cache, _path_cache
+    _engine = load_routing_engine(graphml_path, directed=directed)
+    if weights is not None:
+        _engine.set_weights(*weights)
+    if landmarks is not None:
+        _engine.landmarks = load_landmarks(graphml_path, _engine, landmarks)
+    if hierarchy:
+        _engine.hierarchy = load_hierarchy(graphml_path, _engine)
+    if destinations is not None:
+        _engine.destination_trees = load_destination_trees(graphml_path, _engine, destinations)
+    _engine.od_matrices = [ODMatrix.open(od_dir) for od_dir in od_dirs]
+    _tree_cache = OrderedDict()
+    # Workers only read the shared database; their writes go back to the parent with each chunk's results
+    _path_cache = PathCache(*path_cache_args, read_only=True) if path_cache_args is not None else None
+
+def _solve_chunk(solve_group, chunk, options):
+    hits, misses = (_path_cache.hits, _path_cache.misses) if _path_cache is not None else (0, 0)
+    results = [solve_group(_engine, *args, tree_cache=_tree_cache, path_cache=_path_cache, **options)
+               for args in chunk]
+    if _path_cache is None:
+        return results, (0, 0), None
+    return results, (_path_cache.hits - hits, _path_cache.misses - misses), _path_cache.take_writes()
+
+# Function to solve independent groups, fanned out over `workers` processes in chunks of `chunk_size` groups.
+# group_args maps group number -> positional arguments for solve_group(engine, *args, **options);
+# solve_group must be a module-level function (e.g. from RouteSolver) so it can be sent to the workers.
+# Results come back as {group number: result} in the same order as group_args, whatever the worker count.
+def solve_groups(solve_group, group_args, graphml_path, engine, path_cache=None, workers=1, chunk_size=16,
+                 directed=False, **options):
+    group_numbers = list(group_args)
+    if workers > 1 and 'fork' not in multiprocessing.get_all_start_methods():
+        # The group scripts run at import time, so spawned workers would re-run them
+        print("Parallel group solving needs the 'fork' start method, solving groups serially.")
+        workers = 1
+
+    if workers <= 1:
+        tree_cache = OrderedDict()
+        return {group_number: solve_group(engine, *group_args[group_number], tree_cache=tree_cache,
+                                          path_cache=path_cache, **options)
+                for group_number in group_numbers}
+
+    chunks = [[group_args[group_number] for group_number in group_numbers[i:i + chunk_size]]
+              for i in range(0, len(group_numbers), chunk_size)]
+    weights = (engine.graph.data, engine.weight_key) if engine.weight_key is not None else None
+    landmarks = engine.landmarks.requested if engine.landmarks is not None else None
+    hierarchy = engine.uses_hierarchy()
+    destinations = engine.destination_trees.nodes if engine.destination_trees is not None else None
+    od_dirs = [od_matrix.od_dir for od_matrix in engine.od_matrices]
+    path_cache_args = (path_cache.db_path, path_cache.graph_hash, path_cache.max_entries) if path_cache is not None else None
+    if path_cache is not None:
+        # Let the workers see everything this process has cached so far
+        path_cache.flush()
+
+    results = []
+    initargs = (graphml_path, directed, weights, landmarks, hierarchy, destinations, od_dirs, path_cache_args)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                             initializer=_attach_worker, initargs=initargs) as pool:
+        # map yields chunks in submission order, which keeps the merged results deterministic
+        for chunk_results, (hits, misses), writes in pool.map(_solve_chunk, repeat(solve_group), chunks,
+                                                               repeat(options)):
+            results.extend(chunk_results)
+            if path_cache is not None:
+                path_cache.hits += hits
+                path_cache.misses += misses
+                path_cache.apply_writes(writes)
+        if path_cache is not None:
+            path_cache.flush()
+    return dict(zip(group_numbers, results))
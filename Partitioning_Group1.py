@@ -4,7 +4,9 @@ import matplotlib.pyplot as plt
 import contextily as ctx
 import pandas as pd
 from shapely.geometry import Point, Polygon
-import random
+import numpy as np
+from RegionSampler import RegionSampler
+from RoadNetwork import ROAD_NETWORK_GRAPHML, publish_road_network, load_land_use
 
 ox.settings.use_cache = True
 ox.settings.log_console = True
@@ -57,44 +59,25 @@ students = pd.DataFrame({
 })
 
 # load the road network (second plot)
-place_name = "Midland, Michigan, USA"
-graph = ox.graph_from_place(place_name, network_type='drive')
+# (built once from the cached OSM responses and shared by every group, no network access needed)
+snapshot = publish_road_network()
+graph = ox.load_graphml(ROAD_NETWORK_GRAPHML)
+# KD-tree over the network's nodes for snapping points in one batch
+snapper = snapshot.snapper()
 nodes, edges = ox.graph_to_gdfs(graph)
 
 # Load land use data
-land_use = ox.geometries_from_place(place_name, tags={'landuse': True})
-
-# Function to check if a point is not in the green areas
-def is_not_in_green_area(point, green_areas):
-    for area in green_areas.itertuples():
-        if point.within(area.geometry):
-            return False
-    return True
-
-# Function to assign a random home location, avoiding green areas
-def assign_random_home(area, areas_gdf, green_areas):
-    selected_area = areas_gdf.loc[areas_gdf['Area'] == area, 'geometry'].squeeze()
-    while True:
-        random_point = Point(
-            random.uniform(selected_area.bounds[0], selected_area.bounds[2]),
-            random.uniform(selected_area.bounds[1], selected_area.bounds[3])
-        )
-        if selected_area.contains(random_point) and is_not_in_green_area(random_point, green_areas):
-            return random_point
-        
+land_use = load_land_use().to_geodataframe()
+
 green_areas = land_use[land_use['landuse'].isin(['forest', 'park'])]
 
-# function to assign a random point within a polygon (house locations)
-def assign_random_home(area, areas_gdf):
-    selected_area = areas_gdf[areas_gdf['Area'] == area].geometry.iloc[0]
-    minx, miny, maxx, maxy = selected_area.bounds
-    while True:
-        pnt = Point(random.uniform(minx, maxx), random.uniform(miny, maxy))
-        if selected_area.contains(pnt):
-            return pnt
+# Uniform point sampler over the areas, each area triangulated once
+region_sampler = RegionSampler(zip(areas_gdf['Area'], areas_gdf.geometry))
+rng = np.random.default_rng()
 
-# call the function above
-students['Home'] = students['Area'].apply(lambda x: assign_random_home(x, areas_gdf))
+# Draw every house location at once, uniformly inside the student's area
+home_x, home_y = region_sampler.sample_many(students['Area'], rng)
+students['Home'] = gpd.points_from_xy(home_x, home_y)
 
 # convert students DataFrame to a GeoDataFrame
 students_gdf = gpd.GeoDataFrame(students, geometry='Home', crs="EPSG:4326")
@@ -124,7 +107,8 @@ plt.show()
 
 # second plot
 # convert student homes to closest nodes on the road network
-students_gdf['closest_node'] = students_gdf.apply(lambda row: ox.distance.nearest_nodes(graph, row['Home'].x, row['Home'].y), axis=1)
+closest_nodes, snap_distances = snapper.nearest(students_gdf['Home'].x, students_gdf['Home'].y)
+students_gdf['closest_node'] = closest_nodes.astype(int)
 
 # plotting
 fig, ax = plt.subplots(figsize=(12, 8))
@@ -148,5 +132,4 @@ schools_gdf.plot(ax=ax, color='orange', marker='x', markersize=100, label='Schoo
 plt.title("Midland Road Network with Sections and Student Homes")
 plt.legend(title='Legend', bbox_to_anchor=(1.05, 1), loc='upper left')
 plt.tight_layout()
-ox.save_graphml(graph, 'Midland_road_network1.graphml')
 plt.show()
\ No newline at end of file
@@ -4,7 +4,11 @@ import matplotlib.pyplot as plt
 import contextily as ctx
 import pandas as pd
 from shapely.geometry import Point, Polygon
-import random
+import numpy as np
+import shapely
+from RegionSampler import RegionSampler
+from ExclusionIndex import GREEN_LAND_USE, load_exclusion_index
+from RoadNetwork import ROAD_NETWORK_GRAPHML, publish_road_network
 
 ox.settings.use_cache = True
 ox.settings.log_console = True
@@ -69,74 +73,54 @@ individual = pd.DataFrame({
 })
 
 # load the road network (second plot)
-place_name = "Midland, Michigan, USA"
-graph = ox.graph_from_place(place_name, network_type='drive')
+# (built once from the cached OSM responses and shared by every group, no network access needed)
+snapshot = publish_road_network()
+graph = ox.load_graphml(ROAD_NETWORK_GRAPHML)
+# KD-tree over the network's nodes for snapping points in one batch
+snapper = snapshot.snapper()
 nodes, edges = ox.graph_to_gdfs(graph)
 
-# Load land use data
-land_use = ox.geometries_from_place(place_name, tags={'landuse': True})
-
-# Function to check if a point is not in the green areas
-def is_not_in_green_area(point, green_areas):
-    for area in green_areas.itertuples():
-        if point.within(area.geometry):
-            return False
-    return True
-
-green_areas = land_use[land_use['landuse'].isin(['forest', 'park'])]
-
-# Function to assign a random home point, avoiding green areas
-def assign_random_point(area, areas_gdf, green_areas=None):
-    selected_area = areas_gdf.loc[areas_gdf['Area'] == area, 'geometry'].squeeze()
-    while True:
-        pnt = Point(random.uniform(selected_area.bounds[0], selected_area.bounds[2]),
-                    random.uniform(selected_area.bounds[1], selected_area.bounds[3]))
-        if selected_area.contains(pnt) and (green_areas is None or is_not_in_green_area(pnt, green_areas)):
-            return pnt
-        
-def get_destination_coords(location, areas_gdf):
-    if location in known_destinations:
-        return known_destinations[location]
-    elif "Random Node in" in location:
-        area_code = location.split()[-1]  # Get the area code from the string
-        return assign_random_point(area_code, areas_gdf)
-    else:
-        return None
-    
+# Uniform point sampler over the areas, each area triangulated once
+region_sampler = RegionSampler(zip(areas_gdf['Area'], areas_gdf.geometry))
+# Green areas merged per area with a raster over them, built once from the land use layer and shared by the scripts
+green_index = load_exclusion_index(GREEN_LAND_USE, region_sampler.regions)
+rng = np.random.default_rng()
+
+def get_destination_coords(location):
+    return known_destinations.get(location)
+
 # Function to generate random points
-def generate_random_points(area, count, areas_gdf):
-    points = []
-    selected_area = areas_gdf[area]
-    minx, miny, maxx, maxy = selected_area.bounds
-    while len(points) < count:
-        point = Point(random.uniform(minx, maxx), random.uniform(miny, maxy))
-        if selected_area.contains(point):
-            points.append(point)
-    return points
+def generate_random_points(area, count):
+    x, y = region_sampler.sample(area, count, rng)
+    return list(shapely.points(x, y))
 
 for index, row in trip_data_group3.iterrows():
     if row['Trip Type'] in ['House -> Other', 'Other -> House'] and 'Random Node in' in row['Destination Location']:
         area_code = row['Destination Location'].split()[-1]
         if area_code in areas_gdf.index:
-            selected_area = areas_gdf.loc[area_code, 'geometry']
-            random_points = generate_random_points(selected_area, 10)
+            random_points = generate_random_points(area_code, 10)
             print(f"Random points for {area_code}: {random_points}")
         else:
             print(f"No area found for code {area_code}")
     else:
         print(f"No random points needed for trip type {row['Trip Type']} at {row['Destination Location']}")
 
-# call the function above
-individual['Home'] = individual['Area'].apply(lambda area: assign_random_point(area, areas_gdf, green_areas))
+# Draw every home at once, uniformly inside the person's area and outside the green areas
+home_x, home_y = region_sampler.sample_many(individual['Area'], rng, exclude=green_index)
+individual['Home'] = gpd.points_from_xy(home_x, home_y)
 individuals_gdf = gpd.GeoDataFrame(individual, geometry='Home', crs="EPSG:4326")
 
 if isinstance(individual.loc[0, 'Home'], tuple):
     individuals_gdf['geometry'] = [Point(x, y) for x, y in individual['Home']]
 
 # Add destination coordinates
-trip_data_group3['Destination Coordinates'] = trip_data_group3['Destination Location'].apply(
-    lambda location: get_destination_coords(location, areas_gdf)
-)
+trip_data_group3['Destination Coordinates'] = trip_data_group3['Destination Location'].apply(get_destination_coords)
+# Random destinations are drawn in one batch per area
+random_destinations = trip_data_group3['Destination Location'].str.contains('Random Node in')
+dest_x, dest_y = region_sampler.sample_many(
+    trip_data_group3.loc[random_destinations, 'Destination Location'].str.split().str[-1], rng)
+trip_data_group3.loc[random_destinations, 'Destination Coordinates'] = pd.Series(
+    list(shapely.points(dest_x, dest_y)), index=trip_data_group3.index[random_destinations])
 
 # (first) plot with OpenStreetMap as the background
 fig, ax = plt.subplots(figsize=(12, 8))
@@ -163,15 +147,10 @@ plt.show()
 
 # second plot
 # convert individual homes to closest nodes on the road network
-
-def find_nearest_node(point, graph=graph):
-    return ox.distance.nearest_nodes(graph, point.x, point.y)
-
-individuals_gdf['closest_node'] = individuals_gdf.apply(lambda row: ox.distance.nearest_nodes(graph, row['Home'].x, row['Home'].y), axis=1)
-destinations_gdf['closest_node'] = destinations_gdf.apply(
-    lambda row: ox.distance.nearest_nodes(graph, row.geometry.x, row.geometry.y),
-    axis=1
-)
+closest_nodes, snap_distances = snapper.nearest(individuals_gdf['Home'].x, individuals_gdf['Home'].y)
+individuals_gdf['closest_node'] = closest_nodes.astype(int)
+closest_nodes, snap_distances = snapper.nearest(destinations_gdf.geometry.x, destinations_gdf.geometry.y)
+destinations_gdf['closest_node'] = closest_nodes.astype(int)
 # plotting
 fig, ax = plt.subplots(figsize=(12, 8))
 ax.set_xlim(-84.35, -84.15)
@@ -200,5 +179,4 @@ for idx, row in destinations_gdf.iterrows():
 plt.title("Group 4 Homes")
 plt.legend(title='Legend', bbox_to_anchor=(1.05, 1), loc='upper left')
 plt.tight_layout()
-ox.save_graphml(graph, 'Midland_road_network4.graphml')
 plt.show()
\ No newline at end of file
@@ -1,19 +1,59 @@
-import itertools
-import random
-import networkx as nx
+import numpy as np
 import pandas as pd
+from RouteSolver import solve_fixed_depot_group
+from RoadNetwork import ROAD_NETWORK_GRAPHML, publish_road_network
+from TravelTime import TravelTimeWeights
+from Landmarks import load_landmarks
+from ContractionHierarchy import load_hierarchy
+from DestinationTrees import load_destination_trees
+from ODMatrix import load_od_matrix, day_nodes
+from PathCache import PathCache
+from ParallelSolver import solve_groups
+from TripTimeline import build_trip_details, print_trip_details
+from TripGenerator import DEPARTURE_MINUTE, departure_minutes
 
 AV_SPEED_MPH = 60
 STOP_TIME_MINUTES = 2
 TRIP_DELAY_PROBABILITY = 0.01
 TRIP_DELAY_MINUTES = 5
 METERS_PER_MILE = 1609.34
+GRAPHML_PATH = ROAD_NETWORK_GRAPHML
+# Route on expected travel time instead of length
+ROUTE_BY_TRAVEL_TIME = False
+# Shortest path backend: 'ch' or 'alt' (see below)
+ROUTING_BACKEND = 'ch'
 
-G = nx.read_graphml('Midland_road_network2.graphml')
-G = G.to_undirected()
+# Parallel group solving: number of worker processes (1 solves in this process) and groups sent per task
+WORKERS = 1
+CHUNK_SIZE = 16
 
-for u, v, data in G.edges(data=True):
-    data['length'] = float(data.get('length', 1))
+# Define the nodes that will trigger a delay
+delay_nodes = ['183760220', '185230194', '185230266', '185231526', '185243366', '185243786', '185247019', 
+               '185256313', '185261837', '185261889', '3229016868', '185251914', '185258510', '185246345', 
+               '185231466', '185250935', '185251949', '185283598', '185283552', '185245093', '185251914', 
+               '185251949', '185251995', '185230194', '185245093', '185250333', '3229016868', '185245164', 
+               '185230138', '185249076']
+
+# Define the delay time in minutes
+delay_time = 5
+
+# Load the shared road network as a compiled CSR routing engine from its memory-mapped snapshot
+engine = publish_road_network(graphml_path=GRAPHML_PATH).engine()
+# Expected travel time per edge (speed, delay nodes and the chance of a random delay folded in);
+# with ROUTE_BY_TRAVEL_TIME the groups are routed on it, and total distances are in seconds
+travel_times = TravelTimeWeights(engine, AV_SPEED_MPH, delay_nodes, delay_time,
+                                 TRIP_DELAY_PROBABILITY, TRIP_DELAY_MINUTES)
+if ROUTE_BY_TRAVEL_TIME:
+    travel_times.apply()
+# Query backend, rebuilt whenever the graph or its weights change: 'ch' answers stop matrices and single
+# legs from a contraction hierarchy (exact, and the fastest here); 'alt' uses Dijkstra trees for matrices and
+# a landmark A* index for legs, which hands most long legs back to Dijkstra (see the report at the end)
+if ROUTING_BACKEND == 'ch':
+    engine.hierarchy = load_hierarchy(GRAPHML_PATH, engine)
+else:
+    engine.landmarks = load_landmarks(GRAPHML_PATH, engine)
+# Shortest paths persist between runs, shared by all group scripts, in a sqlite cache
+path_cache = PathCache('path_cache.sqlite', engine.graph_hash)
 
 # Define schools
 schools = {
@@ -27,11 +67,21 @@ schools['Midland HS'] = '185279147'
 schools['Dow HS'] = '185275807'
 schools['Jefferson MS'] = '185277799'
 schools['Northeast MS'] = '185247351'
+# Every trip starts or ends at a school, so the full shortest path trees from the schools are kept on disk
+# and any leg to or from a school is a lookup plus a predecessor walk
+engine.destination_trees = load_destination_trees(GRAPHML_PATH, engine, schools.values())
 
 # Students
 students_df = pd.read_excel('School2GroupsUpdated.xlsx')
 students_df['Node'] = students_df['Node'].astype(str)
-students_df['Trip Departure Time'] = pd.to_datetime(students_df['Trip Departure Time'], format='%H:%M')
+# Departure minutes after midnight (older files without the minute column are parsed once here)
+students_df[DEPARTURE_MINUTE] = departure_minutes(students_df)
+
+# Distances between every home and school of each day, computed once in blocks and memory-mapped, so group
+# matrices are read instead of searched
+engine.od_matrices = [load_od_matrix(GRAPHML_PATH, engine, day_nodes(students_df, day, ['Node'], schools.values()),
+                                     day, workers=WORKERS)
+                      for day in students_df['Trip Departure Day'].unique()]
 
 # Group nodes together from the assigned groupings with schools being in appropriate positions
 groups_nodes = {}
@@ -54,53 +104,39 @@ for group_number, group_df in students_df.groupby('Group Number'):
     
     groups_nodes[group_number] = group_nodes
 
-# Function to calculate total path length including intermediate nodes
-def calculate_total_path_length(G, path):
-    total_length = 0
-    for i in range(len(path) - 1):
-        total_length += nx.shortest_path_length(G, source=path[i], target=path[i + 1], weight='length')
-    return total_length
-
-# Function to get the full path including all intermediate nodes
-def get_full_path(G, path):
-    full_path = []
-    for i in range(len(path) - 1):
-        part_path = nx.shortest_path(G, source=path[i], target=path[i + 1], weight='length')
-        full_path.extend(part_path if not full_path else part_path[1:])
-    return full_path
-
-# Iterate over groups and find the optimal path for each
-optimal_paths = {}
+# Determine the fixed node (school) and the nodes to order for each group
+group_args = {}
 for group_number, nodes in groups_nodes.items():
-    min_length = float('inf')
-    optimal_order = None
-    optimal_full_path = None
-    
-    # Determine the fixed node (school) and the nodes to permute
     if nodes[0] in schools.values():  # School -> House
-        fixed_node = nodes[0]
-        nodes_to_permute = nodes[1:]
+        group_args[group_number] = (nodes, 'start')
     else:  # House -> School
-        fixed_node = nodes[-1]
-        nodes_to_permute = nodes[:-1]
-
-    # Generate permutations, keeping the school node fixed
-    for permutation in itertools.permutations(nodes_to_permute):
-        current_order = [fixed_node] + list(permutation) if fixed_node == nodes[0] else list(permutation) + [fixed_node]
-        current_length = calculate_total_path_length(G, current_order)
-        
-        if current_length < min_length:
-            min_length = current_length
-            optimal_order = current_order
-            optimal_full_path = get_full_path(G, current_order)
-    
-    # Store the results for this group
+        group_args[group_number] = ([nodes[-1]] + nodes[:-1], 'end')
+
+# Solve every group exactly on its stop distance matrix with the school node fixed
+group_results = solve_groups(solve_fixed_depot_group, group_args, GRAPHML_PATH, engine, path_cache,
+                             workers=WORKERS, chunk_size=CHUNK_SIZE)
+
+# Store the results for each group
+optimal_paths = {}
+for group_number, result in group_results.items():
     optimal_paths[group_number] = {
-        'optimal_order': optimal_order,
-        'optimal_full_path': optimal_full_path,
-        'total_distance': min_length
+        'optimal_order': result['optimal_order'],
+        'optimal_full_path': result['full_path'],
+        'total_distance': result['total_distance']
     }
 
+# Save the path cache and report how much of the routing it answered
+path_cache.close()
+cache_stats = path_cache.stats()
+print(f"Path cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+      f"({cache_stats['hit_rate']:.1%} hit rate), {cache_stats['entries']} pairs stored")
+# Landmark A* legs handed back to Dijkstra (searched in this process; workers keep their own counts)
+if ROUTING_BACKEND != 'ch':
+    landmark_stats = engine.landmarks.stats()
+    print(f"Landmark A*: {landmark_stats['searches']} searches, {landmark_stats['too_far']} too far apart and "
+          f"{landmark_stats['gave_up']} over the expansion limit ({landmark_stats['fallback_rate']:.1%} fell back "
+          f"to Dijkstra)")
+
 # Output the results for each group
 #for group_number, info in optimal_paths.items():
     #print(f"Group {group_number}:")
@@ -109,76 +145,21 @@ for group_number, nodes in groups_nodes.items():
     #print(f"  Total Distance: {info['total_distance']}")
 
 # After outputting the optimal order, we now can aim to calculate the timings
-
-# Function to calculate travel time in minutes given distance in miles
-def calculate_travel_time(distance_meters, speed_mph=AV_SPEED_MPH):
-    distance_miles = distance_meters / METERS_PER_MILE
-    travel_time_minutes = (distance_miles / speed_mph) * 60
-    return travel_time_minutes
-
-def process_trips(G, optimal_paths, students_df, delay_nodes, delay_time):
-    node_coords = {node: (data['x'], data['y']) for node, data in G.nodes(data=True)}
-    delay_nodes_set = set(delay_nodes)
-
-    trip_details = {}
-    for group_number, details in optimal_paths.items():
-        path = details['optimal_full_path']
-        order_nodes = details['optimal_order']
-        departure_time = students_df[students_df['Group Number'] == group_number].iloc[0]['Trip Departure Time']
-        current_time = pd.to_datetime(departure_time)
-        trip_info = []
-
-        for i in range(len(path) - 1):
-            source = path[i]
-            target = path[i + 1]
-            distance = nx.shortest_path_length(G, source, target, weight='length')
-            travel_time = calculate_travel_time(distance)
-
-            if random.random() < TRIP_DELAY_PROBABILITY:
-                travel_time += TRIP_DELAY_MINUTES
-
-            if node_coords[source] in delay_nodes_set or node_coords[target] in delay_nodes_set:
-                travel_time += delay_time
-
-            # Only add stop time if the node is in the optimal order list
-            stop_time = STOP_TIME_MINUTES if source in order_nodes else 0
-            current_time += pd.Timedelta(minutes=travel_time + stop_time)
-            trip_info.append((source, target, distance, travel_time, current_time.strftime('%H:%M')))
-
-        trip_details[group_number] = trip_info
-
+def process_trips(engine, optimal_paths, students_df, delay_nodes, delay_time):
+    delay_mask = np.isin(engine.node_ids, list(delay_nodes))
+    departures = students_df.groupby('Group Number')[DEPARTURE_MINUTE].first()
+    trip_details = build_trip_details(engine, optimal_paths, departures, 'optimal_full_path', delay_mask, delay_time,
+                                      AV_SPEED_MPH, STOP_TIME_MINUTES, TRIP_DELAY_PROBABILITY, TRIP_DELAY_MINUTES)
     return trip_details
 
-# Define the coordinates that will trigger a delay
-delay_nodes = ['183760220', '185230194', '185230266', '185231526', '185243366', '185243786', '185247019', 
-               '185256313', '185261837', '185261889', '3229016868', '185251914', '185258510', '185246345', 
-               '185231466', '185250935', '185251949', '185283598', '185283552', '185245093', '185251914', 
-               '185251949', '185251995', '185230194', '185245093', '185250333', '3229016868', '185245164', 
-               '185230138', '185249076']
-
-# Define the delay time in minutes
-delay_time = 5
-
 # Example use of the function
-trip_results = process_trips(G, optimal_paths, students_df, delay_nodes, delay_time)
+trip_results = process_trips(engine, optimal_paths, students_df, delay_nodes, delay_time)
 
 # Printing trip details for each group
-for group, trips in trip_results.items():
-    print(f"Group {group}:")
-    for trip in trips:
-        print(f"  From {trip[0]} to {trip[1]}, Travel Time: {trip[3]:.2f} minutes, Arrival Time: {trip[4]}")
-
-# Create DataFrame to export to Excel
-columns = ['Group Number', 'From Node', 'To Node', 'Distance (meters)', 'Travel Time (minutes)', 'Arrival Time', 'From Node in Optimal Order', 'To Node in Optimal Order']
-data = []
-for group, details in trip_results.items():
-    for trip in details:
-        # Check if the nodes are in the optimal order for this group
-        from_node_in_optimal = "Yes" if trip[0] in optimal_paths[group]['optimal_order'] else "No"
-        to_node_in_optimal = "Yes" if trip[1] in optimal_paths[group]['optimal_order'] else "No"
-        data.append([group] + list(trip) + [from_node_in_optimal, to_node_in_optimal])
-
-df = pd.DataFrame(data, columns=columns)
+print_trip_details(trip_results)
+
+# One row per edge, ready to export
+df = trip_results
 
 # Export to Excel
 output_file_path = "TripDetails_Group2.xlsx"
@@ -1,8 +1,16 @@
-from datetime import timedelta
-import itertools
-import random
-import networkx as nx
+import numpy as np
 import pandas as pd
+from RouteSolver import solve_pickup_dropoff_group_heuristic
+from RoadNetwork import ROAD_NETWORK_GRAPHML, publish_road_network
+from TravelTime import TravelTimeWeights
+from Landmarks import load_landmarks
+from ContractionHierarchy import load_hierarchy
+from DestinationTrees import load_destination_trees
+from ODMatrix import load_od_matrix, day_nodes
+from PathCache import PathCache
+from ParallelSolver import solve_groups
+from TripTimeline import build_trip_details, print_trip_details
+from TripGenerator import DEPARTURE_MINUTE, departure_minutes
 
 # Constants
 AV_SPEED_MPH = 60
@@ -10,64 +18,128 @@ STOP_TIME_MINUTES = 2
 TRIP_DELAY_PROBABILITY = 0.01
 TRIP_DELAY_MINUTES = 5
 METERS_PER_MILE = 1609.34
+GRAPHML_PATH = ROAD_NETWORK_GRAPHML
+VEHICLE_CAPACITY = 4
+# Route on expected travel time instead of length
+ROUTE_BY_TRAVEL_TIME = False
+# Shortest path backend: 'ch' or 'alt' (see below)
+ROUTING_BACKEND = 'ch'
+
+# Parallel group solving: number of worker processes (1 solves in this process) and groups sent per task
+WORKERS = 1
+CHUNK_SIZE = 16
+
+# Where each tour starts: 'pickup' starts at a rider's pickup (their house on outgoing trips),
+# 'depot' starts every tour at DEPOT_NODE
+START_AT = 'pickup'
+DEPOT_NODE = None
+
+# Local search budget per group
+LOCAL_SEARCH_MAX_ITERATIONS = 100
+LOCAL_SEARCH_TIME_BUDGET = 0.05  # seconds
+
+# Define the nodes that will trigger a delay
+delay_nodes = ['183760220', '185230194', '185230266', '185231526', '185243366', '185243786', '185247019', 
+               '185256313', '185261837', '185261889', '3229016868', '185251914', '185258510', '185246345', 
+               '185231466', '185250935', '185251949', '185283598', '185283552', '185245093', '185251914', 
+               '185251949', '185251995', '185230194', '185245093', '185250333', '3229016868', '185245164', 
+               '185230138', '185249076']
 
-# Load graph data
-G = nx.read_graphml('Midland_road_network4.graphml')
-G = G.to_undirected()
-for u, v, data in G.edges(data=True):
-    data['length'] = float(data.get('length', 1))
+# Define the delay time in minutes
+delay_time = 5
+
+# Load the shared road network as a compiled CSR routing engine from its memory-mapped snapshot
+engine = publish_road_network(graphml_path=GRAPHML_PATH).engine()
+# Expected travel time per edge (speed, delay nodes and the chance of a random delay folded in);
+# with ROUTE_BY_TRAVEL_TIME the groups are routed on it, and total distances are in seconds
+travel_times = TravelTimeWeights(engine, AV_SPEED_MPH, delay_nodes, delay_time,
+                                 TRIP_DELAY_PROBABILITY, TRIP_DELAY_MINUTES)
+if ROUTE_BY_TRAVEL_TIME:
+    travel_times.apply()
+# Query backend, rebuilt whenever the graph or its weights change: 'ch' answers stop matrices and single
+# legs from a contraction hierarchy (exact, and the fastest here); 'alt' uses Dijkstra trees for matrices and
+# a landmark A* index for legs, which hands most long legs back to Dijkstra (see the report at the end)
+if ROUTING_BACKEND == 'ch':
+    engine.hierarchy = load_hierarchy(GRAPHML_PATH, engine)
+else:
+    engine.landmarks = load_landmarks(GRAPHML_PATH, engine)
+# Shortest paths persist between runs, shared by all group scripts, in a sqlite cache
+path_cache = PathCache('path_cache.sqlite', engine.graph_hash)
 
 # Load individuals data
 individuals_df = pd.read_excel('PovertyGroupsUpdated.xlsx')
 individuals_df['House Node'] = individuals_df['House Node'].astype(str)
 individuals_df['Destination Node'] = individuals_df['Destination Node'].astype(str)
-individuals_df['Trip Departure Time'] = pd.to_datetime(individuals_df['Trip Departure Time'], format='%H:%M')
+# Departure minutes after midnight (older files without the minute column are parsed once here)
+individuals_df[DEPARTURE_MINUTE] = departure_minutes(individuals_df)
 print("Individuals data loaded.")
 
-# Functions for path calculation
-def calculate_total_path_length(G, path):
-    return sum(nx.shortest_path_length(G, source=path[i], target=path[i + 1], weight='length') for i in range(len(path) - 1))
-
-def get_full_path(G, path):
-    full_path = []
-    for i in range(len(path) - 1):
-        part_path = nx.shortest_path(G, source=path[i], target=path[i + 1], weight='length')
-        full_path.extend(part_path[:-1])
-    full_path.append(path[-1])
-    return full_path
-
-def nearest_neighbor_path(G, start_node, nodes):
-    unvisited = set(nodes)
-    unvisited.remove(start_node)
-    tour = [start_node]
-    current = start_node
-    while unvisited:
-        next_node = min(unvisited, key=lambda node: nx.shortest_path_length(G, current, node, weight='length'))
-        tour.append(next_node)
-        unvisited.remove(next_node)
-        current = next_node
-    return tour
-
-def find_optimal_paths_heuristic(G, individuals_df):
-    print("Finding paths using Nearest Neighbor heuristic...")
-    optimal_paths = {}
+# Named destinations (everything but the random nodes) are shared by many riders, so the full shortest path
+# trees from them are kept on disk and any leg to or from one is a lookup plus a predecessor walk
+known_destinations = ~individuals_df['Destination Location'].str.startswith('Random Node in')
+engine.destination_trees = load_destination_trees(
+    GRAPHML_PATH, engine, individuals_df.loc[known_destinations, 'Destination Node'].unique())
+
+# Distances between every home and destination of each day, computed once in blocks and memory-mapped, so
+# group matrices are read instead of searched
+engine.od_matrices = [load_od_matrix(GRAPHML_PATH, engine, day_nodes(individuals_df, day), day, workers=WORKERS)
+                      for day in individuals_df['Trip Departure Day'].unique()]
+
+def find_optimal_paths_heuristic(engine, individuals_df, path_cache=None):
+    if START_AT == 'depot' and DEPOT_NODE is None:
+        raise ValueError("START_AT is 'depot' but no DEPOT_NODE is set")
+    print("Finding paths using Nearest Neighbor heuristic with 2-opt / Or-opt refinement...")
+    group_args = {}
     for group_number, group_df in individuals_df.groupby('Group Number'):
-        print(f"Processing group {group_number}...")
-        nodes = list(set(group_df['House Node']) | set(group_df['Destination Node']))
-        start_node = nodes[0]  # arbitrary start
-        optimal_order = nearest_neighbor_path(G, start_node, nodes)
-        full_path = get_full_path(G, optimal_order)
-        total_distance = calculate_total_path_length(G, full_path)
+        # Outgoing riders are picked up at home, returning riders at their destination
+        outgoing = group_df['Trip Type'].str.startswith('House ->')
+        pickups = group_df['House Node'].where(outgoing, group_df['Destination Node']).tolist()
+        dropoffs = group_df['Destination Node'].where(outgoing, group_df['House Node']).tolist()
+        group_args[group_number] = (pickups, dropoffs)
+
+    print(f"Processing {len(group_args)} groups with {WORKERS} worker(s)...")
+    group_results = solve_groups(
+        solve_pickup_dropoff_group_heuristic, group_args, GRAPHML_PATH, engine, path_cache,
+        workers=WORKERS, chunk_size=CHUNK_SIZE, capacity=VEHICLE_CAPACITY,
+        depot_node=DEPOT_NODE if START_AT == 'depot' else None,
+        max_iterations=LOCAL_SEARCH_MAX_ITERATIONS, time_budget=LOCAL_SEARCH_TIME_BUDGET)
+
+    optimal_paths = {}
+    stage_totals = {'nearest_neighbor': 0.0, 'two_opt': 0.0, 'or_opt': 0.0}
+    for group_number, result in group_results.items():
+        for stage, length in result['stages'].items():
+            stage_totals[stage] += length
         optimal_paths[group_number] = {
-            'optimal_order': optimal_order,
-            'total_distance': total_distance,
-            'full_path': full_path
+            'optimal_order': result['optimal_order'],
+            'total_distance': result['total_distance'],
+            'full_path': result['full_path']
         }
     print("Paths found using heuristic.")
+
+    # Report how much each stage shortened the tours (in seconds when routing on travel time)
+    unit = 'seconds' if ROUTE_BY_TRAVEL_TIME else 'meters'
+    nearest_neighbor_total = stage_totals['nearest_neighbor']
+    two_opt_gain = nearest_neighbor_total - stage_totals['two_opt']
+    or_opt_gain = stage_totals['two_opt'] - stage_totals['or_opt']
+    print(f"Nearest Neighbor total distance: {nearest_neighbor_total:.0f} {unit}")
+    print(f"2-opt improvement: {two_opt_gain:.0f} {unit} ({100 * two_opt_gain / max(nearest_neighbor_total, 1):.2f}%)")
+    print(f"Or-opt improvement: {or_opt_gain:.0f} {unit} ({100 * or_opt_gain / max(nearest_neighbor_total, 1):.2f}%)")
     return optimal_paths
 
 # Use the heuristic method instead
-optimal_paths = find_optimal_paths_heuristic(G, individuals_df)
+optimal_paths = find_optimal_paths_heuristic(engine, individuals_df, path_cache)
+
+# Save the path cache and report how much of the routing it answered
+path_cache.close()
+cache_stats = path_cache.stats()
+print(f"Path cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+      f"({cache_stats['hit_rate']:.1%} hit rate), {cache_stats['entries']} pairs stored")
+# Landmark A* legs handed back to Dijkstra (searched in this process; workers keep their own counts)
+if ROUTING_BACKEND != 'ch':
+    landmark_stats = engine.landmarks.stats()
+    print(f"Landmark A*: {landmark_stats['searches']} searches, {landmark_stats['too_far']} too far apart and "
+          f"{landmark_stats['gave_up']} over the expansion limit ({landmark_stats['fallback_rate']:.1%} fell back "
+          f"to Dijkstra)")
 
 with open("group4_details.txt", "w") as file:
     for group_number, info in optimal_paths.items():
@@ -78,67 +150,21 @@ with open("group4_details.txt", "w") as file:
         file.write("\n")
 
 # After outputting the optimal order, we now can aim to calculate the timings
-# in the next file
-# Function to calculate travel time in minutes given distance in miles
-def calculate_travel_time(distance_meters, speed_mph=AV_SPEED_MPH):
-    distance_miles = distance_meters / METERS_PER_MILE
-    travel_time_minutes = (distance_miles / speed_mph) * 60
-    return travel_time_minutes
-
-def process_trips(G, optimal_paths, individuals_df, delay_nodes, delay_time):
-    node_coords = {node: (data['x'], data['y']) for node, data in G.nodes(data=True)}
-    delay_nodes_set = set(delay_nodes)
-
-    trip_details = {}
-    for group_number, details in optimal_paths.items():
-        print(f"Processing group {group_number}...")
-        path = details['full_path']
-        order_nodes = details['optimal_order']
-        departure_time = individuals_df[individuals_df['Group Number'] == group_number].iloc[0]['Trip Departure Time']
-        current_time = pd.to_datetime(departure_time)
-        trip_info = []
-        for i in range(len(path) - 1):
-            source = path[i]
-            target = path[i + 1]
-            
-            distance = nx.shortest_path_length(G, source, target, weight='length')
-            travel_time = calculate_travel_time(distance, AV_SPEED_MPH)
-            if random.random() < TRIP_DELAY_PROBABILITY:
-                travel_time += TRIP_DELAY_MINUTES
-            if node_coords[source] in delay_nodes_set or node_coords[target] in delay_nodes_set:
-                travel_time += delay_time
-            stop_time = STOP_TIME_MINUTES if source in order_nodes else 0
-            current_time += pd.Timedelta(minutes=travel_time + stop_time)
-            trip_info.append((source, target, distance, travel_time, current_time.strftime('%H:%M')))
-        trip_details[group_number] = trip_info
+def process_trips(engine, optimal_paths, individuals_df, delay_nodes, delay_time):
+    delay_mask = np.isin(engine.node_ids, list(delay_nodes))
+    departures = individuals_df.groupby('Group Number')[DEPARTURE_MINUTE].first()
+    trip_details = build_trip_details(engine, optimal_paths, departures, 'full_path', delay_mask, delay_time,
+                                      AV_SPEED_MPH, STOP_TIME_MINUTES, TRIP_DELAY_PROBABILITY, TRIP_DELAY_MINUTES)
     print("Trip processing complete.")
     return trip_details
 
-delay_nodes = ['183760220', '185230194', '185230266', '185231526', '185243366', '185243786', '185247019', 
-               '185256313', '185261837', '185261889', '3229016868', '185251914', '185258510', '185246345', 
-               '185231466', '185250935', '185251949', '185283598', '185283552', '185245093', '185251914', 
-               '185251949', '185251995', '185230194', '185245093', '185250333', '3229016868', '185245164', 
-               '185230138', '185249076']
-delay_time = 5
-trip_results = process_trips(G, optimal_paths, individuals_df, delay_nodes, delay_time)
+trip_results = process_trips(engine, optimal_paths, individuals_df, delay_nodes, delay_time)
 
 # Printing trip details for each group
-for group, trips in trip_results.items():
-    print(f"Group {group}:")
-    for trip in trips:
-        print(f"  From {trip[0]} to {trip[1]}, Travel Time: {trip[3]:.2f} minutes, Arrival Time: {trip[4]}")
-
-# Create DataFrame to export to Excel
-columns = ['Group Number', 'From Node', 'To Node', 'Distance (meters)', 'Travel Time (minutes)', 'Arrival Time', 'From Node in Optimal Order', 'To Node in Optimal Order']
-data = []
-for group, details in trip_results.items():
-    for trip in details:
-        # Check if the nodes are in the optimal order for this group
-        from_node_in_optimal = "Yes" if trip[0] in optimal_paths[group]['optimal_order'] else "No"
-        to_node_in_optimal = "Yes" if trip[1] in optimal_paths[group]['optimal_order'] else "No"
-        data.append([group] + list(trip) + [from_node_in_optimal, to_node_in_optimal])
-
-df = pd.DataFrame(data, columns=columns)
+print_trip_details(trip_results)
+
+# One row per edge, ready to export
+df = trip_results
 
 # Export to Excel
 output_file_path = "TripDetails_Group4.csv"
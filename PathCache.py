@@ -0,0 +1,179 @@
+import sqlite3
+import time
+
+# Cached pairs kept before the least recently used ones are evicted
+DEFAULT_MAX_ENTRIES = 1_000_000
+# Pending writes are committed in batches of this size (and on flush/close)
+COMMIT_EVERY = 1000
+# SQLite caps the number of bound parameters per statement
+MAX_BATCH = 900
+# Seconds a connection waits on a locked database before giving up
+BUSY_TIMEOUT = 60
+
+# Persistent shortest path cache: (graph hash, source, target) -> distance and node path.
+# Backed by sqlite so it survives between runs and is shared by every group script on the same graph.
+# The path column stays NULL until a full path for the pair has been rebuilt once.
+# A read_only cache (one per ParallelSolver worker) never writes to the database: it queues new distances,
+# paths and lookups in memory until take_writes(), and the process owning the writable cache applies them.
+class PathCache:
+    def __init__(self, db_path, graph_hash, max_entries=DEFAULT_MAX_ENTRIES, read_only=False):
+        self.db_path = db_path
+        self.graph_hash = graph_hash
+        self.max_entries = max_entries
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self.pending = 0
+        self.queued_distances = {}
+        self.queued_paths = {}
+        self.queued_touches = set()
+        if read_only:
+            self.conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=BUSY_TIMEOUT)
+            self.entries = 0
+            return
+        self.conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS paths (
+                graph_hash TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                distance REAL NOT NULL,
+                path TEXT,
+                last_used INTEGER NOT NULL,
+                PRIMARY KEY (graph_hash, source, target)
+            ) WITHOUT ROWID''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS paths_last_used ON paths (last_used)')
+        self.entries = self.conn.execute('SELECT COUNT(*) FROM paths').fetchone()[0]
+
+    # Function to look up the distances between every ordered pair of different nodes in `nodes`.
+    # Returns {(source, target): distance} for the pairs that are cached.
+    def get_distances(self, nodes):
+        nodes = list(dict.fromkeys(nodes))
+        found = {}
+        if len(nodes) * 2 + 1 <= MAX_BATCH:
+            marks = ','.join('?' * len(nodes))
+            rows = self.conn.execute(
+                f'SELECT source, target, distance FROM paths WHERE graph_hash = ? '
+                f'AND source IN ({marks}) AND target IN ({marks})',
+                [self.graph_hash] + nodes + nodes).fetchall()
+            found = {(source, target): distance for source, target, distance in rows if source != target}
+        if self.read_only:
+            wanted_nodes = set(nodes)
+            for pair, distance in self._queued_distance_items():
+                if pair[0] != pair[1] and pair[0] in wanted_nodes and pair[1] in wanted_nodes:
+                    found[pair] = distance
+        wanted = len(nodes) * (len(nodes) - 1)
+        self.hits += len(found)
+        self.misses += wanted - len(found)
+        self._touch(list(found))
+        return found
+
+    # Function to look up the full node path of one pair, or None if it has not been stored
+    def get_path(self, source, target):
+        if (source, target) in self.queued_paths:
+            self.hits += 1
+            return self.queued_paths[(source, target)][1]
+        row = self.conn.execute(
+            'SELECT path FROM paths WHERE graph_hash = ? AND source = ? AND target = ? AND path IS NOT NULL',
+            (self.graph_hash, source, target)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._touch([(source, target)])
+        return row[0].split(' ')
+
+    # Function to store distances, given as {(source, target): distance}; stored paths are kept
+    def put_distances(self, distances):
+        if self.read_only:
+            self.queued_distances.update((pair, float(distance)) for pair, distance in distances.items())
+            return
+        now = time.time_ns()
+        self.conn.executemany(
+            'INSERT INTO paths (graph_hash, source, target, distance, path, last_used) VALUES (?, ?, ?, ?, NULL, ?) '
+            'ON CONFLICT (graph_hash, source, target) DO UPDATE SET distance = excluded.distance, '
+            'last_used = excluded.last_used',
+            [(self.graph_hash, source, target, float(distance), now) for (source, target), distance in distances.items()])
+        self._written(len(distances))
+
+    # Function to store the full node path (and its distance) of one pair
+    def put_path(self, source, target, distance, path):
+        if self.read_only:
+            self.queued_paths[(source, target)] = (float(distance), list(path))
+            return
+        self.conn.execute(
+            'INSERT INTO paths (graph_hash, source, target, distance, path, last_used) VALUES (?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (graph_hash, source, target) DO UPDATE SET path = excluded.path, '
+            'last_used = excluded.last_used',
+            (self.graph_hash, source, target, float(distance), ' '.join(path), time.time_ns()))
+        self._written(1)
+
+    def _touch(self, pairs):
+        if self.read_only:
+            self.queued_touches.update(pairs)
+        elif pairs:
+            now = time.time_ns()
+            self.conn.executemany(
+                'UPDATE paths SET last_used = ? WHERE graph_hash = ? AND source = ? AND target = ?',
+                [(now, self.graph_hash, source, target) for source, target in pairs])
+
+    def _queued_distance_items(self):
+        yield from self.queued_distances.items()
+        for pair, (distance, _) in self.queued_paths.items():
+            yield pair, distance
+
+    # Function to hand over (and forget) everything a read_only cache has queued, for apply_writes()
+    def take_writes(self):
+        writes = (self.queued_distances, self.queued_paths, self.queued_touches)
+        self.queued_distances, self.queued_paths, self.queued_touches = {}, {}, set()
+        return writes
+
+    # Function to store what a read_only cache queued (see take_writes) in this writable cache
+    def apply_writes(self, writes):
+        distances, paths, touches = writes
+        if distances:
+            self.put_distances(distances)
+        for (source, target), (distance, path) in paths.items():
+            self.put_path(source, target, distance, path)
+        self._touch(list(touches - distances.keys() - paths.keys()))
+
+    def _written(self, count):
+        # Upserts of existing pairs are over-counted here; evict() recounts before deleting anything
+        self.entries += count
+        self.pending += count
+        if self.pending >= COMMIT_EVERY:
+            self.flush()
+
+    # Function to drop the least recently used pairs once the cache is over its size cap
+    def evict(self):
+        if self.entries <= self.max_entries:
+            return
+        self.entries = self.conn.execute('SELECT COUNT(*) FROM paths').fetchone()[0]
+        excess = self.entries - self.max_entries
+        if excess > 0:
+            self.conn.execute(
+                'DELETE FROM paths WHERE (graph_hash, source, target) IN '
+                '(SELECT graph_hash, source, target FROM paths ORDER BY last_used LIMIT ?)', (excess,))
+            self.entries = self.max_entries
+
+    def flush(self):
+        if self.read_only:
+            return
+        self.evict()
+        self.conn.commit()
+        self.pending = 0
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'entries': self.entries
+        }
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import shapely
+
+# Bump when the index layout changes so old indexes are rebuilt
+REGION_NODES_FORMAT_VERSION = 1
+# Position returned for draws from a region that is unknown or holds no nodes
+NO_NODE = -1
+
+# Region -> node membership of a road network: every node is labelled once per region with a vectorized
+# point-in-polygon test, and the members of region i are the node positions members[offsets[i]:offsets[i + 1]].
+# Random nodes are then drawn per region with one rng.choice over its members.
+class RegionNodeIndex:
+    def __init__(self, region_names, offsets, members):
+        self.region_names = list(region_names)
+        self.offsets = offsets
+        self.members = members
+        self.region_position = {name: i for i, name in enumerate(self.region_names)}
+
+    @classmethod
+    def build(cls, x, y, regions):
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        names, members = [], []
+        for name, polygon in regions.items():
+            shapely.prepare(polygon)
+            # Same test as nodes.within(polygon): nodes on the boundary are not members
+            members.append(np.flatnonzero(shapely.contains_xy(polygon, x, y)).astype(np.int64))
+            names.append(name)
+        offsets = np.concatenate([[0], np.cumsum([len(m) for m in members])]).astype(np.int64)
+        members = np.concatenate(members) if members else np.empty(0, dtype=np.int64)
+        return cls(names, offsets, members)
+
+    # Node positions inside one region (empty for an unknown region)
+    def nodes(self, name):
+        i = self.region_position.get(name)
+        if i is None:
+            return self.members[:0]
+        return self.members[self.offsets[i]:self.offsets[i + 1]]
+
+    # Function to draw n random node positions inside one region (uniform, with replacement).
+    # Returns NO_NODE for every draw when the region is unknown or has no nodes.
+    def sample(self, name, n, rng):
+        members = self.nodes(name)
+        if len(members) == 0:
+            return np.full(n, NO_NODE, dtype=np.int64)
+        return rng.choice(members, size=n)
+
+    # Function to draw one random node position per entry of `names`, in one batch per region.
+    # Returns an array aligned with `names`.
+    def sample_many(self, names, rng):
+        names = np.asarray(names, dtype=object)
+        positions = np.full(len(names), NO_NODE, dtype=np.int64)
+        for name in dict.fromkeys(names.tolist()):
+            rows = np.flatnonzero(names == name)
+            positions[rows] = self.sample(name, len(rows), rng)
+        return positions
+
+    def save(self, index_dir, meta):
+        tmp_dir = f'{index_dir}.tmp-{os.getpid()}'
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(tmp_dir, 'members.npy'), self.members)
+        meta = dict(meta, format_version=REGION_NODES_FORMAT_VERSION, regions=self.region_names)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=2)
+        if os.path.isdir(index_dir):
+            shutil.rmtree(index_dir)
+        os.replace(tmp_dir, index_dir)
+
+    @classmethod
+    def open(cls, index_dir):
+        with open(os.path.join(index_dir, 'meta.json')) as file:
+            meta = json.load(file)
+        index = cls(meta['regions'], np.load(os.path.join(index_dir, 'offsets.npy')),
+                    np.load(os.path.join(index_dir, 'members.npy'), mmap_mode='r'))
+        return index, meta
+
+# Function to get the region -> node index of a graph snapshot for some named region polygons. It is stored
+# inside the snapshot directory, keyed by the region polygons, and rebuilt when the source graph changes.
+def load_region_node_index(snapshot, regions):
+    regions = dict(regions)
+    digest = hashlib.sha1()
+    for name, polygon in regions.items():
+        digest.update(name.encode())
+        digest.update(polygon.wkb)
+    index_dir = os.path.join(snapshot.snapshot_dir, f'regions-{digest.hexdigest()[:16]}')
+    if os.path.exists(os.path.join(index_dir, 'meta.json')):
+        index, meta = RegionNodeIndex.open(index_dir)
+        if (meta.get('format_version') == REGION_NODES_FORMAT_VERSION
+                and meta.get('source_sha256') == snapshot.meta['source_sha256']):
+            return index
+    index = RegionNodeIndex.build(snapshot.x, snapshot.y, regions)
+    index.save(index_dir, {'source_sha256': snapshot.meta['source_sha256'], 'nodes': len(snapshot.node_ids)})
+    return index
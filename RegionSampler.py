@@ -0,0 +1,71 @@
+import numpy as np
+import shapely
+from shapely.geometry import MultiPolygon, Polygon
+from shapely.geometry.base import BaseGeometry
+
+# Rounds of redrawing points that fell into an excluded area before giving up on a region
+MAX_EXCLUSION_ROUNDS = 100
+
+# Function to split a (possibly invalid) polygon into triangles that exactly cover it.
+# Returns the corner coordinates as three (T, 2) arrays a, b, c.
+def triangulate(polygon):
+    polygon = shapely.make_valid(polygon)
+    parts = [polygon] if isinstance(polygon, Polygon) else [
+        part for part in getattr(polygon, 'geoms', []) if isinstance(part, (Polygon, MultiPolygon))]
+    triangles = [triangle for part in parts for triangle in shapely.constrained_delaunay_triangles(part).geoms]
+    corners = np.array([np.asarray(triangle.exterior.coords)[:3] for triangle in triangles]).reshape(-1, 3, 2)
+    return corners[:, 0], corners[:, 1], corners[:, 2]
+
+# Uniform point sampler for named regions (e.g. the EM/NM/WM/SM/CM polygons). Each region is triangulated
+# once; a draw picks triangles in proportion to their area and places a uniform point in each, so every
+# draw lands inside the region and no rejection loop is needed (except around excluded areas).
+class RegionSampler:
+    def __init__(self, regions):
+        self.regions = dict(regions)
+        self.triangles = {}
+        for name, polygon in self.regions.items():
+            a, b, c = triangulate(polygon)
+            ab, ac = b - a, c - a
+            areas = np.abs(ab[:, 0] * ac[:, 1] - ab[:, 1] * ac[:, 0]) / 2
+            self.triangles[name] = (a, ab, ac, areas / areas.sum())
+
+    # Function to draw n uniform points inside one region as (x, y) arrays. With `exclude` (a shapely
+    # geometry, or an ExclusionIndex such as the green areas) points inside it are redrawn until none are left.
+    def sample(self, name, n, rng, exclude=None):
+        a, ab, ac, weights = self.triangles[name]
+        x, y = self._draw(a, ab, ac, weights, n, rng)
+        if exclude is not None:
+            if isinstance(exclude, BaseGeometry):
+                shapely.prepare(exclude)
+                excluded = lambda x, y: shapely.contains_xy(exclude, x, y)
+            else:
+                excluded = lambda x, y: exclude.contains_xy(x, y, region=name)
+            for _ in range(MAX_EXCLUSION_ROUNDS):
+                rejected = np.flatnonzero(excluded(x, y))
+                if len(rejected) == 0:
+                    break
+                x[rejected], y[rejected] = self._draw(a, ab, ac, weights, len(rejected), rng)
+            else:
+                raise ValueError(f"Could not place points in {name} outside the excluded areas")
+        return x, y
+
+    # Function to draw one point per entry of `names` in its region, in one batch per region.
+    # Returns (x, y) arrays aligned with `names`.
+    def sample_many(self, names, rng, exclude=None):
+        names = np.asarray(names)
+        x = np.empty(len(names))
+        y = np.empty(len(names))
+        for name in np.unique(names):
+            rows = np.flatnonzero(names == name)
+            x[rows], y[rows] = self.sample(name, len(rows), rng, exclude)
+        return x, y
+
+    @staticmethod
+    def _draw(a, ab, ac, weights, n, rng):
+        triangle = rng.choice(len(weights), size=n, p=weights)
+        u, v = rng.random((2, n))
+        # Points in the far half of the parallelogram are folded back into the triangle
+        fold = u + v > 1
+        u[fold], v[fold] = 1 - u[fold], 1 - v[fold]
+        points = a[triangle] + u[:, None] * ab[triangle] + v[:, None] * ac[triangle]
+        return points[:, 0].copy(), points[:, 1].copy()
@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import networkx as nx
+import shapely
+from shapely.geometry import LineString, Polygon, shape
+from shapely.ops import polygonize, unary_union
+
+from GraphSnapshot import load_snapshot
+
+# Bump when the builder changes the graph or land use it produces, so both are rebuilt
+ROAD_NETWORK_VERSION = 1
+CACHE_DIR = 'cache'
+PLACE_NAME = 'Midland, Michigan, USA'
+# The one road network every group script shares
+ROAD_NETWORK_GRAPHML = 'Midland_road_network.graphml'
+EARTH_RADIUS_METERS = 6371009
+# Way tags kept on the edges, as osmnx does for its drive networks
+USEFUL_TAGS_WAY = ['bridge', 'tunnel', 'oneway', 'lanes', 'ref', 'name', 'highway', 'maxspeed', 'service',
+                   'access', 'area', 'landuse', 'width', 'est_width', 'junction']
+USEFUL_TAGS_NODE = ['ref', 'highway']
+ONEWAY_VALUES = {'yes', 'true', '1', '-1', 'reverse', 'T', 'F'}
+REVERSED_VALUES = {'-1', 'reverse', 'T'}
+LAND_USE_FORMAT_VERSION = 1
+LAND_USE_ARRAYS = ['element_type', 'osmid', 'landuse', 'name', 'geometry_offsets', 'geometry_wkb']
+
+# Default land use location: Midland_road_network.graphml -> Midland_road_network.landuse/
+def land_use_dir_for(graphml_path):
+    return os.path.splitext(graphml_path)[0] + '.landuse'
+
+# Function to sort the osmnx response cache into the place lookups (Nominatim), the drive network and the
+# land use (Overpass). The files are named by request hash, so they are told apart by their contents.
+# Raises FileNotFoundError straight away if any of the three is missing.
+def read_cached_responses(cache_dir=CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        raise FileNotFoundError(f"No response cache at {cache_dir}")
+    responses = {'places': [], 'drive': None, 'land_use': None}
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(cache_dir)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(cache_dir, name), 'rb') as file:
+            raw = file.read()
+        response = json.loads(raw)
+        if isinstance(response, list):
+            responses['places'].append(response)
+        elif 'elements' in response:
+            ways = [element for element in response['elements'] if element['type'] == 'way']
+            if ways and all('highway' in way.get('tags', {}) for way in ways):
+                responses['drive'] = response
+            elif any('landuse' in element.get('tags', {}) for element in response['elements']):
+                responses['land_use'] = response
+            else:
+                continue
+        else:
+            continue
+        digest.update(name.encode())
+        digest.update(raw)
+
+    missing = [label for kind, label in (('places', 'Nominatim place'), ('drive', 'Overpass drive network'),
+                                         ('land_use', 'Overpass land use')) if not responses[kind]]
+    if missing:
+        raise FileNotFoundError(f"{cache_dir} has no cached {', '.join(missing)} response; fetch it once with "
+                                f"osmnx (ox.settings.use_cache = True) before building offline")
+    responses['sha256'] = digest.hexdigest()
+    return responses
+
+# Function to get the place boundary the way osmnx geocodes it: the first polygon result of the lookup
+# that asked for the most results
+def place_polygon(places):
+    for result in max(places, key=len):
+        if result.get('geojson', {}).get('type') in ('Polygon', 'MultiPolygon'):
+            return shape(result['geojson'])
+    raise ValueError(f"No cached Nominatim result for {PLACE_NAME} has a polygon")
+
+def great_circle(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_METERS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+# Function to turn the Overpass drive response into an unsimplified MultiDiGraph, one edge per way segment.
+# One-way streets (and roundabouts) get one direction, everything else both.
+def _create_graph(response):
+    elements = response['elements']
+    points = {element['id']: element for element in elements if element['type'] == 'node'}
+    G = nx.MultiDiGraph(crs='epsg:4326')
+    for way in (element for element in elements if element['type'] == 'way'):
+        tags = way.get('tags', {})
+        way_nodes = [node for i, node in enumerate(way['nodes']) if i == 0 or node != way['nodes'][i - 1]]
+        oneway = tags.get('oneway') in ONEWAY_VALUES or tags.get('junction') == 'roundabout'
+        if tags.get('oneway') in REVERSED_VALUES:
+            way_nodes = way_nodes[::-1]
+        data = {key: tags[key] for key in USEFUL_TAGS_WAY if key in tags}
+        data['oneway'] = oneway
+        for node in way_nodes:
+            if node not in G:
+                point = points[node]
+                G.add_node(node, y=point['lat'], x=point['lon'],
+                           **{key: point['tags'][key] for key in USEFUL_TAGS_NODE if key in point.get('tags', {})})
+        for u, v in zip(way_nodes, way_nodes[1:]):
+            G.add_edge(u, v, osmid=way['id'], reversed=False, **data)
+            if not oneway:
+                G.add_edge(v, u, osmid=way['id'], reversed=True, **data)
+
+    # Great-circle segment lengths in meters
+    edges = list(G.edges(keys=True))
+    y = np.array([G.nodes[node]['y'] for node in G])
+    x = np.array([G.nodes[node]['x'] for node in G])
+    position = {node: i for i, node in enumerate(G)}
+    u = np.array([position[edge[0]] for edge in edges])
+    v = np.array([position[edge[1]] for edge in edges])
+    lengths = np.round(great_circle(y[u], x[u], y[v], x[v]), 3)
+    nx.set_edge_attributes(G, dict(zip(edges, lengths.tolist())), 'length')
+    return G
+
+# osmnx's endpoint rule (non-strict): a node stays in the simplified graph unless it only links two
+# neighbours, one way through or both ways. This reproduces the paths of the original network files.
+def _is_endpoint(G, node):
+    neighbors = set(G.predecessors(node)) | set(G.successors(node))
+    if node in neighbors or G.out_degree(node) == 0 or G.in_degree(node) == 0:
+        return True
+    return not (len(neighbors) == 2 and G.degree(node) in (2, 4))
+
+# Function to follow the interstitial nodes from an endpoint to the next endpoint
+def _build_path(G, endpoint, successor, endpoints):
+    path = [endpoint, successor]
+    while successor not in endpoints:
+        successors = [node for node in G.successors(successor) if node not in path]
+        if len(successors) == 1:
+            successor = successors[0]
+            path.append(successor)
+        elif endpoint in G.successors(successor):
+            # A loop that comes back to where it started
+            path.append(endpoint)
+            break
+        else:
+            raise ValueError(f"Unexpected simplify pattern at node {successor}")
+    return path
+
+# Function to merge every chain of interstitial nodes into one edge between endpoints: lengths add up,
+# the node coordinates become its geometry, and differing tags become lists (as osmnx simplify_graph)
+def simplify_graph(G):
+    endpoints = {node for node in G if _is_endpoint(G, node)}
+    paths = [_build_path(G, endpoint, successor, endpoints)
+             for endpoint in endpoints for successor in G.successors(endpoint) if successor not in endpoints]
+
+    removed = set()
+    new_edges = []
+    for path in paths:
+        merged = {}
+        for u, v in zip(path, path[1:]):
+            data = G.edges[u, v, 0]
+            for key, value in data.items():
+                merged.setdefault(key, []).append(value)
+        attributes = {}
+        for key, values in merged.items():
+            if key == 'length':
+                attributes[key] = round(sum(values), 3)
+            else:
+                unique = list(dict.fromkeys(values))
+                attributes[key] = unique[0] if len(unique) == 1 else unique
+        attributes['geometry'] = LineString([(G.nodes[node]['x'], G.nodes[node]['y']) for node in path])
+        new_edges.append((path[0], path[-1], attributes))
+        removed.update(path[1:-1])
+
+    G = G.copy()
+    G.remove_nodes_from(removed)
+    G.add_edges_from(new_edges)
+    return G
+
+# Function to build the drive network like ox.graph_from_place(PLACE_NAME, network_type='drive'), from the
+# cached responses only: simplified, truncated to the place polygon, largest connected component kept
+def build_drive_graph(response, polygon):
+    G = simplify_graph(_create_graph(response))
+    nodes = list(G)
+    inside = shapely.contains_xy(polygon, [G.nodes[node]['x'] for node in nodes], [G.nodes[node]['y'] for node in nodes])
+    G.remove_nodes_from([node for node, keep in zip(nodes, inside) if not keep])
+    G = G.subgraph(max(nx.weakly_connected_components(G), key=len)).copy()
+    for node in G:
+        neighbors = set(G.predecessors(node)) | set(G.successors(node))
+        G.nodes[node]['street_count'] = len(neighbors) + (1 if node in neighbors else 0)
+    return G
+
+# Function to build the land use features like ox.geometries_from_place(PLACE_NAME, tags={'landuse': True}):
+# closed ways become polygons, multipolygon relations are assembled from their member ways, and only
+# features touching the place polygon are kept. Returns (element_type, osmid, tags, geometry) tuples.
+def build_land_use(response, polygon):
+    elements = response['elements']
+    points = {element['id']: (element['lon'], element['lat']) for element in elements if element['type'] == 'node'}
+    way_coords = {element['id']: [points[node] for node in element['nodes'] if node in points]
+                  for element in elements if element['type'] == 'way'}
+
+    features = []
+    for element in elements:
+        tags = element.get('tags', {})
+        if 'landuse' not in tags:
+            continue
+        if element['type'] == 'way':
+            coords = way_coords[element['id']]
+            if len(coords) >= 4 and element['nodes'][0] == element['nodes'][-1]:
+                geometry = Polygon(coords)
+            elif len(coords) >= 2:
+                geometry = LineString(coords)
+            else:
+                continue
+        elif element['type'] == 'relation':
+            rings = {'outer': [], 'inner': []}
+            for member in element.get('members', []):
+                coords = way_coords.get(member['ref'], []) if member['type'] == 'way' else []
+                if len(coords) >= 2:
+                    rings['inner' if member.get('role') == 'inner' else 'outer'].append(LineString(coords))
+            outer = unary_union(list(polygonize(unary_union(rings['outer']))))
+            if outer.is_empty:
+                continue
+            inner = unary_union(list(polygonize(unary_union(rings['inner'])))) if rings['inner'] else None
+            geometry = outer.difference(inner) if inner is not None and not inner.is_empty else outer
+        else:
+            continue
+        if not geometry.is_valid:
+            geometry = geometry.buffer(0)
+        if geometry.intersects(polygon):
+            features.append((element['type'], element['id'], tags, geometry))
+    return features
+
+# Function to write a drive graph as GraphML the way ox.save_graphml does (every attribute as a string),
+# so nx.read_graphml, ox.load_graphml and the graph snapshots all read it
+def save_graphml(G, graphml_path):
+    H = nx.MultiDiGraph(**{key: str(value) for key, value in G.graph.items()})
+    for node, data in G.nodes(data=True):
+        H.add_node(str(node), **{key: str(value) for key, value in data.items()})
+    for u, v, key, data in G.edges(keys=True, data=True):
+        H.add_edge(str(u), str(v), key=key,
+                   **{name: value.wkt if name == 'geometry' else str(value) for name, value in data.items()})
+    tmp_path = f'{graphml_path}.tmp-{os.getpid()}'
+    nx.write_graphml(H, tmp_path)
+    os.replace(tmp_path, graphml_path)
+
+# Land use layer stored next to the road network: per-feature arrays plus the geometries as WKB
+class LandUseLayer:
+    def __init__(self, land_use_dir, meta, arrays):
+        self.land_use_dir = land_use_dir
+        self.meta = meta
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    @classmethod
+    def open(cls, land_use_dir):
+        with open(os.path.join(land_use_dir, 'meta.json')) as file:
+            meta = json.load(file)
+        arrays = {name: np.load(os.path.join(land_use_dir, f'{name}.npy'), mmap_mode='r') for name in LAND_USE_ARRAYS}
+        return cls(land_use_dir, meta, arrays)
+
+    @classmethod
+    def save(cls, features, land_use_dir, meta):
+        blobs = [geometry.wkb for _, _, _, geometry in features]
+        arrays = {
+            'element_type': np.array([element_type for element_type, _, _, _ in features], dtype=str),
+            'osmid': np.array([osmid for _, osmid, _, _ in features], dtype=np.int64),
+            'landuse': np.array([tags['landuse'] for _, _, tags, _ in features], dtype=str),
+            'name': np.array([tags.get('name', '') for _, _, tags, _ in features], dtype=str),
+            'geometry_offsets': np.concatenate([[0], np.cumsum([len(blob) for blob in blobs])]).astype(np.int64),
+            'geometry_wkb': np.frombuffer(b''.join(blobs), dtype=np.uint8),
+        }
+        tmp_dir = f'{land_use_dir}.tmp-{os.getpid()}'
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), array)
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=2)
+        if os.path.isdir(land_use_dir):
+            shutil.rmtree(land_use_dir)
+        os.replace(tmp_dir, land_use_dir)
+        return cls.open(land_use_dir)
+
+    def __len__(self):
+        return len(self.osmid)
+
+    # Shapely geometries of every feature
+    def geometries(self):
+        offsets, data = self.geometry_offsets, self.geometry_wkb
+        return shapely.from_wkb([data[offsets[i]:offsets[i + 1]].tobytes() for i in range(len(self))])
+
+    # The layer as a GeoDataFrame shaped like ox.geometries_from_place's (element_type, osmid) index
+    def to_geodataframe(self):
+        import geopandas as gpd
+        import pandas as pd
+        index = pd.MultiIndex.from_arrays([self.element_type, self.osmid], names=['element_type', 'osmid'])
+        return gpd.GeoDataFrame({'landuse': self.landuse, 'name': np.where(self.name == '', None, self.name)},
+                                geometry=self.geometries(), index=index, crs='EPSG:4326')
+
+# Function to make sure the shared road network is built from the cached responses: the drive network as
+# ROAD_NETWORK_GRAPHML (plus its memory-mapped snapshot) and the land use layer next to it. Nothing is
+# rebuilt while the builder version and the cached responses are unchanged. Returns the graph snapshot.
+def publish_road_network(cache_dir=CACHE_DIR, graphml_path=ROAD_NETWORK_GRAPHML, land_use_dir=None):
+    land_use_dir = land_use_dir or land_use_dir_for(graphml_path)
+    responses = read_cached_responses(cache_dir)
+    version = f'{ROAD_NETWORK_VERSION}-{responses["sha256"][:16]}'
+    meta_path = os.path.join(land_use_dir, 'meta.json')
+    if os.path.exists(meta_path) and os.path.exists(graphml_path):
+        with open(meta_path) as file:
+            meta = json.load(file)
+        if meta.get('format_version') == LAND_USE_FORMAT_VERSION and meta.get('road_network_version') == version:
+            return load_snapshot(graphml_path)
+
+    print(f"Building road network {version} for {PLACE_NAME} from {cache_dir}...")
+    polygon = place_polygon(responses['places'])
+    G = build_drive_graph(responses['drive'], polygon)
+    G.graph['road_network_version'] = version
+    save_graphml(G, graphml_path)
+    LandUseLayer.save(build_land_use(responses['land_use'], polygon), land_use_dir, {
+        'format_version': LAND_USE_FORMAT_VERSION,
+        'road_network_version': version,
+        'place': PLACE_NAME,
+    })
+    return load_snapshot(graphml_path)
+
+# Function to open the land use layer of the shared road network, building it first if needed
+def load_land_use(cache_dir=CACHE_DIR, graphml_path=ROAD_NETWORK_GRAPHML):
+    publish_road_network(cache_dir, graphml_path)
+    return LandUseLayer.open(land_use_dir_for(graphml_path))
@@ -0,0 +1,406 @@
+import time
+import numpy as np
+
+# Groups with more stops than this fall back to the nearest neighbor heuristic
+MAX_EXACT_STOPS = 15
+# Shortest path trees kept in a tree cache before the least recently used one is dropped
+MAX_CACHED_TREES = 256
+
+# Function to get the shortest path trees (distances, predecessors) from each stop, as rows indexed by
+# node index. Pass an OrderedDict as `tree_cache` to reuse trees across groups that share stops.
+def get_shortest_path_trees(engine, stops, tree_cache=None, max_cached_trees=MAX_CACHED_TREES):
+    trees = {}
+    missing = []
+    for stop in dict.fromkeys(stops):
+        if tree_cache is not None and stop in tree_cache:
+            tree_cache.move_to_end(stop)
+            trees[stop] = tree_cache[stop]
+        else:
+            missing.append(stop)
+
+    # All uncached stops go to the engine in one multi-source call
+    if missing:
+        distances, predecessors = engine.shortest_path_trees(missing)
+        for stop, distance_row, predecessor_row in zip(missing, distances, predecessors):
+            trees[stop] = (distance_row, predecessor_row)
+            if tree_cache is not None:
+                tree_cache[stop] = trees[stop]
+                if len(tree_cache) > max_cached_trees:
+                    tree_cache.popitem(last=False)
+    return trees
+
+# Function to build a stop-by-stop distance matrix, running one single-source search per stop
+# (or one hierarchy many-to-many query when the engine has a contraction hierarchy).
+# Row/column i of the matrix is stops[i]; the predecessor rows are keyed by stop node.
+# With a day's OD matrix or a PathCache holding every stop pair, a group needs no search at all (and no
+# predecessor rows).
+def build_distance_matrix(engine, stops, tree_cache=None, path_cache=None):
+    unique_stops = list(dict.fromkeys(stops))
+    od_matrix = engine.od_matrix_for(unique_stops)
+    if od_matrix is not None:
+        return od_matrix.many_to_many(stops, stops), {}
+    if path_cache is not None:
+        cached = path_cache.get_distances(unique_stops)
+        if len(cached) == len(unique_stops) * (len(unique_stops) - 1):
+            matrix = np.array([[0.0 if source == target else cached[(source, target)] for target in stops]
+                               for source in stops], dtype=float).reshape(len(stops), len(stops))
+            return matrix, {}
+
+    if engine.uses_hierarchy():
+        # The contraction hierarchy answers the matrix directly; legs are unpacked later by engine.path
+        unique_matrix = engine.many_to_many(unique_stops, unique_stops)
+        position = {stop: i for i, stop in enumerate(unique_stops)}
+        stop_position = [position[stop] for stop in stops]
+        matrix = unique_matrix[np.ix_(stop_position, stop_position)].astype(float)
+        predecessors = {}
+        distance_rows = {source: unique_matrix[i] for i, source in enumerate(unique_stops)}
+        unique_index = range(len(unique_stops))
+    else:
+        trees = get_shortest_path_trees(engine, stops, tree_cache)
+        stop_index = engine.index(stops)
+        matrix = np.array([trees[stop][0][stop_index] for stop in stops], dtype=float).reshape(len(stops), len(stops))
+        predecessors = {stop: tree[1] for stop, tree in trees.items()}
+        distance_rows = {source: trees[source][0] for source in unique_stops}
+        unique_index = engine.index(unique_stops)
+    if path_cache is not None:
+        path_cache.put_distances({(source, target): distance_rows[source][target_index]
+                                  for source in unique_stops
+                                  for target, target_index in zip(unique_stops, unique_index) if source != target})
+    return matrix, predecessors
+
+# Function to calculate total path length of an order of matrix positions
+def calculate_order_length(matrix, order):
+    return float(sum(matrix[order[i], order[i + 1]] for i in range(len(order) - 1)))
+
+# Function to get the full path including all intermediate nodes from the stored predecessor rows.
+# Legs without a predecessor row come from the PathCache, or from a fresh search that is then cached.
+def get_full_path(engine, predecessors, path, path_cache=None):
+    full_path = []
+    for i in range(len(path) - 1):
+        source, target = path[i], path[i + 1]
+        if source == target:
+            part_path = [source]
+        elif source in predecessors:
+            part_path = engine.walk_path(predecessors[source], source, target)
+        else:
+            part_path = path_cache.get_path(source, target) if path_cache is not None else None
+            if part_path is None:
+                part_path = engine.path(source, target)
+                if path_cache is not None:
+                    path_cache.put_path(source, target, engine.path_weight(part_path), part_path)
+        full_path.extend(part_path if not full_path else part_path[1:])
+    return full_path
+
+# Exact Held-Karp dynamic program over bitmasks of visited stops.
+# The depot is position 0 of the matrix and the path starts there; the path is open at the other end.
+def held_karp_order(matrix):
+    matrix = np.asarray(matrix, dtype=float)
+    n = len(matrix) - 1
+    if n <= 0:
+        return [0], 0.0
+
+    full = 1 << n
+    stop_matrix = matrix[1:, 1:]
+    # cost[mask, j] is the shortest path from the depot visiting exactly `mask` and ending at stop j
+    cost = np.full((full, n), np.inf)
+    parent = np.full((full, n), -1, dtype=np.int8)
+    for j in range(n):
+        cost[1 << j, j] = matrix[0, j + 1]
+
+    masks = np.arange(full)
+    popcount = np.zeros(full, dtype=np.int8)
+    for j in range(n):
+        popcount += (masks >> j) & 1
+
+    # Solve one layer of equal-sized subsets at a time so each step is a single vectorized min
+    for size in range(2, n + 1):
+        layer = masks[popcount == size]
+        for j in range(n):
+            with_j = layer[((layer >> j) & 1) == 1]
+            candidates = cost[with_j ^ (1 << j)] + stop_matrix[:, j]
+            best = candidates.argmin(axis=1)
+            cost[with_j, j] = candidates[np.arange(len(with_j)), best]
+            parent[with_j, j] = best
+
+    last = int(cost[full - 1].argmin())
+    total = float(cost[full - 1, last])
+
+    # Walk the parent table back to the depot
+    order = []
+    mask = full - 1
+    j = last
+    while j >= 0:
+        order.append(j + 1)
+        previous = int(parent[mask, j])
+        mask ^= 1 << j
+        j = previous
+    order.append(0)
+    order.reverse()
+    return order, total
+
+# Greedy fallback for groups too large for the exact solver
+def nearest_neighbor_order(matrix):
+    matrix = np.asarray(matrix, dtype=float)
+    unvisited = set(range(1, len(matrix)))
+    order = [0]
+    while unvisited:
+        current = order[-1]
+        next_stop = min(unvisited, key=lambda stop: matrix[current, stop])
+        order.append(next_stop)
+        unvisited.remove(next_stop)
+    return order, calculate_order_length(matrix, order)
+
+# Function to find the best visiting order with the depot (position 0) fixed at the start or the end.
+# Returns the order as matrix positions together with its total length.
+def solve_fixed_depot_order(matrix, depot='start', max_exact_stops=MAX_EXACT_STOPS):
+    matrix = np.asarray(matrix, dtype=float)
+    if depot == 'end':
+        # Ending at the depot is the same problem as starting there on the reversed legs
+        matrix = matrix.T
+    elif depot != 'start':
+        raise ValueError(f"depot must be 'start' or 'end', got {depot!r}")
+
+    if len(matrix) - 1 <= max_exact_stops:
+        order, total = held_karp_order(matrix)
+    else:
+        order, total = nearest_neighbor_order(matrix)
+
+    if depot == 'end':
+        order = order[::-1]
+    return order, total
+
+# Exact dial-a-ride solver: dynamic program over (visited events, last event) states.
+# Positions 0..n-1 of the matrix are the riders' pickups and n..2n-1 their drop-offs in the same rider order.
+# A drop-off can only follow its own pickup, and at most `capacity` riders are on board at once.
+def solve_pickup_dropoff_order(matrix, capacity=None):
+    matrix = np.asarray(matrix, dtype=float)
+    n = len(matrix) // 2
+    if n == 0:
+        return [], 0.0
+    if capacity is None:
+        capacity = n
+    if capacity < 1:
+        raise ValueError(f"capacity must be at least 1, got {capacity}")
+
+    events = 2 * n
+    full = (1 << events) - 1
+    pickup_bits = (1 << n) - 1
+    cost = np.full((full + 1, events), np.inf)
+    parent = np.full((full + 1, events), -1, dtype=np.int8)
+    for i in range(n):
+        cost[1 << i, i] = 0.0
+
+    # Every successor state has a larger mask, so one forward pass in numeric order settles all states
+    for mask in range(1, full):
+        picked = mask & pickup_bits
+        dropped = mask >> n
+        if dropped & ~picked:
+            continue
+        onboard = bin(picked & ~dropped).count('1')
+        for last in range(events):
+            current = cost[mask, last]
+            if current == np.inf:
+                continue
+            for rider in range(n):
+                if not picked >> rider & 1:
+                    if onboard >= capacity:
+                        continue
+                    event = rider
+                elif not dropped >> rider & 1:
+                    event = n + rider
+                else:
+                    continue
+                next_mask = mask | (1 << event)
+                candidate = current + matrix[last, event]
+                if candidate < cost[next_mask, event]:
+                    cost[next_mask, event] = candidate
+                    parent[next_mask, event] = last
+
+    last = int(cost[full].argmin())
+    total = float(cost[full, last])
+
+    order = []
+    mask = full
+    while last >= 0:
+        order.append(last)
+        previous = int(parent[mask, last])
+        mask ^= 1 << last
+        last = previous
+    order.reverse()
+    return order, total
+
+# Function to check that every pickup comes before its drop-off and the vehicle is never over capacity
+def is_feasible_order(order, pairs, capacity=None):
+    position = {event: i for i, event in enumerate(order)}
+    for pickup, dropoff in pairs:
+        if position[pickup] > position[dropoff]:
+            return False
+    if capacity is not None:
+        pickups = {pickup for pickup, _ in pairs}
+        dropoffs = {dropoff for _, dropoff in pairs}
+        onboard = 0
+        for event in order:
+            if event in pickups:
+                onboard += 1
+                if onboard > capacity:
+                    return False
+            elif event in dropoffs:
+                onboard -= 1
+    return True
+
+# Greedy construction: from `start`, repeatedly go to the closest stop that keeps the order feasible
+def nearest_neighbor_pickup_dropoff_order(matrix, pairs, start, capacity=None):
+    dropoff_of = dict(pairs)
+    waiting = set(dropoff_of) - {start}
+    onboard = {start} if start in dropoff_of else set()
+    order = [start]
+    while waiting or onboard:
+        candidates = [dropoff_of[pickup] for pickup in onboard]
+        if capacity is None or len(onboard) < capacity:
+            candidates.extend(waiting)
+        next_stop = min(candidates, key=lambda stop: matrix[order[-1], stop])
+        if next_stop in waiting:
+            waiting.remove(next_stop)
+            onboard.add(next_stop)
+        else:
+            onboard.remove(next((pickup for pickup in onboard if dropoff_of[pickup] == next_stop)))
+        order.append(next_stop)
+    return order
+
+# Length of the leg a -> b of an open path, where None marks the missing leg before the start or after the end
+def _leg(matrix, a, b):
+    if a is None or b is None:
+        return 0.0
+    return matrix[a, b]
+
+# One first-improvement 2-opt pass: reverse order[i..j] when that shortens the path.
+# The delta only looks at the two boundary legs, which assumes symmetric legs (undirected graph).
+def two_opt_pass(matrix, order, pairs, capacity=None, fixed_first=False):
+    n = len(order)
+    for i in range(1 if fixed_first else 0, n - 1):
+        before = order[i - 1] if i > 0 else None
+        for j in range(i + 1, n):
+            after = order[j + 1] if j + 1 < n else None
+            delta = (_leg(matrix, before, order[j]) + _leg(matrix, order[i], after)
+                     - _leg(matrix, before, order[i]) - _leg(matrix, order[j], after))
+            if delta < -1e-9:
+                candidate = order[:i] + order[i:j + 1][::-1] + order[j + 1:]
+                if is_feasible_order(candidate, pairs, capacity):
+                    return candidate, delta
+    return order, 0.0
+
+# One first-improvement Or-opt pass: move a segment of up to `max_segment` stops to a better position
+def or_opt_pass(matrix, order, pairs, capacity=None, fixed_first=False, max_segment=3):
+    n = len(order)
+    first = 1 if fixed_first else 0
+    for length in range(1, max_segment + 1):
+        for i in range(first, n - length + 1):
+            segment = order[i:i + length]
+            before = order[i - 1] if i > 0 else None
+            after = order[i + length] if i + length < n else None
+            removal_gain = (_leg(matrix, before, segment[0]) + _leg(matrix, segment[-1], after)
+                            - _leg(matrix, before, after))
+            rest = order[:i] + order[i + length:]
+            # Insert the segment between rest[k - 1] and rest[k]
+            for k in range(first, len(rest) + 1):
+                if k == i:
+                    continue
+                x = rest[k - 1] if k > 0 else None
+                y = rest[k] if k < len(rest) else None
+                insertion_cost = (_leg(matrix, x, segment[0]) + _leg(matrix, segment[-1], y)
+                                  - _leg(matrix, x, y))
+                delta = insertion_cost - removal_gain
+                if delta < -1e-9:
+                    candidate = rest[:k] + segment + rest[k:]
+                    if is_feasible_order(candidate, pairs, capacity):
+                        return candidate, delta
+    return order, 0.0
+
+# Function to refine an order with 2-opt and Or-opt moves until neither improves it or the budget runs out.
+# Returns the refined order and how much each stage shortened it.
+def improve_order(matrix, order, pairs, capacity=None, fixed_first=False, max_iterations=1000, time_budget=None):
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    gains = {'two_opt': 0.0, 'or_opt': 0.0}
+    for _ in range(max_iterations):
+        if deadline is not None and time.perf_counter() > deadline:
+            break
+        order, delta = two_opt_pass(matrix, order, pairs, capacity, fixed_first)
+        if delta < 0:
+            gains['two_opt'] -= delta
+            continue
+        order, delta = or_opt_pass(matrix, order, pairs, capacity, fixed_first)
+        if delta < 0:
+            gains['or_opt'] -= delta
+            continue
+        break
+    return order, gains
+
+# Heuristic dial-a-ride pipeline: nearest neighbor from each start in `starts`, then local search on the best.
+# Pass a single depot position with fixed_first=True to pin the tour start.
+# Returns the order, its length and the length after each stage.
+def solve_pickup_dropoff_heuristic(matrix, pairs, starts, capacity=None, fixed_first=False,
+                                   max_iterations=1000, time_budget=None):
+    matrix = np.asarray(matrix, dtype=float)
+    order = min((nearest_neighbor_pickup_dropoff_order(matrix, pairs, start, capacity) for start in starts),
+                key=lambda candidate: calculate_order_length(matrix, candidate))
+    nearest_neighbor_length = calculate_order_length(matrix, order)
+    order, gains = improve_order(matrix, order, pairs, capacity, fixed_first, max_iterations, time_budget)
+    total = calculate_order_length(matrix, order)
+    stages = {
+        'nearest_neighbor': nearest_neighbor_length,
+        'two_opt': nearest_neighbor_length - gains['two_opt'],
+        'or_opt': total
+    }
+    return order, total, stages
+
+# Per-group solvers. Each takes the engine plus one group's stops and returns a dict with the
+# 'optimal_order', 'full_path' and 'total_distance', so groups can be solved in any process (see ParallelSolver).
+
+# School runs: order the stops with the school (stops[0]) fixed at the start or the end
+def solve_fixed_depot_group(engine, stops, depot, tree_cache=None, path_cache=None, max_exact_stops=MAX_EXACT_STOPS):
+    distance_matrix, predecessors = build_distance_matrix(engine, stops, tree_cache, path_cache)
+    order, total_distance = solve_fixed_depot_order(distance_matrix, depot=depot, max_exact_stops=max_exact_stops)
+    optimal_order = [stops[i] for i in order]
+    return {
+        'optimal_order': optimal_order,
+        'full_path': get_full_path(engine, predecessors, optimal_order, path_cache),
+        'total_distance': total_distance
+    }
+
+# Shared rides solved exactly: pickups[i] and dropoffs[i] belong to the same rider
+def solve_pickup_dropoff_group(engine, pickups, dropoffs, capacity=None, tree_cache=None, path_cache=None):
+    stops = list(pickups) + list(dropoffs)
+    distance_matrix, predecessors = build_distance_matrix(engine, stops, tree_cache, path_cache)
+    order, total_distance = solve_pickup_dropoff_order(distance_matrix, capacity=capacity)
+    if not order:
+        return None
+    optimal_order = [stops[i] for i in order]
+    return {
+        'optimal_order': optimal_order,
+        'full_path': get_full_path(engine, predecessors, optimal_order, path_cache),
+        'total_distance': total_distance
+    }
+
+# Shared rides solved with the nearest neighbor + 2-opt / Or-opt pipeline. Tours start at a pickup,
+# or at depot_node when one is given. Also returns the tour length after each stage under 'stages'.
+def solve_pickup_dropoff_group_heuristic(engine, pickups, dropoffs, capacity=None, depot_node=None,
+                                         max_iterations=1000, time_budget=None, tree_cache=None, path_cache=None):
+    stops = list(pickups) + list(dropoffs)
+    pairs = [(i, len(pickups) + i) for i in range(len(pickups))]
+    if depot_node is not None:
+        stops.append(depot_node)
+        starts = [len(stops) - 1]
+    else:
+        starts = range(len(pickups))
+
+    distance_matrix, predecessors = build_distance_matrix(engine, stops, tree_cache, path_cache)
+    order, total_distance, stages = solve_pickup_dropoff_heuristic(
+        distance_matrix, pairs, starts, capacity=capacity, fixed_first=depot_node is not None,
+        max_iterations=max_iterations, time_budget=time_budget)
+    optimal_order = [stops[i] for i in order]
+    return {
+        'optimal_order': optimal_order,
+        'full_path': get_full_path(engine, predecessors, optimal_order, path_cache),
+        'total_distance': total_distance,
+        'stages': stages
+    }
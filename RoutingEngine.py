@@ -0,0 +1,231 @@
+import numpy as np
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+# Predecessor value scipy uses for "no predecessor"
+NO_PREDECESSOR = -9999
+
+# Compiled road network: CSR adjacency with int32 node indices and float64 edge lengths (as in the GraphML,
+# so lengths written to the trip details match the source data).
+# Node ids stay strings (as read from GraphML) and are mapped to indices once at load time.
+# graph_hash identifies the source graph (set when loaded from a snapshot) for caches built on top of it.
+# Searches minimise edge length unless set_weights() loads other edge weights (e.g. travel seconds).
+class RoutingEngine:
+    def __init__(self, node_ids, x, y, indptr, indices, lengths, graph_hash=None):
+        self.source_hash = graph_hash
+        self.graph_hash = graph_hash
+        self.weight_key = None
+        self.node_ids = np.asarray(node_ids)
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.asarray(y, dtype=np.float64)
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.lengths = np.asarray(lengths, dtype=np.float64)
+        self.node_index = {node: i for i, node in enumerate(self.node_ids.tolist())}
+        n = len(self.node_ids)
+        self.graph = csr_matrix((self.lengths.copy(), self.indices, self.indptr), shape=(n, n))
+        self._edge_keys = None
+        # Optional landmark A* index for single pairs (Landmarks.LandmarkIndex), used while it matches graph_hash;
+        # it may return None for a query, which then falls back to Dijkstra
+        self.landmarks = None
+        # Optional ContractionHierarchy backend for distance / path / matrix queries, used while it matches graph_hash
+        self.hierarchy = None
+        # Optional DestinationTrees.DestinationTrees: precomputed trees from the fixed destinations, used while
+        # they match graph_hash; legs that start or end at one of those nodes need no search
+        self.destination_trees = None
+        # Optional ODMatrix.ODMatrix list (one per day) of precomputed stop-to-stop distances, used while they match graph_hash
+        self.od_matrices = []
+
+    # Build the engine from a networkx graph; undirected graphs get both directions of every edge
+    @classmethod
+    def from_graph(cls, G, directed=False):
+        node_ids = list(G.nodes())
+        node_index = {node: i for i, node in enumerate(node_ids)}
+        x = np.array([float(G.nodes[node].get('x', np.nan)) for node in node_ids])
+        y = np.array([float(G.nodes[node].get('y', np.nan)) for node in node_ids])
+
+        edges = np.array([(node_index[u], node_index[v], float(data.get('length', 1)))
+                          for u, v, data in G.edges(data=True)], dtype=np.float64).reshape(-1, 3)
+        u = edges[:, 0].astype(np.int32)
+        v = edges[:, 1].astype(np.int32)
+        length = edges[:, 2]
+        if not directed:
+            u, v = np.concatenate([u, v]), np.concatenate([v, u])
+            length = np.concatenate([length, length])
+
+        # Keep only the shortest of any parallel edges; self loops never shorten a route
+        keep = u != v
+        u, v, length = u[keep], v[keep], length[keep]
+        order = np.lexsort((length, v, u))
+        u, v, length = u[order], v[order], length[order]
+        first = np.ones(len(u), dtype=bool)
+        first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        u, v, length = u[first], v[first], length[first]
+
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int32)
+        np.cumsum(np.bincount(u, minlength=len(node_ids)), out=indptr[1:])
+        return cls(node_ids, x, y, indptr, v, length)
+
+    # Load the engine from a GraphML road network such as Midland_road_network.graphml
+    @classmethod
+    def from_graphml(cls, path, directed=False):
+        return cls.from_graph(nx.read_graphml(path), directed=directed)
+
+    # Function to map node ids to int32 indices
+    def index(self, nodes):
+        return np.array([self.node_index[node] for node in nodes], dtype=np.int32)
+
+    # Full shortest path trees from each source: distances (k, N) and predecessors (k, N) indexed by node index.
+    # Sources that are fixed destinations take their precomputed trees; only the rest are searched.
+    def shortest_path_trees(self, sources):
+        trees = self._destination_trees()
+        stored = [] if trees is None else [source for source in sources if source in trees.position]
+        if not stored:
+            distances, predecessors = dijkstra(self.graph, directed=True, indices=self.index(sources),
+                                               return_predecessors=True)
+            return distances, predecessors
+        distances = np.empty((len(sources), len(self.node_ids)))
+        predecessors = np.empty((len(sources), len(self.node_ids)), dtype=np.int32)
+        searched = [i for i, source in enumerate(sources) if source not in trees.position]
+        if searched:
+            distances[searched], predecessors[searched] = dijkstra(
+                self.graph, directed=True, indices=self.index([sources[i] for i in searched]), return_predecessors=True)
+        for i, source in enumerate(sources):
+            if source in trees.position:
+                distances[i], predecessors[i] = trees.tree(source)
+        return distances, predecessors
+
+    def _destination_trees(self):
+        if self.destination_trees is not None and self.destination_trees.graph_hash == self.graph_hash:
+            return self.destination_trees
+        return None
+
+    # The OD matrix holding every one of `nodes`, or None if no current matrix does
+    def od_matrix_for(self, nodes):
+        for od_matrix in self.od_matrices:
+            if od_matrix.graph_hash == self.graph_hash and od_matrix.covers(nodes):
+                return od_matrix
+        return None
+
+    def _point_to_point(self):
+        if self.landmarks is not None and self.landmarks.graph_hash == self.graph_hash:
+            return self.landmarks
+        return None
+
+    # Whether distance queries are answered by the contraction hierarchy instead of Dijkstra trees
+    def uses_hierarchy(self):
+        return self.hierarchy is not None and self.hierarchy.graph_hash == self.graph_hash
+
+    # Single-pair shortest path length
+    def distance(self, source, target):
+        if self._destination_trees() is not None:
+            distance = self.destination_trees.distance(source, target)
+            if distance is not None:
+                return distance
+        if self.uses_hierarchy():
+            return self.hierarchy.distance(source, target)
+        if self._point_to_point() is not None:
+            distance = self.landmarks.distance(source, target)
+            if distance is not None:
+                return float(distance)
+        return float(self.one_to_many(source, [target])[0])
+
+    # Single-pair shortest path as a list of node ids
+    def path(self, source, target):
+        if self._destination_trees() is not None:
+            path = self.destination_trees.path(source, target)
+            if path is not None:
+                return path
+        if self.uses_hierarchy():
+            return self.hierarchy.path(source, target)
+        if self._point_to_point() is not None:
+            path = self.landmarks.path(source, target)
+            if path is not None:
+                return path
+        _, predecessors = self.shortest_path_trees([source])
+        return self.walk_path(predecessors[0], source, target)
+
+    # Shortest path lengths from one source to every target
+    def one_to_many(self, source, targets):
+        if self.uses_hierarchy():
+            return self.hierarchy.one_to_many(source, targets)
+        distances = dijkstra(self.graph, directed=True, indices=self.node_index[source])
+        return distances[self.index(targets)]
+
+    # Shortest path length matrix with one row per source and one column per target
+    def many_to_many(self, sources, targets):
+        if self.uses_hierarchy():
+            return self.hierarchy.many_to_many(sources, targets)
+        distances, _ = self.shortest_path_trees(sources)
+        return distances[:, self.index(targets)]
+
+    # Function to rebuild the node path source -> target from a predecessor row rooted at source
+    def walk_path(self, predecessor_row, source, target):
+        source_index = self.node_index[source]
+        current = self.node_index[target]
+        path = [current]
+        while current != source_index:
+            current = predecessor_row[current]
+            if current == NO_PREDECESSOR:
+                raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+            path.append(current)
+        return self.node_ids[path[::-1]].tolist()
+
+    # Length of the direct edge u -> v (0 when u and v are the same node)
+    def edge_length(self, u, v):
+        u_index = self.node_index[u]
+        v_index = self.node_index[v]
+        if u_index == v_index:
+            return 0.0
+        start, end = self.indptr[u_index], self.indptr[u_index + 1]
+        hits = np.nonzero(self.indices[start:end] == v_index)[0]
+        if len(hits) == 0:
+            raise KeyError(f"No edge between {u} and {v}.")
+        return float(self.lengths[start + hits[0]])
+
+    # Function to replace the search weights, aligned with the CSR edges, in place (no graph rebuild).
+    # weight_key names the weighting; it is folded into graph_hash so caches keep weightings apart.
+    # Passing None for both goes back to edge lengths.
+    def set_weights(self, weights, weight_key):
+        if weights is None:
+            self.graph.data[:] = self.lengths
+            weight_key = None
+        else:
+            self.graph.data[:] = weights
+        self.weight_key = weight_key
+        if weight_key is None or self.source_hash is None:
+            self.graph_hash = self.source_hash
+        else:
+            self.graph_hash = f'{self.source_hash}:{weight_key}'
+
+    # Function to find the CSR positions of many edges at once, given int node index arrays.
+    # Each row's neighbours are sorted by index (see from_graph), so u * N + v is sorted over the whole
+    # CSR and every edge is found with a single searchsorted. Returns (positions, source == target).
+    def edge_positions(self, sources, targets):
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        n = len(self.node_ids)
+        if self._edge_keys is None:
+            rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(self.indptr))
+            self._edge_keys = rows * n + self.indices
+        keys = sources * n + targets
+        positions = np.minimum(np.searchsorted(self._edge_keys, keys), len(self._edge_keys) - 1)
+        found = self._edge_keys[positions] == keys
+        same = sources == targets
+        missing = ~found & ~same
+        if missing.any():
+            i = np.flatnonzero(missing)[0]
+            raise KeyError(f"No edge between {self.node_ids[sources[i]]} and {self.node_ids[targets[i]]}.")
+        return positions, same
+
+    # Lengths of many direct edges at once (0 where source == target)
+    def edge_lengths(self, sources, targets):
+        positions, same = self.edge_positions(sources, targets)
+        return np.where(same, 0.0, self.lengths[positions])
+
+    # Total search weight along a node path (its length unless set_weights() changed the weights)
+    def path_weight(self, path):
+        nodes = self.index(path)
+        positions, same = self.edge_positions(nodes[:-1], nodes[1:])
+        return float(np.where(same, 0.0, self.graph.data[positions]).sum())
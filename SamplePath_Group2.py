@@ -1,8 +1,9 @@
 import networkx as nx
+from RoadNetwork import ROAD_NETWORK_GRAPHML
 import matplotlib.pyplot as plt
 
 # Load the graph
-G = nx.read_graphml('Midland_road_network2.graphml')
+G = nx.read_graphml(ROAD_NETWORK_GRAPHML)
 
 # Ensure all 'length' attributes are floats
 for u, v, data in G.edges(data=True):
@@ -1,12 +1,11 @@
-from datetime import timedelta
 import networkx as nx
+from RoadNetwork import ROAD_NETWORK_GRAPHML
 import matplotlib.pyplot as plt
-import pandas as pd
 
 from PathAssigner_Group3 import trip_results
 
 # Load the graph
-G = nx.read_graphml('Midland_road_network3.graphml')
+G = nx.read_graphml(ROAD_NETWORK_GRAPHML)
 
 # Ensure all 'length' attributes are floats
 for u, v, data in G.edges(data=True):
@@ -53,22 +52,9 @@ plot_full_path(G, full_path, nodes_sequence)
 
 # also calculate the average trip length
 def calculate_average_trip_length(trip_results):
-    total_duration = timedelta()
-    trip_count = 0
-    
-    for group, trips in trip_results.items():
-        for trip in trips:
-            # Assuming the format of each trip is (source, target, distance, travel_time, arrival_time)
-            # And that travel_time is in minutes and arrival_time is a string in '%H:%M' format
-            departure_time = pd.to_datetime(trip[4], format='%H:%M') - pd.Timedelta(minutes=trip[3])
-            arrival_time = pd.to_datetime(trip[4], format='%H:%M')
-            trip_duration = arrival_time - departure_time
-            total_duration += trip_duration
-            trip_count += 1
-    
-    # Calculate the average duration
-    average_duration = total_duration / trip_count if trip_count else timedelta()
-    return average_duration
+    # A trip is a group's whole tour: the travel minutes of all its edges added up, then averaged over groups
+    trip_minutes = trip_results.groupby('Group Number')['Travel Time (minutes)'].sum()
+    return float(trip_minutes.mean()) if len(trip_minutes) else 0.0
 
 # Calculate the average trip length using the function
 average_trip_length = calculate_average_trip_length(trip_results)
@@ -1,10 +1,11 @@
 from datetime import timedelta
 import networkx as nx
+from RoadNetwork import ROAD_NETWORK_GRAPHML
 import matplotlib.pyplot as plt
 import pandas as pd
 
 # Load the graph
-G = nx.read_graphml('Midland_road_network4.graphml')
+G = nx.read_graphml(ROAD_NETWORK_GRAPHML)
 
 # Ensure all 'length' attributes are floats
 for u, v, data in G.edges(data=True):
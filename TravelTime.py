@@ -0,0 +1,57 @@
+import hashlib
+import numpy as np
+
+METERS_PER_MILE = 1609.34
+SECONDS_PER_MINUTE = 60
+
+# Expected travel time weights for a RoutingEngine, in seconds per CSR edge:
+#   base seconds (length at speed_mph) x time-of-day multiplier
+#   + delay_minutes on edges touching a delay node
+#   + delay_probability x random_delay_minutes on every edge (the expected random delay)
+# The per-edge base seconds and the delay node mask are computed once; set_delay_nodes() and apply()
+# only recompute the weight array and write it into the engine's graph in place.
+# hourly_multipliers is optional: 24 factors (one per hour of the day), or a (24, edges) array.
+class TravelTimeWeights:
+    def __init__(self, engine, speed_mph, delay_nodes=(), delay_minutes=0.0, delay_probability=0.0,
+                 random_delay_minutes=0.0, hourly_multipliers=None):
+        self.engine = engine
+        self.delay_minutes = delay_minutes
+        self.expected_random_seconds = delay_probability * random_delay_minutes * SECONDS_PER_MINUTE
+        self.hourly_multipliers = None if hourly_multipliers is None else np.asarray(hourly_multipliers, dtype=np.float64)
+        if self.hourly_multipliers is not None and len(self.hourly_multipliers) != 24:
+            raise ValueError("hourly_multipliers needs one entry per hour of the day")
+
+        meters_per_second = speed_mph * METERS_PER_MILE / 3600
+        self.edge_seconds = engine.lengths.astype(np.float64) / meters_per_second
+        self.edge_sources = np.repeat(np.arange(len(engine.node_ids), dtype=np.int32), np.diff(engine.indptr))
+        self.delay_mask = np.zeros(len(engine.node_ids), dtype=bool)
+        self.edge_delayed = np.zeros(len(engine.indices), dtype=bool)
+        self.weight_key = None
+        self.minute_of_day = None
+        self.set_delay_nodes(delay_nodes)
+
+    # Function to change the delay nodes; ids that are not in the graph are ignored.
+    # If the engine is searching on these weights, they are re-weighted in place straight away.
+    def set_delay_nodes(self, delay_nodes):
+        self.delay_mask[:] = False
+        self.delay_mask[[self.engine.node_index[node] for node in delay_nodes if node in self.engine.node_index]] = True
+        np.logical_or(self.delay_mask[self.edge_sources], self.delay_mask[self.engine.indices], out=self.edge_delayed)
+        if self.weight_key is not None and self.engine.weight_key == self.weight_key:
+            self.apply(self.minute_of_day)
+
+    # Expected seconds per edge, for a departure at minute_of_day (None ignores the time-of-day multipliers)
+    def weights(self, minute_of_day=None):
+        weights = self.edge_seconds.copy()
+        if self.hourly_multipliers is not None and minute_of_day is not None:
+            weights *= self.hourly_multipliers[int(minute_of_day) // 60 % 24]
+        weights += self.expected_random_seconds
+        weights[self.edge_delayed] += self.delay_minutes * SECONDS_PER_MINUTE
+        return weights
+
+    # Function to make the engine search on expected travel seconds instead of length
+    def apply(self, minute_of_day=None):
+        self.minute_of_day = minute_of_day
+        weights = self.weights(minute_of_day)
+        self.weight_key = 'time-' + hashlib.sha1(weights.tobytes()).hexdigest()[:16]
+        self.engine.set_weights(weights, self.weight_key)
+        return self.weight_key
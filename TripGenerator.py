@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+
+# Departure times are carried as whole minutes after midnight of the trip's departure day (int16). A trip that
+# rolls past midnight (e.g. a late return from work) keeps its day and has minutes >= MINUTES_PER_DAY, so times
+# stay ordered within a day. The "HH:MM" label is only made when a table is written out (add_time_labels).
+DEPARTURE_MINUTE = "Trip Departure Minute"
+DEPARTURE_TIME = "Trip Departure Time"
+MINUTES_PER_DAY = 24 * 60
+# Columns of the people files
+TRIP_COLUMNS = ["Category", "ID", "Gender", "Age", "Trip Type", "Trip Departure Day", DEPARTURE_MINUTE]
+# Seed of the generators when none is given, so the people files are reproducible
+DEFAULT_SEED = 42
+GENDERS = np.array(["M", "F"], dtype=object)
+# Minutes past the hour that random times land on
+QUARTER_HOURS = np.array([0, 15, 30, 45])
+# "HH:MM" label of every minute of the day
+TIME_LABELS = np.array([f"{hour:02d}:{minute:02d}" for hour in range(24) for minute in range(60)], dtype=object)
+
+# Function to draw the ages (age_range is [low, high) as np.random.randint) and genders of `size` people
+def draw_people(rng, size, age_range):
+    ages = rng.integers(*age_range, size=size)
+    genders = GENDERS[rng.integers(0, len(GENDERS), size=size)]
+    return ages, genders
+
+# Function to draw `size` random departure times as minutes of the day: a whole hour in [start_hour, end_hour]
+# (end_hour when start_hour is not before it) plus a quarter hour. start_hour may be an array, one per time.
+def random_times(rng, start_hour, end_hour, size):
+    start_hour = np.minimum(start_hour, end_hour)
+    hours = rng.integers(start_hour, end_hour + 1, size=size)
+    return hours * 60 + QUARTER_HOURS[rng.integers(0, len(QUARTER_HOURS), size=size)]
+
+# Departure times 1 h 30 min later (past midnight they roll over into the next day's minutes)
+def return_times(minutes):
+    return np.asarray(minutes) + 90
+
+# Function to turn departure minutes into "HH:MM" labels (minutes past midnight show the next day's clock time)
+def format_times(minutes):
+    return TIME_LABELS[np.asarray(minutes, dtype=np.int64) % MINUTES_PER_DAY]
+
+# Function to parse clock labels ("6:30", "06:30", "06:30:00", "5:45 am") into minutes after midnight, for
+# slot lists and for people files written before the minute column existed
+def parse_times(labels):
+    parts = pd.Series(labels, dtype=object).astype(str).str.strip().str.lower().str.extract(
+        r'^(\d{1,2}):(\d{2})(?::\d{2})?\s*(am|pm)?$')
+    if parts[0].isna().any():
+        raise ValueError(f"Unrecognised departure time: {labels[int(np.flatnonzero(parts[0].isna())[0])]!r}")
+    hours = parts[0].astype(int).to_numpy()
+    hours = np.where((parts[2] == 'pm').to_numpy() & (hours < 12), hours + 12, hours)
+    hours = np.where((parts[2] == 'am').to_numpy() & (hours == 12), 0, hours)
+    return (hours * 60 + parts[1].astype(int).to_numpy()).astype(np.int16)
+
+# Function to get the departure minutes of a people file, from its minute column or, for older files, by
+# parsing its "HH:MM" labels once
+def departure_minutes(df):
+    if DEPARTURE_MINUTE in df:
+        return df[DEPARTURE_MINUTE].to_numpy().astype(np.int16)
+    return parse_times(df[DEPARTURE_TIME].tolist())
+
+# Function to add the "HH:MM" departure label next to the minute column, for writing the table out
+def add_time_labels(df):
+    df = df.copy()
+    if DEPARTURE_TIME in df:
+        df = df.drop(columns=DEPARTURE_TIME)
+    df.insert(df.columns.get_loc(DEPARTURE_MINUTE) + 1, DEPARTURE_TIME, format_times(df[DEPARTURE_MINUTE]))
+    return df
+
+# Function to draw one of `slots` (e.g. departure minutes) per entry, uniformly or with probabilities p
+def choose_slots(rng, slots, size, p=None):
+    slots = np.asarray(slots)
+    return slots[rng.choice(len(slots), size=size, p=p)]
+
+# Function to interleave outgoing trips with their returns, each outgoing trip directly followed by its return
+def interleave(outgoing, returning):
+    return np.column_stack([outgoing, returning]).ravel()
+
+# Function to pick counts[i] distinct days for every person i, in random order (as np.random.choice(days, k,
+# replace=False) does per person). Returns the person index and the day of every pick, person by person.
+def choose_days(rng, days, counts):
+    days = np.asarray(days, dtype=object)
+    counts = np.asarray(counts)
+    order = np.argsort(rng.random((len(counts), len(days))), axis=1)
+    picked = np.arange(len(days)) < counts[:, None]
+    person = np.broadcast_to(np.arange(len(counts))[:, None], order.shape)[picked]
+    return person, days[order[picked]]
+
+# Function to assemble the trips of one category from columns: person[i] is the index (from first_id on)
+# of the person making trip i, whose age and gender are looked up from the per-person arrays
+def trip_frame(category, first_id, ages, genders, person, trip_types, days, minutes):
+    person = np.asarray(person)
+    return pd.DataFrame({
+        "Category": np.full(len(person), category, dtype=object),
+        "ID": first_id + person,
+        "Gender": genders[person],
+        "Age": ages[person],
+        "Trip Type": trip_types,
+        "Trip Departure Day": days,
+        DEPARTURE_MINUTE: np.asarray(minutes, dtype=np.int16),
+    }, columns=TRIP_COLUMNS)
+
+# Function to stack the category frames into one people file
+def concat_trips(frames):
+    if not frames:
+        return pd.DataFrame(columns=TRIP_COLUMNS).astype({DEPARTURE_MINUTE: np.int16})
+    return pd.concat(frames, ignore_index=True)
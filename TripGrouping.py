@@ -0,0 +1,119 @@
+import numpy as np
+import pandas as pd
+
+# Minutes two departures may be apart and still share a group
+TIME_THRESHOLD = 30
+
+# Function to group the trips to one destination by departure time, sweeping them once in departure order (a
+# stable sort, so equal times keep their row order). The earliest trip not yet grouped opens a group with the
+# trips leaving within `threshold` minutes of it: the earliest max_group_size of them from its own house location
+# when there are that many, otherwise the earliest max_group_size from any house location.
+# Returns the group of every trip (0, 1, ... in the order the groups are formed), aligned with the inputs.
+def sweep_groups(minutes, houses, max_group_size=4, threshold=TIME_THRESHOLD):
+    order = np.argsort(np.asarray(minutes), kind='stable')
+    n = len(order)
+    times = np.asarray(minutes)[order].astype(np.int64).tolist()
+    # One queue of trips per house location, in departure order (a missing location matches nothing)
+    house = pd.factorize(np.asarray(houses, dtype=object)[order])[0]
+    by_house = np.argsort(house, kind='stable')
+    starts = np.searchsorted(house[by_house], np.arange(house.max() + 2 if n else 1))
+    queues = [by_house[starts[h]:starts[h + 1]].tolist() for h in range(len(starts) - 1)]
+    rank = np.empty(n, dtype=np.int64)
+    rank[by_house] = np.arange(n) - starts[np.maximum(house[by_house], 0)]
+    house, rank = house.tolist(), rank.tolist()
+
+    # next_left[i] leads to the first trip at or after i that is not grouped yet (path-compressed skip list)
+    next_left = list(range(n + 1))
+    def first_left(i):
+        root = i
+        while next_left[root] != root:
+            root = next_left[root]
+        while next_left[i] != root:
+            next_left[i], i = root, next_left[i]
+        return root
+
+    groups = [0] * n
+    group = 0
+    base = 0
+    while True:
+        base = first_left(base)
+        if base == n:
+            break
+        limit = times[base] + threshold
+        members = None
+        if house[base] >= 0:
+            # Trips leave a house queue only from its front, so the base and everything after it are left
+            queue, start = queues[house[base]], rank[base]
+            last = start + max_group_size - 1
+            if last < len(queue) and times[queue[last]] <= limit:
+                members = queue[start:last + 1]
+        if members is None:
+            # Relax the house location: the earliest trips left inside the window
+            members = []
+            i = base
+            while i < n and len(members) < max_group_size and times[i] <= limit:
+                members.append(i)
+                i = first_left(i + 1)
+        for i in members:
+            groups[i] = group
+            next_left[i] = i + 1
+        group += 1
+
+    result = np.empty(n, dtype=np.int64)
+    result[order] = groups
+    return result
+
+# Function to put trips that share the values of the `keys` columns into groups of group_size: full groups are
+# formed among trips matching on every key, and the trips left over are then grouped (the last group possibly
+# smaller) with those matching on `relaxed_keys` only, a subset of keys. Key values are taken in order of first
+# appearance and trips keep their row order, so groups are numbered bucket by bucket as the keys are met: in
+# each relaxed bucket its full groups first, then its leftover groups. Works with two stable sorts and
+# cumulative counts instead of a loop over the buckets. Without relaxed_keys the leftovers of each bucket stay
+# on their own, as its last group, and the second pass is skipped.
+# Returns the group of every row (0, 1, ...), aligned with data.
+def bucket_groups(data, keys, relaxed_keys=None, group_size=4):
+    n = len(data)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+    if relaxed_keys is None:
+        codes = [pd.factorize(data[key])[0] for key in keys]
+        order = np.lexsort(codes[::-1])
+        bucket, position, _ = _buckets([code[order] for code in codes], n)
+        return _unsort(_buckets([bucket, position // group_size], n)[0], order)
+    relaxed_codes = [pd.factorize(data[key])[0] for key in relaxed_keys]
+    codes = relaxed_codes + [pd.factorize(data[key])[0] for key in keys if key not in relaxed_keys]
+
+    # Full groups: the first size // group_size * group_size trips of every full-key bucket
+    order = np.lexsort(codes[::-1])
+    strict, position, size = _buckets([code[order] for code in codes], n)
+    strict, position = _unsort(strict, order), _unsort(position, order)
+    full = position < _unsort(size // group_size * group_size, order)
+
+    # Leftovers: counted again, in row order, within their relaxed bucket
+    order = np.lexsort(relaxed_codes[::-1]) if relaxed_codes else np.arange(n)
+    relaxed = _unsort(_buckets([code[order] for code in relaxed_codes], n)[0], order)
+    left_order = order[~full[order]]
+    left_position = np.zeros(n, dtype=np.int64)
+    left_position[left_order] = _buckets([relaxed[left_order]], len(left_order))[1]
+
+    # Number the groups by (relaxed bucket, full groups before leftovers, full-key bucket, chunk)
+    group_key = (relaxed, ~full, np.where(full, strict, 0), np.where(full, position, left_position) // group_size)
+    order = np.lexsort(group_key[::-1])
+    return _unsort(_buckets([column[order] for column in group_key], n)[0], order)
+
+# Bucket of each of n rows already sorted by columns: the bucket number, the position inside the bucket and
+# the bucket size
+def _buckets(columns, n):
+    starts = np.zeros(n, dtype=bool)
+    starts[:1] = True
+    for column in columns:
+        starts[1:] |= column[1:] != column[:-1]
+    bucket = np.cumsum(starts) - 1
+    first = np.flatnonzero(starts)
+    return bucket, np.arange(n) - first[bucket], np.diff(np.append(first, n))[bucket]
+
+# Function to put values computed in sorted order back in row order
+def _unsort(values, order):
+    result = np.empty_like(values)
+    result[order] = values
+    return result
@@ -0,0 +1,86 @@
+from itertools import chain
+import numpy as np
+import pandas as pd
+
+METERS_PER_MILE = 1609.34
+TRIP_DETAILS_COLUMNS = ['Group Number', 'From Node', 'To Node', 'Distance (meters)', 'Travel Time (minutes)',
+                        'Arrival Time', 'From Node in Optimal Order', 'To Node in Optimal Order', 'Arrival Minute']
+
+# Function to pack each group's node path into one ragged int32 array of node indices plus offsets,
+# so path i is nodes[offsets[i]:offsets[i + 1]]
+def pack_paths(engine, paths):
+    lengths = np.fromiter((len(path) for path in paths), dtype=np.int64, count=len(paths))
+    offsets = np.zeros(len(paths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    nodes = engine.index(chain.from_iterable(paths))
+    return nodes, offsets
+
+# Function to format seconds after midnight as HH:MM (wrapping past midnight), like strftime('%H:%M')
+def format_clock(seconds):
+    minutes = (np.asarray(seconds, dtype=np.int64) // 60) % (24 * 60)
+    hours = np.char.zfill((minutes // 60).astype(str), 2)
+    return np.char.add(np.char.add(hours, ':'), np.char.zfill((minutes % 60).astype(str), 2))
+
+# Function to build the TripDetails table for every group in one pass.
+# optimal_paths maps group number -> {path_key: full node path, 'optimal_order': stops}; departures maps
+# group number -> departure minutes after midnight of the trip day. delay_mask is a boolean array over node indices: edges touching a
+# masked node take delay_time extra minutes. Each edge is also delayed by delay_minutes with probability
+# delay_probability, and stop_minutes are added when leaving a stop of the group's optimal order.
+def build_trip_details(engine, optimal_paths, departures, path_key, delay_mask, delay_time, speed_mph,
+                       stop_minutes, delay_probability, delay_minutes, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    group_numbers = list(optimal_paths)
+    nodes, offsets = pack_paths(engine, [optimal_paths[group][path_key] for group in group_numbers])
+    path_lengths = np.diff(offsets)
+
+    # Every position except the last node of a path starts an edge
+    is_source = np.ones(len(nodes), dtype=bool)
+    is_source[(offsets[1:] - 1)[path_lengths > 0]] = False
+    source_positions = np.flatnonzero(is_source)
+    sources = nodes[source_positions]
+    targets = nodes[source_positions + 1]
+    edge_group = np.repeat(np.arange(len(group_numbers)), path_lengths)[source_positions]
+
+    # Edge lengths in one gather, then travel minutes with random and delay-node penalties as masks
+    distances = engine.edge_lengths(sources, targets)
+    travel_minutes = distances / METERS_PER_MILE / speed_mph * 60
+    travel_minutes += np.where(rng.random(len(sources)) < delay_probability, delay_minutes, 0)
+    delay_mask = np.asarray(delay_mask, dtype=bool)
+    travel_minutes += np.where(delay_mask[sources] | delay_mask[targets], delay_time, 0)
+
+    # Stop time is added when the edge leaves a node of the group's optimal order
+    orders, order_offsets = pack_paths(engine, [optimal_paths[group]['optimal_order'] for group in group_numbers])
+    n = len(engine.node_ids)
+    order_keys = np.repeat(np.arange(len(group_numbers), dtype=np.int64), np.diff(order_offsets)) * n + orders
+    from_in_order = np.isin(edge_group * n + sources, order_keys)
+    to_in_order = np.isin(edge_group * n + targets, order_keys)
+    step_seconds = (travel_minutes + np.where(from_in_order, stop_minutes, 0)) * 60
+
+    # Arrival times: running sum of seconds within each group on top of its departure time
+    elapsed = np.cumsum(step_seconds)
+    edge_counts = np.bincount(edge_group, minlength=len(group_numbers))
+    first_edge = np.concatenate([[0], np.cumsum(edge_counts)[:-1]])
+    elapsed -= (elapsed - step_seconds)[first_edge[edge_group]]
+    departure_seconds = np.array([departures[group] for group in group_numbers], dtype=np.int64) * 60
+    arrival_seconds = departure_seconds[edge_group] + np.rint(elapsed).astype(np.int64)
+
+    return pd.DataFrame({
+        'Group Number': np.asarray(group_numbers)[edge_group],
+        'From Node': engine.node_ids[sources],
+        'To Node': engine.node_ids[targets],
+        'Distance (meters)': distances,
+        'Travel Time (minutes)': travel_minutes,
+        'Arrival Time': format_clock(arrival_seconds),
+        'From Node in Optimal Order': np.where(from_in_order, 'Yes', 'No'),
+        'To Node in Optimal Order': np.where(to_in_order, 'Yes', 'No'),
+        # Minutes after midnight of the departure day (past midnight rolls over beyond 1440)
+        'Arrival Minute': (arrival_seconds // 60).astype(np.int16),
+    }, columns=TRIP_DETAILS_COLUMNS)
+
+# Function to print the per-edge trip details of each group
+def print_trip_details(trip_details):
+    for group, trips in trip_details.groupby('Group Number', sort=False):
+        print(f"Group {group}:")
+        for source, target, travel_time, arrival in zip(trips['From Node'], trips['To Node'],
+                                                        trips['Travel Time (minutes)'], trips['Arrival Time']):
+            print(f"  From {source} to {target}, Travel Time: {travel_time:.2f} minutes, Arrival Time: {arrival}")
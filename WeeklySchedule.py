@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from TripGenerator import DEPARTURE_MINUTE, format_times
+
+# Person columns of a schedule (the people file columns that do not change from trip to trip)
+PERSON_COLUMNS = ["Category", "ID", "Gender", "Age"]
+# Column of the compact people file listing the days a person travels
+DAYS_COLUMN = "Days"
+
+# Function to get the bitmask of some days: bit i is set when days[i] is one of them
+def day_mask(days, selected):
+    return sum(1 << i for i, day in enumerate(days) if day in selected)
+
+# Weekly trip pattern of people who make the same legs (e.g. House -> School and School -> House) on several
+# days of the week. Every person is stored once: a bitmask of the days they travel (bit i is days[i]) and the
+# departure minute of each leg on each day, minutes[person, day, leg]. Per-day trip rows are only made when
+# a consumer asks for them (day_frame, iter_days, to_frame). Values that change from trip to trip (group
+# numbers, or e.g. a destination drawn per trip) are kept per person, day and leg.
+class WeeklySchedule:
+    def __init__(self, people, days, legs, day_masks, minutes):
+        self.people = people.reset_index(drop=True)
+        self.days = list(days)
+        self.legs = list(legs)
+        self.day_masks = np.asarray(day_masks, dtype=np.uint8)
+        self.minutes = np.asarray(minutes, dtype=np.int16)
+        self.groups = np.full(self.minutes.shape, np.nan, dtype=object)
+        self.trip_columns = {}
+
+    # Function to build the schedule of one category: ages[i] and genders[i] belong to ID first_id + i,
+    # and minutes is (people, days, legs)
+    @classmethod
+    def build(cls, category, first_id, ages, genders, days, legs, day_masks, minutes):
+        people = pd.DataFrame({
+            "Category": np.full(len(ages), category, dtype=object),
+            "ID": first_id + np.arange(len(ages)),
+            "Gender": genders,
+            "Age": ages,
+        }, columns=PERSON_COLUMNS)
+        return cls(people, days, legs, day_masks, minutes)
+
+    def __len__(self):
+        return len(self.people)
+
+    # Whether each person travels on a day
+    def travels(self, day):
+        return (self.day_masks >> self.days.index(day)) & 1 == 1
+
+    # Number of trip rows the schedule stands for
+    def trip_count(self):
+        return int(sum(np.count_nonzero(self.travels(day)) for day in self.days)) * len(self.legs)
+
+    # Function to get the trips of one leg on one day as rows (people file columns, the person columns added
+    # to self.people and the group numbers), indexed by the person's position in the schedule
+    def day_frame(self, day, leg):
+        d, l = self.days.index(day), self.legs.index(leg)
+        person = np.flatnonzero(self.travels(day))
+        return self._frame(person, np.full(len(person), d), np.full(len(person), l))
+
+    # Function to store group numbers for one leg on one day, from a Series indexed like day_frame's rows
+    def set_groups(self, day, leg, groups):
+        self.groups[groups.index.to_numpy(), self.days.index(day), self.legs.index(leg)] = groups.to_numpy()
+
+    # Function to expand the schedule day by day: yields (day, rows of that day ordered by person and leg)
+    def iter_days(self):
+        legs = len(self.legs)
+        for d, day in enumerate(self.days):
+            person = np.flatnonzero(self.travels(day))
+            yield day, self._frame(np.repeat(person, legs), np.full(len(person) * legs, d),
+                                   np.tile(np.arange(legs), len(person)))
+
+    # Function to get the (person, day, leg) positions of every trip, ordered by person, day and leg (the layout
+    # of the people files)
+    def trips(self):
+        person, d = np.nonzero((self.day_masks[:, None] >> np.arange(len(self.days))) & 1)
+        legs = len(self.legs)
+        return np.repeat(person, legs), np.repeat(d, legs), np.tile(np.arange(legs), len(person))
+
+    # Function to store a column that takes its own value on every trip, values given in the order of trips()
+    def set_trip_column(self, name, values):
+        column = np.full(self.minutes.shape, None, dtype=object)
+        column[self.trips()] = np.asarray(values, dtype=object)
+        self.trip_columns[name] = column
+
+    # Function to expand the whole schedule into trip rows ordered by person, day and leg
+    def to_frame(self):
+        return self._frame(*self.trips()).reset_index(drop=True)
+
+    # Function to write the schedule one row per person: the days they travel and, per leg, the "HH:MM"
+    # departure on each of those days
+    def to_compact_frame(self):
+        frame = self.people[PERSON_COLUMNS].copy()
+        travels = np.column_stack([self.travels(day) for day in self.days])
+        frame[DAYS_COLUMN] = [" ".join(np.asarray(self.days)[row]) for row in travels]
+        for l, leg in enumerate(self.legs):
+            labels = format_times(self.minutes[:, :, l])
+            frame[leg] = [" ".join(row[on]) for row, on in zip(labels, travels)]
+        return frame
+
+    def _frame(self, person, d, l):
+        frame = pd.DataFrame({
+            "Trip Type": np.asarray(self.legs, dtype=object)[l],
+            "Trip Departure Day": np.asarray(self.days, dtype=object)[d],
+            DEPARTURE_MINUTE: self.minutes[person, d, l],
+        }, index=person)
+        people = self.people.iloc[person].set_index(frame.index)
+        frame = pd.concat([people[PERSON_COLUMNS], frame, people.drop(columns=PERSON_COLUMNS)], axis=1)
+        for name, column in self.trip_columns.items():
+            frame[name] = column[person, d, l]
+        if not pd.isna(self.groups).all():
+            frame["Group Number"] = self.groups[person, d, l]
+        return frame
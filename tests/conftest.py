@@ -0,0 +1,8 @@
+import pytest
+
+from RoutingEngine import RoutingEngine
+from tests.helpers import grid_graph
+
+@pytest.fixture
+def engine():
+    return RoutingEngine.from_graph(grid_graph())
@@ -0,0 +1,46 @@
+import itertools
+import numpy as np
+import networkx as nx
+
+# Function to find the shortest order of a tiny matrix by trying every permutation of the positions that
+# pass `allowed` (all of them by default), optionally with position 0 pinned at the start.
+# Returns (order, length) or (None, inf) when no order is allowed.
+def brute_force_order(matrix, fixed_start=False, allowed=lambda order: True):
+    matrix = np.asarray(matrix, dtype=float)
+    positions = list(range(len(matrix)))
+    candidates = ([[0] + list(rest) for rest in itertools.permutations(positions[1:])] if fixed_start
+                  else [list(order) for order in itertools.permutations(positions)])
+    best, best_length = None, np.inf
+    for order in candidates:
+        if not allowed(order):
+            continue
+        length = sum(matrix[a, b] for a, b in zip(order, order[1:]))
+        if length < best_length:
+            best, best_length = order, length
+    return best, best_length
+
+# Random matrix of n stops with legs between 1 and 100 (asymmetric unless symmetric=True)
+def random_matrix(rng, n, symmetric=False):
+    matrix = rng.uniform(1, 100, size=(n, n))
+    if symmetric:
+        matrix = (matrix + matrix.T) / 2
+    np.fill_diagonal(matrix, 0)
+    return matrix
+
+# Small road network: a jittered 8 x 8 grid around Midland with a few diagonals, each edge a bit longer
+# than the straight line between its ends (like a road), node ids as strings as read from GraphML
+def grid_graph(seed=0, size=8):
+    rng = np.random.default_rng(seed)
+    G = nx.Graph()
+    for i, j in itertools.product(range(size), range(size)):
+        G.add_node(str(i * size + j), x=-84.27 + 0.004 * j + rng.uniform(-0.001, 0.001),
+                   y=43.60 + 0.003 * i + rng.uniform(-0.001, 0.001))
+    edges = [((i, j), (i, j + 1)) for i in range(size) for j in range(size - 1)]
+    edges += [((i, j), (i + 1, j)) for i in range(size - 1) for j in range(size)]
+    edges += [((i, j), (i + 1, j + 1)) for i in range(size - 1) for j in range(size - 1) if rng.random() < 0.2]
+    for (i, j), (k, l) in edges:
+        u, v = str(i * size + j), str(k * size + l)
+        dx = (G.nodes[u]['x'] - G.nodes[v]['x']) * 111320 * np.cos(np.radians(43.6))
+        dy = (G.nodes[u]['y'] - G.nodes[v]['y']) * 111320
+        G.add_edge(u, v, length=float(np.hypot(dx, dy) * rng.uniform(1.05, 1.6)))
+    return G
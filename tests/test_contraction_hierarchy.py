@@ -0,0 +1,74 @@
+import numpy as np
+import networkx as nx
+import pytest
+from scipy.sparse.csgraph import dijkstra
+
+from ContractionHierarchy import ContractionHierarchy
+from RoutingEngine import RoutingEngine
+from tests.helpers import grid_graph
+
+def all_nodes(engine):
+    return engine.node_ids.tolist()
+
+@pytest.mark.parametrize('witness_settle_limit', [1, 200])
+def test_hierarchy_matrix_matches_dijkstra(engine, witness_settle_limit):
+    hierarchy = ContractionHierarchy.build(engine, witness_settle_limit)
+    nodes = all_nodes(engine)
+    assert np.allclose(hierarchy.many_to_many(nodes, nodes), dijkstra(engine.graph, directed=True))
+
+def test_hierarchy_on_a_directed_graph_with_other_weights():
+    G = nx.DiGraph(grid_graph(seed=3))
+    rng = np.random.default_rng(3)
+    for u, v in list(G.edges())[::4]:
+        G.remove_edge(u, v)
+    engine = RoutingEngine.from_graph(G, directed=True)
+    engine.set_weights(rng.uniform(1, 50, size=len(engine.graph.data)), 'random')
+    hierarchy = ContractionHierarchy.build(engine)
+    nodes = all_nodes(engine)
+    assert np.allclose(hierarchy.many_to_many(nodes, nodes), dijkstra(engine.graph, directed=True))
+
+def test_hierarchy_paths_unpack_to_shortest_paths(engine):
+    hierarchy = ContractionHierarchy.build(engine)
+    expected = dijkstra(engine.graph, directed=True)
+    G = grid_graph()
+    for source, target in [('0', '63'), ('7', '56'), ('27', '36'), ('5', '5')]:
+        path = hierarchy.path(source, target)
+        assert path[0] == source and path[-1] == target
+        assert all(G.has_edge(u, v) for u, v in zip(path, path[1:]))
+        assert engine.path_weight(path) == pytest.approx(expected[engine.node_index[source], engine.node_index[target]])
+
+def test_engine_routes_through_the_hierarchy(engine, tmp_path):
+    ContractionHierarchy.build(engine).save(str(tmp_path / 'grid.ch'))
+    engine.hierarchy = ContractionHierarchy.open(str(tmp_path / 'grid.ch'), engine)
+    assert engine.uses_hierarchy()
+    expected = dijkstra(engine.graph, directed=True, indices=0)
+    assert engine.one_to_many('0', all_nodes(engine)) == pytest.approx(expected)
+    assert engine.distance('0', '63') == pytest.approx(expected[engine.node_index['63']])
+
+def test_hierarchy_single_pairs_match_dijkstra():
+    G = nx.DiGraph(grid_graph(seed=5))
+    for u, v in list(G.edges())[::3]:
+        G.remove_edge(u, v)
+    # Node 0 has no way in, so everything -> 0 is unreachable
+    G.remove_edges_from(list(G.in_edges('0')))
+    engine = RoutingEngine.from_graph(G, directed=True)
+    hierarchy = ContractionHierarchy.build(engine)
+    expected = dijkstra(engine.graph, directed=True)
+    nodes = all_nodes(engine)
+    for source in nodes[::5]:
+        for target in nodes[::3]:
+            distance = expected[engine.node_index[source], engine.node_index[target]]
+            assert hierarchy.distance(source, target) == pytest.approx(distance)
+            if np.isfinite(distance):
+                assert engine.path_weight(hierarchy.path(source, target)) == pytest.approx(distance)
+            else:
+                with pytest.raises(nx.NetworkXNoPath):
+                    hierarchy.path(source, target)
+
+def test_hierarchy_rectangular_matrix(engine):
+    hierarchy = ContractionHierarchy.build(engine)
+    sources, targets = all_nodes(engine)[:7], all_nodes(engine)[20:61:4]
+    expected = dijkstra(engine.graph, directed=True, indices=engine.index(sources))[:, engine.index(targets)]
+    assert hierarchy.many_to_many(sources, targets).shape == (7, 11)
+    assert np.allclose(hierarchy.many_to_many(sources, targets), expected)
+    assert hierarchy.many_to_many(sources, []).shape == (7, 0)
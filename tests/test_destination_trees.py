@@ -0,0 +1,42 @@
+import numpy as np
+import networkx as nx
+import pytest
+from scipy.sparse.csgraph import dijkstra
+
+from DestinationTrees import DestinationTrees, load_destination_trees
+from RoutingEngine import RoutingEngine
+from tests.helpers import grid_graph
+
+def directed_engine():
+    G = nx.DiGraph(grid_graph(seed=4))
+    for u, v in list(G.edges())[::5]:
+        G.remove_edge(u, v)
+    return RoutingEngine.from_graph(G, directed=True)
+
+@pytest.mark.parametrize('make_engine', [lambda: RoutingEngine.from_graph(grid_graph()), directed_engine])
+def test_legs_to_and_from_destinations_match_dijkstra(make_engine):
+    engine = make_engine()
+    trees = DestinationTrees.build(engine, ['27', '36'])
+    expected = dijkstra(engine.graph, directed=True)
+    for destination in ['27', '36']:
+        d = engine.node_index[destination]
+        for other in engine.node_ids.tolist():
+            o = engine.node_index[other]
+            assert trees.distance(destination, other) == pytest.approx(expected[d, o])
+            assert trees.distance(other, destination) == pytest.approx(expected[o, d])
+            if np.isfinite(expected[o, d]):
+                path = trees.path(other, destination)
+                assert path[0] == other and path[-1] == destination
+                assert engine.path_weight(path) == pytest.approx(expected[o, d])
+    assert trees.distance('0', '63') is None and trees.path('0', '63') is None
+
+def test_stored_trees_gain_new_destinations(engine, tmp_path):
+    engine.graph_hash = engine.source_hash = 'grid'
+    trees_dir = str(tmp_path / 'grid.trees')
+    assert load_destination_trees('grid.graphml', engine, ['27'], trees_dir).nodes == ['27']
+    assert load_destination_trees('grid.graphml', engine, ['36'], trees_dir).nodes == ['27', '36']
+    engine.destination_trees = load_destination_trees('grid.graphml', engine, ['27'], trees_dir)
+    assert engine.destination_trees.nodes == ['27', '36']
+    expected = dijkstra(engine.graph, directed=True, indices=engine.node_index['36'])
+    assert engine.distance('36', '0') == pytest.approx(expected[0])
+    assert engine.shortest_path_trees(['36', '0'])[0][0] == pytest.approx(expected)
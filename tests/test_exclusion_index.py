@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import LineString, Point, Polygon
+
+from ExclusionIndex import ExclusionIndex
+from RegionSampler import RegionSampler
+
+# Two regions of about 1.6 x 1.1 km side by side near Midland, and a few green areas crossing them
+REGIONS = {
+    'WM': Polygon([(-84.27, 43.60), (-84.25, 43.60), (-84.25, 43.61), (-84.27, 43.61)]),
+    'EM': Polygon([(-84.25, 43.60), (-84.23, 43.60), (-84.23, 43.61), (-84.25, 43.61)]),
+}
+GREEN = [
+    Point(-84.255, 43.605).buffer(0.002),
+    Polygon([(-84.268, 43.601), (-84.262, 43.601), (-84.262, 43.604), (-84.268, 43.604)]),
+    Polygon([(-84.24, 43.602), (-84.235, 43.608), (-84.235, 43.602), (-84.24, 43.608)]),  # self-intersecting
+    LineString([(-84.27, 43.60), (-84.23, 43.61)]),  # encloses nothing, ignored
+]
+
+def exact(x, y):
+    green = shapely.union_all(shapely.make_valid(np.asarray(GREEN[:3])))
+    return shapely.contains_xy(green, x, y)
+
+@pytest.mark.parametrize('cell_meters', [0, 25, 200])
+def test_points_match_the_exact_test(cell_meters):
+    index = ExclusionIndex.build(GREEN, REGIONS, cell_meters=cell_meters)
+    rng = np.random.default_rng(cell_meters)
+    x, y = rng.uniform(-84.275, -84.225, 20000), rng.uniform(43.598, 43.612, 20000)
+    assert (index.contains_xy(x, y) == exact(x, y)).all()
+    for name, region in REGIONS.items():
+        inside = shapely.contains_xy(region, x, y)
+        assert (index.contains_xy(x[inside], y[inside], region=name) == exact(x[inside], y[inside])).all()
+
+def test_homes_sampled_outside_the_green_areas():
+    index = ExclusionIndex.build(GREEN, REGIONS)
+    x, y = RegionSampler(REGIONS).sample_many(['WM'] * 500 + ['EM'] * 500, np.random.default_rng(0), exclude=index)
+    assert not exact(x, y).any()
+    assert shapely.contains_xy(REGIONS['WM'], x[:500], y[:500]).all()
+
+def test_saved_index_answers_the_same(tmp_path):
+    index = ExclusionIndex.build(GREEN, REGIONS)
+    index.save(str(tmp_path / 'exclusion'), {})
+    reopened = ExclusionIndex.open(str(tmp_path / 'exclusion'), index.geometries)
+    rng = np.random.default_rng(5)
+    x, y = rng.uniform(-84.27, -84.23, 5000), rng.uniform(43.60, 43.61, 5000)
+    assert (reopened.contains_xy(x, y, region='WM') == index.contains_xy(x, y, region='WM')).all()
+    assert (reopened.mask == index.mask).all()
@@ -0,0 +1,58 @@
+import math
+import numpy as np
+import pytest
+from scipy.sparse.csgraph import dijkstra
+
+from Landmarks import LandmarkIndex, haversine, haversine_scale, select_landmarks
+
+def test_landmark_distances_match_dijkstra(engine):
+    index = LandmarkIndex.build(engine, k=4)
+    index.max_bound = math.inf
+    index.max_expansions = len(engine.node_ids)
+    expected = dijkstra(engine.graph, directed=True)
+    for source in range(0, len(engine.node_ids), 5):
+        for target in range(0, len(engine.node_ids), 3):
+            distance, _ = index.search(source, target)
+            assert distance == pytest.approx(expected[source, target])
+    assert index.stats()['fallback_rate'] == 0.0
+
+def test_landmark_path_is_a_shortest_path(engine):
+    index = LandmarkIndex.build(engine, k=4)
+    index.max_bound = math.inf
+    path = index.path('0', '63')
+    assert path[0] == '0' and path[-1] == '63'
+    assert engine.path_weight(path) == pytest.approx(engine.one_to_many('0', ['63'])[0])
+
+def test_engine_answers_through_landmarks_and_falls_back(engine):
+    engine.landmarks = LandmarkIndex.build(engine, k=4)
+    expected = dijkstra(engine.graph, directed=True, indices=0)
+    for target in range(len(engine.node_ids)):
+        assert engine.distance('0', engine.node_ids[target]) == pytest.approx(expected[target])
+    stats = engine.landmarks.stats()
+    assert stats['searches'] == len(engine.node_ids)
+    assert stats['answered'] + stats['too_far'] + stats['gave_up'] == stats['searches']
+
+def test_searches_over_the_limit_are_counted(engine):
+    index = LandmarkIndex.build(engine, k=4)
+    index.max_bound = math.inf
+    index.max_expansions = 0
+    assert index.distance('0', '63') is None
+    assert index.path('0', '63') is None
+    assert index.distance('0', '0') == 0.0
+    assert index.stats() == {'searches': 3, 'answered': 1, 'too_far': 0, 'gave_up': 2, 'fallback_rate': 2 / 3}
+
+def test_landmarks_are_spread_out(engine):
+    landmarks, from_landmark, to_landmark = select_landmarks(engine, 4)
+    assert len(set(landmarks.tolist())) == 4
+    # Every landmark after the first is the node farthest from the ones before it
+    distances = dijkstra(engine.graph, directed=True, indices=landmarks)
+    for i in range(1, 4):
+        assert distances[:i].min(axis=0)[landmarks[i]] == pytest.approx(distances[:i].min(axis=0).max())
+    assert np.allclose(from_landmark, distances, rtol=1e-6)
+
+def test_haversine_bound_never_overestimates(engine):
+    scale = haversine_scale(engine)
+    assert scale > 0
+    lon, lat = np.radians(engine.x), np.radians(engine.y)
+    straight = scale * haversine(lon[0], lat[0], lon, lat)
+    assert (straight <= dijkstra(engine.graph, directed=True, indices=0) + 1e-6).all()
@@ -0,0 +1,45 @@
+import os
+import numpy as np
+import networkx as nx
+import pytest
+from shapely.geometry import Point
+
+from GraphSnapshot import load_snapshot
+from Landmarks import haversine
+from NodeSnapper import SNAPPER_FILE, NodeSnapper
+from tests.helpers import grid_graph
+
+def nearest_by_haversine(engine, x, y):
+    meters = haversine(np.radians(x)[:, None], np.radians(y)[:, None], np.radians(engine.x)[None, :],
+                       np.radians(engine.y)[None, :])
+    return engine.node_ids[meters.argmin(axis=1)], meters.min(axis=1)
+
+def test_snapping_matches_a_haversine_search(engine):
+    rng = np.random.default_rng(0)
+    x, y = rng.uniform(-84.275, -84.235, 2000), rng.uniform(43.595, 43.625, 2000)
+    snapper = NodeSnapper.build(engine.node_ids, engine.x, engine.y)
+    nodes, meters = snapper.nearest(x, y)
+    expected_nodes, expected_meters = nearest_by_haversine(engine, x, y)
+    assert meters == pytest.approx(expected_meters, rel=1e-3)
+    # Near-ties may go either way, but only between nodes equally far within the projection error
+    different = nodes != expected_nodes
+    assert different.mean() < 0.01
+    assert meters[different] == pytest.approx(expected_meters[different], rel=1e-3)
+
+def test_points_of_any_kind_and_missing_points(engine):
+    snapper = NodeSnapper.build(engine.node_ids, engine.x, engine.y)
+    node_x, node_y = float(engine.x[5]), float(engine.y[5])
+    nodes, meters = snapper.nearest_points([(node_x, node_y), Point(node_x, node_y), None, np.nan])
+    assert nodes.tolist() == [engine.node_ids[5]] * 2 + [None, None]
+    assert meters[:2] == pytest.approx([0, 0]) and np.isnan(meters[2:]).all()
+    assert snapper.nearest_node(node_x, node_y) == engine.node_ids[5]
+
+def test_snapper_is_stored_in_the_snapshot(tmp_path):
+    graphml_path = str(tmp_path / 'grid.graphml')
+    nx.write_graphml(grid_graph(), graphml_path)
+    snapshot = load_snapshot(graphml_path)
+    snapper = snapshot.snapper()
+    assert os.path.exists(os.path.join(snapshot.snapshot_dir, SNAPPER_FILE))
+    reopened = load_snapshot(graphml_path).snapper()
+    x, y = snapshot.x + 1e-4, snapshot.y - 1e-4
+    assert (reopened.nearest(x, y)[0] == snapper.nearest(x, y)[0]).all()
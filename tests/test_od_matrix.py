@@ -0,0 +1,53 @@
+import os
+import numpy as np
+import networkx as nx
+import pandas as pd
+import pytest
+from scipy.sparse.csgraph import dijkstra
+
+from GraphSnapshot import load_routing_engine
+from ODMatrix import day_nodes, load_od_matrix, od_dir_for
+from tests.helpers import grid_graph
+
+@pytest.fixture
+def graphml_path(tmp_path):
+    path = str(tmp_path / 'grid.graphml')
+    nx.write_graphml(grid_graph(), path)
+    return path
+
+def expected_matrix(engine, nodes):
+    return dijkstra(engine.graph, directed=True, indices=engine.index(nodes))[:, engine.index(nodes)]
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_od_matrix_matches_dijkstra(graphml_path, workers):
+    engine = load_routing_engine(graphml_path)
+    nodes = engine.node_ids.tolist()[::3]
+    od_matrix = load_od_matrix(graphml_path, engine, nodes, 'M', block_size=5, workers=workers)
+    assert od_matrix.distances.dtype == np.float32
+    assert np.allclose(od_matrix.many_to_many(nodes, nodes), expected_matrix(engine, nodes), rtol=1e-6)
+    assert od_matrix.distance(nodes[0], nodes[-1]) == pytest.approx(expected_matrix(engine, nodes)[0, -1], rel=1e-6)
+
+def test_node_sets_of_one_day_get_their_own_matrix(graphml_path):
+    engine = load_routing_engine(graphml_path)
+    first, second = engine.node_ids.tolist()[:20], engine.node_ids.tolist()[10:40]
+    first_matrix = load_od_matrix(graphml_path, engine, first, 'M')
+    second_matrix = load_od_matrix(graphml_path, engine, second, 'M')
+    assert first_matrix.od_dir != second_matrix.od_dir
+    # Loading the first set again opens its matrix instead of rebuilding over the second one
+    assert load_od_matrix(graphml_path, engine, first[::-1], 'M').od_dir == first_matrix.od_dir
+    assert os.path.isdir(second_matrix.od_dir)
+    assert od_dir_for(graphml_path, 'M', first, engine.graph_hash) == first_matrix.od_dir
+    assert od_dir_for(graphml_path, 'M', first, 'other weights') != first_matrix.od_dir
+
+def test_engine_reads_group_matrices_from_the_od_matrix(graphml_path):
+    engine = load_routing_engine(graphml_path)
+    nodes = engine.node_ids.tolist()[:30]
+    engine.od_matrices = [load_od_matrix(graphml_path, engine, nodes, 'M')]
+    assert engine.od_matrix_for(nodes[:4]) is engine.od_matrices[0]
+    assert engine.od_matrix_for(nodes[:4] + [engine.node_ids[-1]]) is None
+
+def test_day_nodes_collects_the_days_nodes_once():
+    df = pd.DataFrame({'Trip Departure Day': ['M', 'M', 'Tu'], 'House Node': [1, 2, 3],
+                       'Destination Node': [2, 4, 5]})
+    assert day_nodes(df, 'M', extra_nodes=[9, 1]) == ['1', '2', '4', '9']
+    assert day_nodes(df, 'Tu', ['House Node']) == ['3']
@@ -0,0 +1,66 @@
+import numpy as np
+import networkx as nx
+import pytest
+
+from GraphSnapshot import load_routing_engine
+from ParallelSolver import solve_groups
+from PathCache import PathCache
+from RouteSolver import solve_pickup_dropoff_group
+from tests.helpers import grid_graph
+
+@pytest.fixture
+def graphml_path(tmp_path):
+    path = str(tmp_path / 'grid.graphml')
+    nx.write_graphml(grid_graph(), path)
+    return path
+
+# Random two-rider groups over the grid, keyed by group number
+def random_groups(engine, count, seed=0):
+    rng = np.random.default_rng(seed)
+    nodes = engine.node_ids.tolist()
+    return {group_number: ([str(node) for node in rng.choice(nodes, 2, replace=False)],
+                           [str(node) for node in rng.choice(nodes, 2, replace=False)])
+            for group_number in range(1, count + 1)}
+
+def test_workers_share_one_path_cache(graphml_path, tmp_path):
+    engine = load_routing_engine(graphml_path)
+    group_args = random_groups(engine, 400)
+    expected = solve_groups(solve_pickup_dropoff_group, group_args, graphml_path, engine)
+
+    path_cache = PathCache(str(tmp_path / 'paths.sqlite'), engine.graph_hash)
+    # First run fills the distances, the second finds every matrix cached and fills the paths
+    for _ in range(2):
+        results = solve_groups(solve_pickup_dropoff_group, group_args, graphml_path, engine, path_cache,
+                               workers=8, chunk_size=4)
+        assert list(results) == list(group_args)
+        for group_number, result in results.items():
+            assert result['optimal_order'] == expected[group_number]['optimal_order']
+            assert result['full_path'] == expected[group_number]['full_path']
+            assert result['total_distance'] == pytest.approx(expected[group_number]['total_distance'])
+    stored = path_cache.conn.execute('SELECT COUNT(*), COUNT(path) FROM paths').fetchone()
+    path_cache.close()
+    # Everything the workers found was written back through the parent's connection
+    assert path_cache.stats()['entries'] >= stored[0] > 0
+    assert stored[1] > 0
+    assert path_cache.hits > 0 and path_cache.misses > 0
+
+def test_read_only_cache_queues_its_writes(tmp_path):
+    db_path = str(tmp_path / 'paths.sqlite')
+    path_cache = PathCache(db_path, 'graph')
+    path_cache.put_distances({('1', '2'): 5.0})
+    path_cache.flush()
+
+    reader = PathCache(db_path, 'graph', read_only=True)
+    reader.put_distances({('2', '1'): 6.0})
+    reader.put_path('1', '3', 7.0, ['1', '2', '3'])
+    assert reader.get_distances(['1', '2', '3']) == {('1', '2'): 5.0, ('2', '1'): 6.0, ('1', '3'): 7.0}
+    assert reader.get_path('1', '3') == ['1', '2', '3']
+    reader.flush()
+    assert path_cache.conn.execute('SELECT COUNT(*) FROM paths').fetchone()[0] == 1
+
+    path_cache.apply_writes(reader.take_writes())
+    assert reader.take_writes() == ({}, {}, set())
+    assert path_cache.get_distances(['1', '2', '3']) == {('1', '2'): 5.0, ('2', '1'): 6.0, ('1', '3'): 7.0}
+    assert path_cache.get_path('1', '3') == ['1', '2', '3']
+    reader.close()
+    path_cache.close()
@@ -0,0 +1,43 @@
+import numpy as np
+import networkx as nx
+import shapely
+from shapely.geometry import Polygon
+
+from GraphSnapshot import load_snapshot
+from RegionNodeIndex import NO_NODE, RegionNodeIndex
+from tests.helpers import grid_graph
+
+REGIONS = {
+    'west': Polygon([(-84.272, 43.598), (-84.256, 43.598), (-84.256, 43.622), (-84.272, 43.622)]),
+    'east': Polygon([(-84.256, 43.598), (-84.238, 43.598), (-84.238, 43.610), (-84.256, 43.622)]),
+    'empty': Polygon([(-80, 40), (-79.9, 40), (-79.9, 40.1)]),
+}
+
+def test_members_match_a_within_test(engine):
+    index = RegionNodeIndex.build(engine.x, engine.y, REGIONS)
+    for name, region in REGIONS.items():
+        within = [i for i in range(len(engine.node_ids)) if shapely.Point(engine.x[i], engine.y[i]).within(region)]
+        assert index.nodes(name).tolist() == within
+    assert len(index.nodes('west')) and len(index.nodes('east'))
+    assert len(index.nodes('unknown')) == 0
+
+def test_draws_come_from_their_region(engine):
+    index = RegionNodeIndex.build(engine.x, engine.y, REGIONS)
+    names = np.array(['east', 'west', 'unknown', 'empty', 'west'] * 200, dtype=object)
+    positions = index.sample_many(names, np.random.default_rng(0))
+    for name in ['east', 'west']:
+        drawn = positions[names == name]
+        assert np.isin(drawn, index.nodes(name)).all()
+        # Every member is drawn now and then
+        assert set(drawn.tolist()) == set(index.nodes(name).tolist())
+    assert (positions[np.isin(names, ['unknown', 'empty'])] == NO_NODE).all()
+
+def test_index_is_stored_in_the_snapshot(tmp_path):
+    graphml_path = str(tmp_path / 'grid.graphml')
+    nx.write_graphml(grid_graph(), graphml_path)
+    snapshot = load_snapshot(graphml_path)
+    built = snapshot.region_nodes(REGIONS)
+    reopened = load_snapshot(graphml_path).region_nodes(REGIONS)
+    for name in REGIONS:
+        assert reopened.nodes(name).tolist() == built.nodes(name).tolist()
+    assert len(list(tmp_path.glob('grid.snapshot/regions-*'))) == 1
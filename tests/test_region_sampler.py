@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Polygon
+
+from RegionSampler import RegionSampler, triangulate
+
+# An L-shaped region: a 2 x 1 bottom bar and a 1 x 1 block on its left end (area 3)
+L_SHAPE = Polygon([(0, 0), (2, 0), (2, 1), (1, 1), (1, 2), (0, 2)])
+SQUARE = Polygon([(10, 10), (11, 10), (11, 11), (10, 11)])
+
+def test_triangles_cover_the_polygon_exactly():
+    a, b, c = triangulate(L_SHAPE)
+    triangles = shapely.polygons(np.stack([a, b, c, a], axis=1))
+    assert shapely.union_all(triangles).symmetric_difference(L_SHAPE).area == pytest.approx(0)
+    assert shapely.area(triangles).sum() == pytest.approx(L_SHAPE.area)
+
+def test_samples_are_inside_and_uniform():
+    sampler = RegionSampler({'L': L_SHAPE})
+    x, y = sampler.sample('L', 30000, np.random.default_rng(0))
+    assert shapely.contains_xy(shapely.buffer(L_SHAPE, 1e-9), x, y).all()
+    # Each unit square of the L holds a third of the area, so about a third of the points
+    squares = (x >= 1).astype(int) + 2 * (y >= 1)
+    assert np.bincount(squares, minlength=3)[:3] / len(x) == pytest.approx([1 / 3] * 3, abs=0.015)
+
+def test_self_intersecting_region_is_still_covered():
+    bowtie = Polygon([(0, 0), (2, 2), (2, 0), (0, 2)])
+    x, y = RegionSampler({'bowtie': bowtie}).sample('bowtie', 1000, np.random.default_rng(1))
+    assert shapely.contains_xy(shapely.buffer(shapely.make_valid(bowtie), 1e-9), x, y).all()
+
+def test_sample_many_draws_each_point_in_its_own_region():
+    sampler = RegionSampler({'L': L_SHAPE, 'square': SQUARE})
+    names = np.array(['square', 'L', 'L', 'square', 'L'])
+    x, y = sampler.sample_many(names, np.random.default_rng(2))
+    in_square = shapely.contains_xy(SQUARE, x, y)
+    assert (in_square == (names == 'square')).all()
+
+def test_excluded_area_is_redrawn():
+    hole = Polygon([(0, 0), (1, 0), (1, 1), (0, 1)])
+    x, y = RegionSampler({'L': L_SHAPE}).sample('L', 2000, np.random.default_rng(3), exclude=hole)
+    assert not shapely.contains_xy(hole, x, y).any()
+
+def test_fully_excluded_region_raises():
+    with pytest.raises(ValueError):
+        RegionSampler({'square': SQUARE}).sample('square', 10, np.random.default_rng(4), exclude=SQUARE.buffer(1))
@@ -0,0 +1,121 @@
+import numpy as np
+import pytest
+
+from RouteSolver import (calculate_order_length, held_karp_order, improve_order, is_feasible_order,
+                         nearest_neighbor_pickup_dropoff_order, or_opt_pass, solve_fixed_depot_order,
+                         solve_pickup_dropoff_heuristic, solve_pickup_dropoff_order, two_opt_pass)
+from tests.helpers import brute_force_order, random_matrix
+
+@pytest.mark.parametrize('n', [1, 2, 3, 5, 7])
+def test_held_karp_matches_brute_force(n):
+    rng = np.random.default_rng(n)
+    for _ in range(20):
+        matrix = random_matrix(rng, n + 1)
+        order, total = held_karp_order(matrix)
+        _, best = brute_force_order(matrix, fixed_start=True)
+        assert order[0] == 0 and sorted(order) == list(range(n + 1))
+        assert total == pytest.approx(best)
+        assert calculate_order_length(matrix, order) == pytest.approx(total)
+
+def test_held_karp_depot_only():
+    assert held_karp_order(np.zeros((1, 1))) == ([0], 0.0)
+
+@pytest.mark.parametrize('depot', ['start', 'end'])
+def test_fixed_depot_order_matches_brute_force(depot):
+    rng = np.random.default_rng(7)
+    for _ in range(20):
+        matrix = random_matrix(rng, 6)
+        order, total = solve_fixed_depot_order(matrix, depot)
+        if depot == 'start':
+            _, best = brute_force_order(matrix, fixed_start=True)
+            assert order[0] == 0
+        else:
+            # Ending at the depot: every order with position 0 last
+            _, best = brute_force_order(matrix, allowed=lambda candidate: candidate[-1] == 0)
+            assert order[-1] == 0
+        assert total == pytest.approx(best)
+        assert calculate_order_length(matrix, order) == pytest.approx(total)
+
+def test_fixed_depot_order_rejects_unknown_depot():
+    with pytest.raises(ValueError):
+        solve_fixed_depot_order(np.zeros((3, 3)), 'middle')
+
+@pytest.mark.parametrize('riders, capacity', [(1, None), (2, None), (3, None), (3, 1), (3, 2), (4, 2)])
+def test_pickup_dropoff_order_matches_brute_force(riders, capacity):
+    rng = np.random.default_rng(riders * 10 + (capacity or 0))
+    pairs = [(i, riders + i) for i in range(riders)]
+    for _ in range(10):
+        matrix = random_matrix(rng, 2 * riders)
+        order, total = solve_pickup_dropoff_order(matrix, capacity)
+        _, best = brute_force_order(matrix, allowed=lambda candidate: is_feasible_order(candidate, pairs, capacity))
+        assert sorted(order) == list(range(2 * riders))
+        assert is_feasible_order(order, pairs, capacity)
+        assert total == pytest.approx(best)
+        assert calculate_order_length(matrix, order) == pytest.approx(total)
+
+def test_pickup_dropoff_order_rejects_zero_capacity():
+    with pytest.raises(ValueError):
+        solve_pickup_dropoff_order(np.zeros((2, 2)), capacity=0)
+
+def test_is_feasible_order():
+    pairs = [(0, 2), (1, 3)]
+    assert is_feasible_order([0, 1, 2, 3], pairs)
+    assert not is_feasible_order([2, 0, 1, 3], pairs)
+    assert not is_feasible_order([0, 1, 2, 3], pairs, capacity=1)
+    assert is_feasible_order([0, 2, 1, 3], pairs, capacity=1)
+
+# Symmetric matrix of points on a line, where the best open path visits them left to right
+def line_matrix(points):
+    points = np.asarray(points, dtype=float)
+    return np.abs(points[:, None] - points[None, :])
+
+def test_two_opt_uncrosses_a_path():
+    matrix = line_matrix([0, 1, 2, 3, 4])
+    order, delta = two_opt_pass(matrix, [0, 3, 2, 1, 4], [])
+    assert order == [0, 1, 2, 3, 4]
+    assert delta == pytest.approx(-4)
+
+def test_or_opt_moves_a_stop_back_into_place():
+    matrix = line_matrix([0, 1, 2, 3, 4])
+    order, delta = or_opt_pass(matrix, [0, 1, 3, 4, 2], [], fixed_first=True)
+    assert calculate_order_length(matrix, order) < calculate_order_length(matrix, [0, 1, 3, 4, 2])
+    assert order[0] == 0 and delta < 0
+
+def test_local_search_keeps_pickups_before_dropoffs():
+    # Reversed segments and moved stops must never put a drop-off before its pickup
+    matrix = line_matrix([0, 1, 2, 3])
+    pairs = [(0, 2), (1, 3)]
+    order, gains = improve_order(matrix, [0, 1, 3, 2], pairs)
+    assert is_feasible_order(order, pairs)
+    assert calculate_order_length(matrix, order) <= calculate_order_length(matrix, [0, 1, 3, 2])
+
+@pytest.mark.parametrize('riders, capacity', [(2, None), (3, None), (3, 2), (4, None)])
+def test_pickup_dropoff_heuristic_between_optimum_and_nearest_neighbor(riders, capacity):
+    rng = np.random.default_rng(100 + riders)
+    pairs = [(i, riders + i) for i in range(riders)]
+    feasible = lambda candidate: is_feasible_order(candidate, pairs, capacity)
+    for _ in range(10):
+        matrix = random_matrix(rng, 2 * riders, symmetric=True)
+        order, total, stages = solve_pickup_dropoff_heuristic(matrix, pairs, range(riders), capacity)
+        _, best = brute_force_order(matrix, allowed=feasible)
+        nearest_neighbor = min(calculate_order_length(matrix, nearest_neighbor_pickup_dropoff_order(
+            matrix, pairs, start, capacity)) for start in range(riders))
+        assert feasible(order) and sorted(order) == list(range(2 * riders))
+        assert best - 1e-9 <= total <= nearest_neighbor + 1e-9
+        assert stages['nearest_neighbor'] == pytest.approx(nearest_neighbor)
+        assert stages['nearest_neighbor'] >= stages['two_opt'] - 1e-9 >= stages['or_opt'] - 2e-9
+        assert stages['or_opt'] == pytest.approx(total)
+        # Local search stops at an order neither move can improve
+        assert two_opt_pass(matrix, order, pairs, capacity)[1] == 0.0
+        assert or_opt_pass(matrix, order, pairs, capacity)[1] == 0.0
+
+def test_pickup_dropoff_heuristic_keeps_the_depot_first():
+    rng = np.random.default_rng(5)
+    # Position 0 is the depot (in no pair), then the pickups and drop-offs of two riders
+    pairs = [(1, 3), (2, 4)]
+    for _ in range(10):
+        matrix = random_matrix(rng, 5, symmetric=True)
+        order, total, _ = solve_pickup_dropoff_heuristic(matrix, pairs, [0], fixed_first=True)
+        _, best = brute_force_order(matrix, fixed_start=True, allowed=lambda candidate: is_feasible_order(candidate, pairs))
+        assert order[0] == 0
+        assert total >= best - 1e-9
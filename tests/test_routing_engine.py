@@ -0,0 +1,62 @@
+import numpy as np
+import networkx as nx
+import pytest
+
+from RouteSolver import solve_fixed_depot_group
+from RoutingEngine import RoutingEngine
+from tests.helpers import brute_force_order, grid_graph
+
+def test_distances_match_networkx(engine):
+    G = grid_graph()
+    nodes = list(G.nodes())[::7]
+    matrix = engine.many_to_many(nodes, nodes)
+    for i, source in enumerate(nodes):
+        lengths = nx.single_source_dijkstra_path_length(G, source, weight='length')
+        assert matrix[i] == pytest.approx([lengths[target] for target in nodes])
+        assert engine.one_to_many(source, nodes) == pytest.approx(matrix[i])
+        assert engine.distance(source, nodes[-1]) == pytest.approx(lengths[nodes[-1]])
+
+def test_path_follows_edges_and_has_the_shortest_length(engine):
+    G = grid_graph()
+    path = engine.path('0', '63')
+    assert path[0] == '0' and path[-1] == '63'
+    assert all(G.has_edge(u, v) for u, v in zip(path, path[1:]))
+    assert engine.path_weight(path) == pytest.approx(nx.dijkstra_path_length(G, '0', '63', weight='length'))
+
+def test_edge_lengths_are_float64_and_exact(engine):
+    G = grid_graph()
+    u, v = zip(*list(G.edges())[:10])
+    lengths = engine.edge_lengths(engine.index(u), engine.index(v))
+    assert lengths.dtype == np.float64
+    assert lengths.tolist() == [G.edges[a, b]['length'] for a, b in zip(u, v)]
+    assert engine.edge_length('0', '0') == 0.0
+    with pytest.raises(KeyError):
+        engine.edge_length('0', '63')
+
+def test_parallel_edges_keep_the_shortest():
+    G = nx.MultiGraph()
+    G.add_edge('a', 'b', length=5.0)
+    G.add_edge('a', 'b', length=3.0)
+    G.add_edge('b', 'c', length=1.0)
+    engine = RoutingEngine.from_graph(G)
+    assert engine.edge_length('a', 'b') == 3.0
+    assert engine.distance('c', 'a') == 4.0
+
+def test_set_weights_changes_the_search_and_back(engine):
+    weights = np.ones_like(engine.graph.data)
+    engine.set_weights(weights, 'hops')
+    assert engine.distance('0', '7') == 7.0
+    engine.set_weights(None, None)
+    assert engine.distance('0', '7') == pytest.approx(nx.dijkstra_path_length(grid_graph(), '0', '7', weight='length'))
+
+def test_fixed_depot_group_tour_is_the_shortest(engine):
+    G = grid_graph()
+    stops = ['27', '0', '7', '56', '63']
+    result = solve_fixed_depot_group(engine, stops, 'start')
+    assert result['optimal_order'][0] == '27' and sorted(result['optimal_order']) == sorted(stops)
+    legs = [nx.dijkstra_path_length(G, a, b, weight='length')
+            for a, b in zip(result['optimal_order'], result['optimal_order'][1:])]
+    assert result['total_distance'] == pytest.approx(sum(legs))
+    assert engine.path_weight(result['full_path']) == pytest.approx(sum(legs))
+    matrix = np.array([[nx.dijkstra_path_length(G, a, b, weight='length') for b in stops] for a in stops])
+    assert result['total_distance'] == pytest.approx(brute_force_order(matrix, fixed_start=True)[1])
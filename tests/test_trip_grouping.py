@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from TripGrouping import TIME_THRESHOLD, bucket_groups, sweep_groups
+
+# The per-destination loop sweep_groups replaced in AVPeopleFile_Group3/Group4: take the earliest trip left,
+# group it with the trips from its house location leaving within the threshold (any house location when there
+# are fewer than max_group_size of those), drop them and start over
+def old_sweep(minutes, houses, max_group_size=4):
+    sorted_data = pd.DataFrame({'minute': minutes, 'house': houses}).sort_values(by='minute', kind='stable')
+    groups = np.full(len(sorted_data), -1)
+    group_counter = 0
+    while not sorted_data.empty:
+        base_time = sorted_data.iloc[0]['minute']
+        base_location = sorted_data.iloc[0]['house']
+        near = (sorted_data['minute'] - base_time).abs() <= TIME_THRESHOLD
+        mask = near & (sorted_data['house'] == base_location)
+        if mask.sum() < max_group_size:
+            mask = near
+        group_indices = sorted_data[mask].index[:max_group_size]
+        groups[group_indices] = group_counter
+        sorted_data = sorted_data.drop(group_indices)
+        group_counter += 1
+    return groups
+
+# Trips to one destination with same-house groups, relaxed groups, a missing house location, equal departures
+# and departures exactly on the threshold, with the groups the old loop formed for them
+FIXTURE_MINUTES = [480, 485, 490, 495, 500, 510, 510, 515, 530, 540, 541, 600, 600, 600, 601, 700, 729, 730, 731]
+FIXTURE_HOUSES = ['EM', 'NM', 'EM', 'EM', 'EM', 'NM', 'NM', 'WM', 'NM', np.nan, 'NM', 'SM', 'SM', 'SM', 'CM',
+                  'EM', 'EM', 'WM', 'EM']
+FIXTURE_GROUPS = [0, 1, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 5]
+
+def test_sweep_reproduces_the_fixture_groups():
+    houses = np.array(FIXTURE_HOUSES, dtype=object)
+    assert old_sweep(FIXTURE_MINUTES, houses).tolist() == FIXTURE_GROUPS
+    assert sweep_groups(FIXTURE_MINUTES, houses).tolist() == FIXTURE_GROUPS
+    # Shuffled rows keep their groups (the equal departures here share a house, so ties cannot split them)
+    order = np.random.default_rng(0).permutation(len(FIXTURE_MINUTES))
+    shuffled = sweep_groups(np.asarray(FIXTURE_MINUTES)[order], houses[order])
+    assert pd.Series(shuffled).groupby(np.asarray(FIXTURE_GROUPS)[order]).nunique().eq(1).all()
+
+@pytest.mark.parametrize('seed', range(8))
+def test_sweep_matches_the_old_loop(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(25):
+        n = int(rng.integers(0, 60))
+        max_group_size = int(rng.integers(1, 6))
+        minutes = rng.integers(0, rng.integers(1, 300), n)
+        houses = rng.choice(np.array(['EM', 'NM', 'WM', np.nan], dtype=object), n, p=[0.4, 0.3, 0.2, 0.1])
+        expected = old_sweep(minutes, houses, max_group_size)
+        assert sweep_groups(minutes, houses, max_group_size).tolist() == expected.tolist()
+
+def test_sweep_of_no_trips():
+    assert len(sweep_groups(np.array([], dtype=int), np.array([], dtype=object))) == 0
+
+# The morning loop bucket_groups replaced in AVPeopleFile_Group1/Group4 (School Location was Destination Location
+# for work trips), with its relaxed pass reading the group numbers just written. The shipped loop read them from
+# morning_data, where they stay NaN, and so regrouped every trip of each house and time over the same-school groups.
+def old_morning(morning_data):
+    group_counter = 1
+    morning_data = morning_data.copy()
+    morning_data['Group Number'] = np.nan
+    data = pd.DataFrame(index=morning_data.index, columns=['Group Number'], dtype=object)
+    for house in morning_data['House Location'].unique():
+        for time in morning_data['minute'].unique():
+            house_time_data = morning_data[(morning_data['House Location'] == house) & (morning_data['minute'] == time)]
+            for school in house_time_data['School Location'].unique():
+                full_criteria_data = house_time_data[house_time_data['School Location'] == school]
+                for i in range(0, len(full_criteria_data), 4):
+                    if len(full_criteria_data.iloc[i:i + 4]) < 4:
+                        break
+                    data.loc[full_criteria_data.index[i:i + 4], 'Group Number'] = f'{group_counter}'
+                    group_counter += 1
+            remaining_data = house_time_data[pd.isna(data.loc[house_time_data.index, 'Group Number'])]
+            for i in range(0, len(remaining_data), 4):
+                data.loc[remaining_data.index[i:i + 4], 'Group Number'] = f'{group_counter}'
+                group_counter += 1
+    return data['Group Number']
+
+# The afternoon loop: groups of 4 by school and time, the rest of each school and time grouped after them
+def old_afternoon(afternoon_data):
+    group_counter = 1
+    afternoon_data = afternoon_data.copy()
+    afternoon_data['Group Number'] = np.nan
+    data = pd.DataFrame(index=afternoon_data.index, columns=['Group Number'], dtype=object)
+    for school in afternoon_data['School Location'].unique():
+        for time in afternoon_data['minute'].unique():
+            school_time_data = afternoon_data[(afternoon_data['School Location'] == school)
+                                              & (afternoon_data['minute'] == time)]
+            for i in range(0, len(school_time_data), 4):
+                if len(school_time_data.iloc[i:i + 4]) < 4:
+                    continue
+                data.loc[school_time_data.index[i:i + 4], 'Group Number'] = f'{group_counter}'
+                group_counter += 1
+    remaining_data = afternoon_data[pd.isna(afternoon_data['Group Number'])]
+    for school in remaining_data['School Location'].unique():
+        for time in remaining_data['minute'].unique():
+            remaining_school_time_data = remaining_data[(remaining_data['School Location'] == school)
+                                                        & (remaining_data['minute'] == time)]
+            while len(remaining_school_time_data) > 0:
+                data.loc[remaining_school_time_data.index[:4], 'Group Number'] = f'{group_counter}'
+                remaining_school_time_data = remaining_school_time_data.iloc[4:]
+                group_counter += 1
+    return data['Group Number']
+
+# Groups numbered 0, 1, ... in order of their old numbers, which only differ from bucket_groups by skipped values
+def dense(numbers):
+    return pd.Series(numbers).astype(float).rank(method='dense').astype(int).to_numpy() - 1
+
+def random_school_trips(rng, n):
+    return pd.DataFrame({
+        'House Location': rng.choice(['EM', 'NM', 'WM', 'SM', 'CM'], n),
+        'minute': rng.choice([390, 405, 420], n),
+        'School Location': rng.choice(['Dow', 'Midland'], n),
+    }, index=rng.permutation(n) + 100)
+
+# Groups as a set of sets of row labels, to compare groupings that number the same groups differently
+def partition(groups, index):
+    return {frozenset(rows) for rows in pd.Series(index, index=np.asarray(groups)).groupby(level=0).agg(tuple)}
+
+@pytest.mark.parametrize('seed', range(8))
+def test_buckets_match_the_old_school_loops(seed):
+    rng = np.random.default_rng(seed)
+    for _ in range(10):
+        trips = random_school_trips(rng, int(rng.integers(1, 120)))
+        # The old loop took schools in order of appearance within each house and time, so only the numbering differs
+        morning = bucket_groups(trips, ['House Location', 'minute', 'School Location'], ['House Location', 'minute'])
+        assert partition(morning, trips.index) == partition(old_morning(trips), trips.index)
+        afternoon = bucket_groups(trips, ['School Location', 'minute'])
+        assert afternoon.tolist() == dense(old_afternoon(trips)).tolist()
+
+def test_morning_leftovers_are_the_only_mixed_school_groups():
+    trips = random_school_trips(np.random.default_rng(0), 400)
+    groups = bucket_groups(trips, ['House Location', 'minute', 'School Location'], ['House Location', 'minute'])
+    by_group = trips.groupby(groups)
+    one_school = (by_group['School Location'].nunique() == 1) & (by_group.size() == 4)
+    # Every house, time and school keeps fewer than 4 trips for the mixed leftover groups
+    leftovers = trips[~one_school.loc[groups].to_numpy()]
+    assert one_school.any() and len(leftovers)
+    assert leftovers.groupby(['House Location', 'minute', 'School Location']).size().max() < 4
+    assert (by_group['House Location'].nunique() == 1).all() and (by_group['minute'].nunique() == 1).all()
+
+# Loop form of bucket_groups: buckets taken in order of their key values' first appearance; in each relaxed
+# bucket the full groups of its full-key buckets, then its leftovers in row order
+def loop_buckets(data, keys, relaxed_keys, group_size):
+    codes = pd.DataFrame({key: pd.factorize(data[key])[0] for key in keys})
+    extra_keys = [key for key in keys if key not in relaxed_keys]
+    groups = np.full(len(data), -1)
+    group = 0
+    for _, relaxed_rows in sorted(codes.groupby(relaxed_keys).indices.items() if relaxed_keys
+                                  else [((), np.arange(len(data)))]):
+        grouped = []
+        strict = (codes.iloc[relaxed_rows].groupby(extra_keys).indices if extra_keys
+                  else {(): np.arange(len(relaxed_rows))})
+        for _, rows in sorted(strict.items()):
+            rows = relaxed_rows[rows]
+            for start in range(0, len(rows) // group_size * group_size, group_size):
+                groups[rows[start:start + group_size]] = group
+                grouped.extend(rows[start:start + group_size])
+                group += 1
+        left = [row for row in relaxed_rows if row not in grouped]
+        for start in range(0, len(left), group_size):
+            groups[left[start:start + group_size]] = group
+            group += 1
+    return groups
+
+@pytest.mark.parametrize('keys, relaxed_keys', [
+    (['House Location', 'minute', 'School Location'], ['House Location', 'minute']),
+    (['School Location', 'minute'], ['School Location', 'minute']),
+    (['House Location', 'minute', 'School Location'], []),
+    (['School Location', 'minute'], None),
+])
+def test_buckets_match_the_loop_form(keys, relaxed_keys):
+    rng = np.random.default_rng(len(keys) + len(relaxed_keys or keys))
+    for _ in range(40):
+        trips = random_school_trips(rng, int(rng.integers(0, 60)))
+        group_size = int(rng.integers(1, 6))
+        # No relaxed keys: the leftovers of each bucket are grouped within it
+        expected = loop_buckets(trips, keys, keys if relaxed_keys is None else relaxed_keys, group_size)
+        assert bucket_groups(trips, keys, relaxed_keys, group_size).tolist() == expected.tolist()